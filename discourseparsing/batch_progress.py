@@ -0,0 +1,270 @@
+# License: MIT
+
+'''
+Progress and throughput reporting for rst_parse_batch.
+
+The workers return some statistics for each document they parse (see
+`rst_parse_batch.document_stats`), which are added to a BatchProgress.  It
+periodically logs the numbers of documents, sentences, EDUs, and tokens
+processed so far, the rates in total and for each worker, and an estimate of
+the time remaining, and it warns about workers that haven't made progress
+for a long time.  Workers can also report when they start each document (see
+`BatchProgress.start`), so that a worker stuck on its first document is
+noticed as well.  At the end, `summary` gives the totals along with
+latency percentiles for documents of different lengths.
+
+The memory used doesn't grow with the number of documents: the percentiles
+are computed from a fixed-size random sample of the latencies for each
+length bucket (which holds all of them for up to `LATENCY_SAMPLE_SIZE`
+documents), and the threshold for stuck workers from the latencies of the
+most recent documents.
+'''
+
+from collections import deque
+import logging
+import random
+import time
+
+import numpy as np
+
+
+# The progress reports are logged with this logger, so that they can be
+# shown without showing everything else logged at the INFO level.
+logger = logging.getLogger(__name__)
+
+# Upper bounds (exclusive) on the number of tokens for the document length
+# buckets in the summary.  The last bucket has no upper bound.
+LENGTH_BUCKET_BOUNDS = [100, 250, 500, 1000, 2500, 5000]
+
+LATENCY_PERCENTILES = [50, 90, 99]
+
+# The maximum number of latencies kept for the percentiles of each length
+# bucket.
+LATENCY_SAMPLE_SIZE = 10000
+
+# The number of most recent latencies whose median is used for the default
+# threshold for stuck workers.
+RECENT_LATENCY_WINDOW = 1000
+
+
+def length_bucket(n_tokens):
+    '''
+    Returns the name of the length bucket (e.g., "100-249") for a document
+    with `n_tokens` tokens.
+    '''
+    lower = 0
+    for upper in LENGTH_BUCKET_BOUNDS:
+        if n_tokens < upper:
+            return '{}-{}'.format(lower, upper - 1)
+        lower = upper
+    return '{}+'.format(lower)
+
+
+class LatencyStats(object):
+    '''
+    The count, sum, and maximum of a stream of latencies, along with a
+    uniform random sample (reservoir sampling) of at most `sample_size` of
+    them for estimating percentiles.
+    '''
+
+    def __init__(self, sample_size=LATENCY_SAMPLE_SIZE, random_state=0):
+        self.sample_size = sample_size
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.sample = []
+        self._rng = random.Random(random_state)
+
+    def add(self, latency):
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+        if len(self.sample) < self.sample_size:
+            self.sample.append(latency)
+        else:
+            i = self._rng.randrange(self.count)
+            if i < self.sample_size:
+                self.sample[i] = latency
+
+    def percentile(self, percentile):
+        return float(np.percentile(self.sample, percentile))
+
+
+class BatchProgress(object):
+    '''
+    Keeps track of the documents parsed in a batch run.  `total_docs` and
+    `total_chars` are the number of documents and the total length of their
+    texts, if known, for the estimate of the time remaining.  Progress is
+    logged at most every `report_interval` seconds (never if it's None or
+    0).  A worker that has been parsing the same document, or hasn't
+    finished a document, for `stuck_seconds` (by default, the larger of a
+    minute and 10 times the median latency of the last
+    `RECENT_LATENCY_WINDOW` documents) is reported as possibly stuck.
+    '''
+
+    def __init__(self, total_docs=None, total_chars=None,
+                 report_interval=30.0, stuck_seconds=None):
+        self.total_docs = total_docs
+        self.total_chars = total_chars
+        self.report_interval = report_interval
+        self.stuck_seconds = stuck_seconds
+        self.start_time = time.perf_counter()
+        self._last_report_time = self.start_time
+        self.totals = {"docs": 0, "sentences": 0, "edus": 0, "tokens": 0,
+                       "chars": 0}
+        self.workers = {}
+        self._latency_stats = {}
+        self._recent_latencies = deque(maxlen=RECENT_LATENCY_WINDOW)
+
+    def add(self, stats):
+        '''
+        Adds the statistics for a document: the numbers of "sentences",
+        "edus", "tokens", and "chars", the "seconds" it took to parse, and
+        the "worker" that parsed it.
+        '''
+        now = time.perf_counter()
+        self.totals["docs"] += 1
+        for key in ["sentences", "edus", "tokens", "chars"]:
+            self.totals[key] += stats.get(key, 0)
+        bucket = length_bucket(stats.get("tokens", 0))
+        if bucket not in self._latency_stats:
+            self._latency_stats[bucket] = LatencyStats()
+        self._latency_stats[bucket].add(stats["seconds"])
+        self._recent_latencies.append(stats["seconds"])
+
+        worker = self._get_worker(stats["worker"], now - stats["seconds"])
+        worker["docs"] += 1
+        worker["edus"] += stats.get("edus", 0)
+        worker["busy_seconds"] += stats["seconds"]
+        worker["last_finished"] = now
+        self.maybe_report()
+
+    def start(self, worker_id, seconds_ago=0.0):
+        '''
+        Records that a worker started parsing a document `seconds_ago`
+        seconds ago.
+        '''
+        start_time = time.perf_counter() - seconds_ago
+        worker = self._get_worker(worker_id, start_time)
+        worker["last_started"] = max(worker["last_started"] or start_time,
+                                     start_time)
+
+    def _get_worker(self, worker_id, first_seen):
+        return self.workers.setdefault(
+            worker_id, {"docs": 0, "edus": 0, "busy_seconds": 0.0,
+                        "first_seen": first_seen, "last_started": None,
+                        "last_finished": None})
+
+    def maybe_report(self):
+        '''
+        Logs a progress report if `report_interval` seconds have passed since
+        the last one.  This should also be called periodically while waiting
+        for documents, so that stuck workers are noticed.
+        '''
+        if self.report_interval and time.perf_counter() \
+                - self._last_report_time >= self.report_interval:
+            self.report()
+
+    def _eta(self, elapsed):
+        '''
+        Returns the estimated number of seconds remaining, or None.  The
+        estimate is based on the length of the texts if it is known, since
+        documents aren't necessarily parsed in order (e.g., longest first).
+        '''
+        if self.total_chars and self.totals["chars"]:
+            return (self.total_chars - self.totals["chars"]) \
+                * elapsed / self.totals["chars"]
+        if self.total_docs and self.totals["docs"]:
+            return (self.total_docs - self.totals["docs"]) \
+                * elapsed / self.totals["docs"]
+        return None
+
+    def report(self):
+        now = time.perf_counter()
+        self._last_report_time = now
+        elapsed = now - self.start_time
+        totals = self.totals
+        if self.total_docs:
+            docs = '{}/{} docs ({:.1f}%)'.format(
+                totals["docs"], self.total_docs,
+                100.0 * totals["docs"] / self.total_docs)
+        else:
+            docs = '{} docs'.format(totals["docs"])
+        eta = self._eta(elapsed)
+        logger.info('{}, {} sentences, {} EDUs, {} tokens in {:.0f} s; '
+                    '{:.2f} docs/s, {:.2f} EDUs/s{}'
+                    .format(docs, totals["sentences"], totals["edus"],
+                            totals["tokens"], elapsed,
+                            totals["docs"] / elapsed,
+                            totals["edus"] / elapsed,
+                            '; ETA {:.0f} s'.format(eta)
+                            if eta is not None else ''))
+
+        stuck_seconds = self.stuck_seconds
+        if stuck_seconds is None:
+            stuck_seconds = 60.0
+            if self._recent_latencies:
+                stuck_seconds = max(
+                    stuck_seconds,
+                    10 * float(np.median(self._recent_latencies)))
+        for worker_id, worker in sorted(self.workers.items()):
+            worker_elapsed = max(now - worker["first_seen"], 1e-6)
+            if worker["last_finished"] is None:
+                finished = 'has not finished a document'
+            else:
+                finished = 'last finished a document {:.0f} s ago'.format(
+                    now - worker["last_finished"])
+            logger.info('worker {}: {} docs, {:.2f} docs/s, {:.2f} EDUs/s, {}'
+                        .format(worker_id, worker["docs"],
+                                worker["docs"] / worker_elapsed,
+                                worker["edus"] / worker_elapsed, finished))
+            if self.total_docs is not None \
+                    and totals["docs"] >= self.total_docs:
+                continue
+            # The time since the worker started the document it's working
+            # on, if it reported the start, or since it finished its last
+            # one.
+            idle = now - max(x for x in [worker["last_started"],
+                                         worker["last_finished"]]
+                             if x is not None)
+            if idle > stuck_seconds:
+                logger.warning('worker {} has not finished a document in '
+                               '{:.0f} s and may be stuck'
+                               .format(worker_id, idle))
+
+    def summary(self):
+        '''
+        Returns a dictionary with the totals, the rates in total and for
+        each worker, and latency percentiles for each length bucket.
+        '''
+        elapsed = time.perf_counter() - self.start_time
+        res = {"wall_seconds": elapsed,
+               "totals": dict(self.totals),
+               "docs_per_second": self.totals["docs"] / elapsed,
+               "edus_per_second": self.totals["edus"] / elapsed}
+
+        res["workers"] = {}
+        for worker_id, worker in self.workers.items():
+            res["workers"][str(worker_id)] = {
+                "docs": worker["docs"],
+                "edus": worker["edus"],
+                "busy_seconds": worker["busy_seconds"],
+                "docs_per_busy_second":
+                worker["docs"] / worker["busy_seconds"]
+                if worker["busy_seconds"] else None}
+
+        res["latency_by_length"] = {}
+        bucket_names = [length_bucket(0)] \
+            + [length_bucket(x) for x in LENGTH_BUCKET_BOUNDS]
+        for bucket in bucket_names:
+            latency_stats = self._latency_stats.get(bucket)
+            if latency_stats is None:
+                continue
+            bucket_stats = {"docs": latency_stats.count,
+                            "mean": latency_stats.total / latency_stats.count,
+                            "max": latency_stats.max}
+            for percentile in LATENCY_PERCENTILES:
+                bucket_stats["p{}".format(percentile)] = \
+                    latency_stats.percentile(percentile)
+            res["latency_by_length"][bucket] = bucket_stats
+        return res
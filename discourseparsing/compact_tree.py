@@ -0,0 +1,490 @@
+# License: MIT
+
+'''
+A compact representation of syntax trees that stores each tree as a set of
+parallel arrays instead of one NLTK tree object per node.  This uses much less
+memory for documents with many sentences.
+
+Nodes are numbered in pre-order (so the root is 0, and the nodes in a subtree
+are contiguous), and the arrays store, for each node, the interned label id,
+the parent, the first child, the next sibling, the span of leaves, the head
+child, and the maximal head node and its depth (see
+HeadedParentedTree.find_maximal_head_node).
+
+`CompactTreeNode` objects are lightweight views of single nodes.  They are
+created as needed and provide the parts of the `HeadedParentedTree` interface
+that the segmenter and parser use (e.g., label(), parent(), treeposition(),
+head(), head_preterminal(), find_maximal_head_node(), right_sibling()).
+
+These trees only support the structure of syntax trees, where every word is
+the only child of a preterminal.  They cannot be modified.
+'''
+
+from array import array
+import sys
+
+from discourseparsing.tree_util import HeadedParentedTree
+
+
+# Labels are interned across all trees, so each tree only stores label ids.
+_label_ids = {}
+_labels = []
+
+
+def _intern_label(label):
+    label_id = _label_ids.get(label)
+    if label_id is None:
+        label_id = len(_labels)
+        _label_ids[label] = label_id
+        _labels.append(label)
+    return label_id
+
+
+class CompactTree(object):
+    '''
+    An immutable syntax tree stored as parallel arrays (see the module
+    docstring).  Use `fromstring` or `convert` to create one.
+
+    For convenience, indexing, iteration, etc. work as for the root node,
+    as with NLTK trees.
+    '''
+
+    __slots__ = ('_labels', '_parents', '_first_children', '_next_siblings',
+                 '_starts', '_ends', '_heads', '_maximal_heads',
+                 '_maximal_head_depths', '_preterminals', '_words')
+
+    @classmethod
+    def fromstring(cls, tree_str):
+        '''
+        Reads a bracketed syntax tree string (see tree_util.tree_from_string).
+        '''
+        builder = _CompactTreeBuilder(cls)
+        after_open_bracket = False
+        tokens = tree_str.replace('(', ' ( ').replace(')', ' ) ').split()
+        for token in tokens:
+            if after_open_bracket:
+                # This token is the label unless it is another bracket
+                # (e.g., for the extra top bracketing "( (S ...))").
+                builder.open_node('' if token in '()' else token)
+                after_open_bracket = (token == '(')
+                if token == ')':
+                    builder.close_node()
+            elif token == '(':
+                after_open_bracket = True
+            elif token == ')':
+                builder.close_node()
+            else:
+                builder.add_word(token)
+
+        if after_open_bracket:
+            raise ValueError('Unmatched open bracket in tree string: {}'
+                             .format(tree_str))
+        return builder.finish()
+
+    @classmethod
+    def convert(cls, tree):
+        '''
+        Makes a compact copy of an NLTK tree.
+        '''
+        builder = _CompactTreeBuilder(cls)
+        to_visit = [tree]
+        while to_visit:
+            node = to_visit.pop()
+            if node is None:
+                builder.close_node()
+            elif isinstance(node, str):
+                builder.add_word(node)
+            else:
+                builder.open_node(node.label())
+                to_visit.append(None)
+                to_visit.extend(reversed(node))
+        return builder.finish()
+
+    def __reduce__(self):
+        # Label ids are specific to each process, so pickle the tree string.
+        return (self.fromstring, (str(self),))
+
+    def __str__(self):
+        return self.root()._pformat_flat()
+
+    def __repr__(self):
+        return 'CompactTree.fromstring({!r})'.format(str(self))
+
+    def root(self):
+        return CompactTreeNode(self, 0)
+
+    def node(self, index):
+        '''
+        Returns the node with the given pre-order index.
+        '''
+        return CompactTreeNode(self, index)
+
+    def num_nodes(self):
+        return len(self._labels)
+
+    def preterminals(self):
+        '''
+        Returns the list of preterminals in the tree, in left-to-right order.
+        '''
+        return [CompactTreeNode(self, i) for i in self._preterminals]
+
+    def leaves(self):
+        return list(self._words)
+
+    def label(self):
+        return self.root().label()
+
+    def subtrees(self):
+        return self.root().subtrees()
+
+    def treeposition(self):
+        return ()
+
+    def __getitem__(self, position):
+        return self.root()[position]
+
+    def __len__(self):
+        return len(self.root())
+
+    def __iter__(self):
+        return iter(self.root())
+
+    def __eq__(self, other):
+        return self is other
+
+    def __ne__(self, other):
+        return self is not other
+
+    def __hash__(self):
+        return id(self)
+
+
+class CompactTreeNode(object):
+    '''
+    A view of a single node in a CompactTree.  Two views are equal if they are
+    for the same node in the same tree.
+    '''
+
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    def __eq__(self, other):
+        return (isinstance(other, CompactTreeNode)
+                and self.tree is other.tree and self.index == other.index)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    def __repr__(self):
+        return '<CompactTreeNode {} {}>'.format(self.index,
+                                                self._pformat_flat())
+
+    def __str__(self):
+        return self._pformat_flat()
+
+    def _pformat_flat(self):
+        pieces = []
+        to_visit = [self]
+        while to_visit:
+            node = to_visit.pop()
+            if node is None:
+                pieces.append(')')
+                continue
+            if pieces and pieces[-1] != '(':
+                pieces.append(' ')
+            if isinstance(node, str):
+                pieces.append(node)
+            else:
+                pieces.append('(')
+                pieces.append(node.label())
+                to_visit.append(None)
+                to_visit.extend(reversed(list(node)))
+        return ''.join(pieces)
+
+    def label(self):
+        return _labels[self.tree._labels[self.index]]
+
+    def is_preterminal(self):
+        return self.tree._first_children[self.index] < 0
+
+    def parent(self):
+        parent_index = self.tree._parents[self.index]
+        if parent_index < 0:
+            return None
+        return CompactTreeNode(self.tree, parent_index)
+
+    def root(self):
+        return CompactTreeNode(self.tree, 0)
+
+    def _child_indices(self):
+        tree = self.tree
+        res = []
+        child_index = tree._first_children[self.index]
+        while child_index >= 0:
+            res.append(child_index)
+            child_index = tree._next_siblings[child_index]
+        return res
+
+    def __len__(self):
+        if self.is_preterminal():
+            return 1
+        return len(self._child_indices())
+
+    def __bool__(self):
+        # Every node has at least one child.
+        return True
+
+    def __iter__(self):
+        if self.is_preterminal():
+            return iter([self.tree._words[self.tree._starts[self.index]]])
+        return (CompactTreeNode(self.tree, i) for i in self._child_indices())
+
+    def __getitem__(self, position):
+        if isinstance(position, int):
+            if self.is_preterminal():
+                if position not in (0, -1):
+                    raise IndexError('index out of range')
+                return self.tree._words[self.tree._starts[self.index]]
+            return CompactTreeNode(self.tree,
+                                   self._child_indices()[position])
+
+        # Otherwise, the position is a tree position (a tuple or list).
+        res = self
+        for i in position:
+            res = res[i]
+        return res
+
+    def right_sibling(self):
+        sibling_index = self.tree._next_siblings[self.index]
+        if sibling_index < 0:
+            return None
+        return CompactTreeNode(self.tree, sibling_index)
+
+    def parent_index(self):
+        '''
+        Returns the index of this node in its parent's list of children.
+        '''
+        parent_index = self.tree._parents[self.index]
+        if parent_index < 0:
+            return None
+        res = 0
+        child_index = self.tree._first_children[parent_index]
+        while child_index != self.index:
+            child_index = self.tree._next_siblings[child_index]
+            res += 1
+        return res
+
+    def treeposition(self):
+        res = []
+        node = self
+        while node.index > 0:
+            res.append(node.parent_index())
+            node = node.parent()
+        res.reverse()
+        return tuple(res)
+
+    def depth(self):
+        '''
+        Returns the length of the tree position.
+        '''
+        res = 0
+        parents = self.tree._parents
+        index = parents[self.index]
+        while index >= 0:
+            res += 1
+            index = parents[index]
+        return res
+
+    def leaves(self):
+        return list(self.tree._words[self.tree._starts[self.index]:
+                                     self.tree._ends[self.index]])
+
+    def _end_of_subtree(self):
+        '''
+        Returns the index after the last node in this subtree, using the fact
+        that the nodes in a subtree are contiguous in pre-order.
+        '''
+        tree = self.tree
+        index = self.index
+        while index >= 0:
+            if tree._next_siblings[index] >= 0:
+                return tree._next_siblings[index]
+            index = tree._parents[index]
+        return len(tree._labels)
+
+    def subtrees(self):
+        for i in range(self.index, self._end_of_subtree()):
+            yield CompactTreeNode(self.tree, i)
+
+    def dominates(self, other):
+        '''
+        Returns True if this node is a proper ancestor of `other`.
+        '''
+        if other is None or self.tree is not other.tree:
+            return False
+        return self.index < other.index < self._end_of_subtree()
+
+    def first_common_ancestor(self, other):
+        '''
+        Returns the lowest proper ancestor of this node that is also a proper
+        ancestor of `other` (see tree_util.find_first_common_ancestor).
+        '''
+        assert self.tree is other.tree
+        res = self.parent()
+        while res is not None and not res.dominates(other):
+            res = res.parent()
+        return res
+
+    def head(self):
+        head_index = self.tree._heads[self.index]
+        if head_index < 0:
+            return self.tree._words[self.tree._starts[self.index]]
+        return CompactTreeNode(self.tree, head_index)
+
+    def head_preterminal(self):
+        heads = self.tree._heads
+        index = self.index
+        while heads[index] >= 0:
+            index = heads[index]
+        return CompactTreeNode(self.tree, index)
+
+    def head_word(self):
+        return self.head_preterminal()[0]
+
+    def head_pos(self):
+        return self.head_preterminal().label()
+
+    def find_maximal_head_node(self):
+        return CompactTreeNode(self.tree,
+                               self.tree._maximal_heads[self.index])
+
+    def maximal_head_depth(self):
+        return self.tree._maximal_head_depths[self.index]
+
+
+class _CompactTreeBuilder(object):
+    '''
+    Builds a CompactTree from a pre-order sequence of open_node, add_word,
+    and close_node calls.  The fields are collected in lists and then copied
+    into arrays of the smallest suitable type by finish().
+    '''
+
+    def __init__(self, tree_class):
+        self.tree_class = tree_class
+        self.labels = []
+        self.parents = []
+        self.first_children = []
+        self.next_siblings = []
+        self.starts = []
+        self.ends = []
+        self.heads = []
+        self.preterminals = []
+        self.words = []
+        self.open_nodes = []
+        self.last_children = []
+        self.depths = []
+
+    def _has_word(self, index):
+        return len(self.preterminals) > 0 and self.preterminals[-1] == index
+
+    def open_node(self, label):
+        index = len(self.labels)
+        if self.open_nodes:
+            parent_index = self.open_nodes[-1]
+            if self._has_word(parent_index):
+                raise ValueError('CompactTree only supports trees where each'
+                                 ' word is the only child of a preterminal.')
+            last_child = self.last_children[parent_index]
+            if last_child < 0:
+                self.first_children[parent_index] = index
+            else:
+                self.next_siblings[last_child] = index
+            self.last_children[parent_index] = index
+            depth = self.depths[parent_index] + 1
+        elif index > 0:
+            raise ValueError('Expected exactly one tree in tree string.')
+        else:
+            parent_index = -1
+            depth = 0
+
+        self.labels.append(_intern_label(label))
+        self.parents.append(parent_index)
+        self.first_children.append(-1)
+        self.next_siblings.append(-1)
+        self.starts.append(len(self.words))
+        self.ends.append(-1)
+        self.heads.append(-1)
+        self.last_children.append(-1)
+        self.depths.append(depth)
+        self.open_nodes.append(index)
+
+    def add_word(self, word):
+        if not self.open_nodes:
+            raise ValueError('Leaf outside of brackets in tree string.')
+        index = self.open_nodes[-1]
+        if self.first_children[index] >= 0 or self._has_word(index):
+            raise ValueError('CompactTree only supports trees where each'
+                             ' word is the only child of a preterminal.')
+        self.words.append(sys.intern(word))
+        self.preterminals.append(index)
+
+    def close_node(self):
+        if not self.open_nodes:
+            raise ValueError('Unmatched close bracket in tree string.')
+        index = self.open_nodes.pop()
+        self.ends[index] = len(self.words)
+
+        child_index = self.first_children[index]
+        if child_index >= 0:
+            child_indices = []
+            while child_index >= 0:
+                child_indices.append(child_index)
+                child_index = self.next_siblings[child_index]
+            head_position = HeadedParentedTree.find_head_index(
+                _labels[self.labels[index]],
+                [_labels[self.labels[i]] for i in child_indices])
+            self.heads[index] = child_indices[head_position]
+        elif not self._has_word(index):
+            raise ValueError('CompactTree does not support empty nodes.')
+
+    def finish(self):
+        if self.open_nodes:
+            raise ValueError('Unmatched open bracket in tree string.')
+        if not self.labels:
+            raise ValueError('Expected exactly one tree in tree string.')
+
+        # Find the maximal head nodes in a single top-down pass.  Since nodes
+        # are in pre-order, parents are always processed before children.
+        maximal_heads = []
+        maximal_head_depths = []
+        for index, parent_index in enumerate(self.parents):
+            if parent_index >= 0 and self.heads[parent_index] == index:
+                maximal_heads.append(maximal_heads[parent_index])
+                maximal_head_depths.append(maximal_head_depths[parent_index])
+            else:
+                maximal_heads.append(index)
+                maximal_head_depths.append(self.depths[index])
+
+        # Use 16-bit integers unless the tree is very large.
+        index_type = 'h' if len(self.labels) < 2 ** 15 else 'i'
+        label_type = 'H' if len(_labels) <= 2 ** 16 else 'I'
+
+        tree = self.tree_class.__new__(self.tree_class)
+        tree._labels = array(label_type, self.labels)
+        tree._parents = array(index_type, self.parents)
+        tree._first_children = array(index_type, self.first_children)
+        tree._next_siblings = array(index_type, self.next_siblings)
+        tree._starts = array(index_type, self.starts)
+        tree._ends = array(index_type, self.ends)
+        tree._heads = array(index_type, self.heads)
+        tree._maximal_heads = array(index_type, maximal_heads)
+        tree._maximal_head_depths = array(index_type, maximal_head_depths)
+        tree._preterminals = array(index_type, self.preterminals)
+        tree._words = tuple(self.words)
+        return tree
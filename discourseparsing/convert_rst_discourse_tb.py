@@ -33,14 +33,13 @@ import logging
 import re
 from glob import glob
 
-from nltk.tree import ParentedTree
 import nltk
 from nltk.tokenize.treebank import TreebankWordTokenizer
 
 
 from discourseparsing.tree_util import (convert_ptb_tree, extract_preterminals,
                                         extract_converted_terminals,
-                                        TREE_PRINT_MARGIN)
+                                        tree_from_string, TREE_PRINT_MARGIN)
 from discourseparsing.reformat_rst_trees \
     import (reformat_rst_tree, fix_rst_treebank_tree_str,
             convert_parens_in_rst_tree_str)
@@ -114,7 +113,7 @@ def main():
 
             with open(ptb_path) as f:
                 doc = re.sub(r'\s+', ' ', f.read()).strip()
-                trees = [ParentedTree.fromstring('( ({}'.format(x)) for x
+                trees = [tree_from_string('( ({}'.format(x)) for x
                          in re.split(r'\(\s*\(', doc) if x]
 
             for t in trees:
@@ -128,7 +127,7 @@ def main():
                 rst_tree_str = f.read().strip()
                 rst_tree_str = fix_rst_treebank_tree_str(rst_tree_str)
                 rst_tree_str = convert_parens_in_rst_tree_str(rst_tree_str)
-                rst_tree = ParentedTree.fromstring(rst_tree_str)
+                rst_tree = tree_from_string(rst_tree_str)
                 reformat_rst_tree(rst_tree)
 
             # Identify which EDUs are at the beginnings of paragraphs.
@@ -210,7 +209,7 @@ def main():
                             [nltk.pos_tag(convert_paren_tokens_to_ptb_format( \
                              TreebankWordTokenizer().tokenize(x)))
                              for x in nltk.sent_tokenize(unparsed_edus)]:
-                            new_tree = ParentedTree.fromstring('((S {}))' \
+                            new_tree = tree_from_string('((S {}))' \
                                 .format(' '.join(['({} {})'.format(tag, word)
                                                   for word, tag
                                                   in tagged_sent])))
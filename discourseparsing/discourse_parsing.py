@@ -9,15 +9,15 @@ import os
 import re
 import itertools
 import logging
+import time
 from collections import namedtuple, Counter
 from operator import itemgetter
 
 from nltk.tree import Tree, ParentedTree
 import numpy as np
-import skll
 
-from discourseparsing.tree_util import (collapse_binarized_nodes,
-                                        HeadedParentedTree)
+from discourseparsing.compact_tree import CompactTree
+from discourseparsing.tree_util import collapse_binarized_nodes
 from discourseparsing.discourse_segmentation import extract_tagged_doc_edus
 
 
@@ -40,17 +40,50 @@ class Parser(object):
     rightwall_p = 'RIGHTWALL'
     max_consecutive_unary_reduce = 2
 
-    def __init__(self, max_acts, max_states, n_best):
+    def __init__(self, max_acts, max_states, n_best, max_seconds=None,
+                 max_expanded_states=None):
         self.max_acts = max_acts
         self.max_states = max_states
         self.n_best = n_best
-        self.model = None
+        # Budgets for parsing one document (see `parse`).
+        self.max_seconds = max_seconds
+        self.max_expanded_states = max_expanded_states
+        self.model_path = None
+        self._model = None
         self.model_action_list = None
+        # skll.data.ExamplesTuple, which is set when the model is loaded so
+        # that SKLL doesn't have to be imported for each state scored.
+        self._examples_tuple = None
 
-    def load_model(self, model_path):
-        self.model = skll.learner.Learner.from_file(
-            os.path.join(model_path,
-                         'rst_parsing_all_feats_LogisticRegression.model'))
+    def load_model(self, model_path=None, lazy=False):
+        '''
+        Loads the model to parse with from the directory `model_path`.  With
+        `lazy=True`, only the directory is recorded, and the model is read
+        when it is first needed (see `model`), so that scripts can start
+        producing output (e.g., syntactic parses) without waiting for it.
+        Without `model_path`, this loads the model from the directory given
+        earlier, if it hasn't been loaded yet.
+        '''
+        if model_path is not None:
+            self.model_path = model_path
+            self._model = None
+            self.model_action_list = None
+        if not lazy and self._model is None and self.model_path is not None:
+            # SKLL imports scikit-learn, which is slow, so it is only
+            # imported when a model is needed.
+            import skll
+            logging.info('Loading RST parsing model from {}'
+                         .format(self.model_path))
+            self._model = skll.learner.Learner.from_file(
+                os.path.join(self.model_path,
+                             'rst_parsing_all_feats_LogisticRegression.model'))
+            self._examples_tuple = skll.data.ExamplesTuple
+
+    @property
+    def model(self):
+        if self._model is None:
+            self.load_model()
+        return self._model
 
     def _get_model_actions(self):
         '''
@@ -65,6 +98,31 @@ class Parser(object):
                 self.model_action_list.append(act)
         return self.model_action_list
 
+    def _score_actions(self, feats):
+        '''
+        Returns the log probabilities from the model for the actions in
+        `_get_model_actions()`, given the features for a state.
+        '''
+        model = self.model
+        vectorizer = model.feat_vectorizer
+        examples = self._examples_tuple(
+            None, None, vectorizer.transform(Counter(feats)), vectorizer)
+        return [np.log(x) for x in model.predict(examples)[0]]
+
+    def _budget_exceeded(self, start_time, n_expanded, factor=1):
+        '''
+        Returns the name of the budget that has been exceeded (times
+        `factor`) while parsing a document, or None.
+        '''
+        if self.max_expanded_states is not None \
+                and n_expanded >= factor * self.max_expanded_states:
+            return 'max_expanded_states'
+        if self.max_seconds is not None \
+                and time.perf_counter() - start_time \
+                >= factor * self.max_seconds:
+            return 'max_seconds'
+        return None
+
     @staticmethod
     def _add_word_and_pos_feats(feats, prefix, words, pos_tags):
         '''
@@ -116,7 +174,8 @@ class Parser(object):
         (Soricut & Marco, 2003, Sec 4.1).
 
         There can be ties, which the paper doesn't mention.
-        This code just finds the leftmost, using np.argmin on tree depths.
+        This code just finds the leftmost, using the tree depths of the
+        maximal head nodes, which are precomputed for each preterminal.
         '''
 
         # return None for the left wall
@@ -130,8 +189,7 @@ class Parser(object):
         tree_idx, start_tok_idx, _ = edu_start_indices
         tree = doc_dict['syntax_trees_objs'][tree_idx]
         end_tok_idx = start_tok_idx + len(head_words)
-        preterminals = [x for x in tree.subtrees()
-                        if isinstance(x[0], str)][start_tok_idx:end_tok_idx]
+        preterminals = tree.preterminals()[start_tok_idx:end_tok_idx]
 
         # Filter out punctuation if the EDU has more than just punctuation.
         # Otherwise "." will be the head of sentences.
@@ -144,11 +202,9 @@ class Parser(object):
             return None
 
         preterminals = filtered_preterminals
-        maximal_nodes = [node.find_maximal_head_node()
-                         for node in preterminals]
-        depths = [len(node.treeposition()) for node in maximal_nodes]
-        mindepth_idx = np.argmin(depths)
-        res = maximal_nodes[mindepth_idx]
+        depths = [node.maximal_head_depth() for node in preterminals]
+        mindepth_idx = min(range(len(depths)), key=depths.__getitem__)
+        res = preterminals[mindepth_idx].find_maximal_head_node()
 
         return res
 
@@ -422,7 +478,7 @@ class Parser(object):
         if act.type == "B":
             tmp_rc = stack.pop()
             tmp_lc = stack.pop()
-            new_tree = Tree.fromstring("({})".format(act.label))
+            new_tree = Tree(act.label, [])
             new_tree.append(tmp_lc["tree"])
             new_tree.append(tmp_rc["tree"])
 
@@ -472,7 +528,7 @@ class Parser(object):
                                  "act = {}:{}\n tmp_c = {}"
                                  .format(act.type, act.label, tmp_c))
 
-            new_tree = Tree.fromstring("({})".format(act.label))
+            new_tree = Tree(act.label, [])
             new_tree.append(tmp_c["tree"])
             tmp_item = {"head_idx": tmp_c["head_idx"],
                         "start_idx": tmp_c["start_idx"],
@@ -502,7 +558,7 @@ class Parser(object):
             edu_pos_tags = [x[1] for x in edu]
 
             # make a dictionary for each EDU
-            new_tree = Tree.fromstring('(text)')
+            new_tree = Tree('text', [])
             new_tree.append('{}'.format(edu_index))
             tmp_item = {"head_idx": wnum,
                         "start_idx": wnum,
@@ -528,6 +584,16 @@ class Parser(object):
         (e.g., to produce training examples).
         This will have no effect if `gold_actions` is not provided.
         Disabling `make features` can be useful for debugging and testing.
+
+        When parsing, if the search for a document takes more than
+        `max_seconds` or expands more than `max_expanded_states` states, it
+        stops and returns the complete trees found so far, if any, or else
+        finishes the best state greedily.  If finishing greedily takes as
+        long again, or the search was greedy already (`max_acts == 1`), a
+        flat tree is returned instead, as when no complete tree is found.
+        In these cases, the trees' dictionaries have a "degraded" key with
+        the budget that was exceeded ("reason") and the fallback
+        ("partial_n_best", "greedy", or "flat_tree").
         '''
 
         doc_id = doc_dict["doc_id"]
@@ -546,18 +612,20 @@ class Parser(object):
             logging.warning('There was only one EDU to parse. A very simple' +
                             ' tree will be returned. doc_id = {}'
                             .format(doc_id))
-            new_tree = Tree.fromstring("(ROOT)")
+            new_tree = Tree('ROOT', [])
             new_tree.append(queue[0]['tree'])
             queue[0]['tree'] = new_tree
 
-        # precompute syntax tree objects so this only needs to be done once
+        # precompute syntax tree objects so this only needs to be done once.
+        # These are compact trees, which use much less memory than NLTK trees
+        # and have the heads and maximal head nodes precomputed.
         if 'syntax_trees_objs' not in doc_dict \
                 or len(doc_dict['syntax_trees_objs']) \
                 != len(doc_dict['syntax_trees']):
             doc_dict['syntax_trees_objs'] = []
             for tree_str in doc_dict['syntax_trees']:
                 doc_dict['syntax_trees_objs'].append(
-                    HeadedParentedTree.fromstring(tree_str))
+                    CompactTree.fromstring(tree_str))
 
         # initialize the stack
         stack = []
@@ -573,11 +641,38 @@ class Parser(object):
                      "queue": queue}
         states.append(tmp_state)
 
+        # These are changed if the search runs out of budget.
+        max_acts = self.max_acts
+        degraded = None
+        start_time = time.perf_counter()
+        n_expanded = 0
+
         # loop while there are states to process
         while states:
             states.sort(key=itemgetter("score"), reverse=True)
             states = states[:self.max_states]
 
+            if gold_actions is None and degraded is None:
+                budget = self._budget_exceeded(start_time, n_expanded)
+                if budget is not None:
+                    logging.warning('The RST parser exceeded its {} budget.'
+                                    .format(budget) +
+                                    ' doc_id = {}'.format(doc_id))
+                    degraded = {"reason": budget}
+                    if completetrees:
+                        degraded["fallback"] = "partial_n_best"
+                        break
+                    if max_acts == 1:
+                        # The search is already greedy.
+                        break
+                    # Finish the best state greedily.
+                    degraded["fallback"] = "greedy"
+                    max_acts = 1
+                    states = states[:1]
+            elif degraded is not None \
+                    and self._budget_exceeded(start_time, n_expanded, 2):
+                break
+
             cur_state = states.pop(0)  # should maybe replace this with a deque
             logging.debug(("cur_state prevact = {}:{}, score = {}," +
                            " num. states = {}, doc_id = {}")
@@ -591,7 +686,7 @@ class Parser(object):
                 assert tree.label() == 'ROOT'
 
                 # collapse binary branching * rules in the output
-                output_tree = ParentedTree.fromstring(tree.pprint())
+                output_tree = ParentedTree.convert(tree)
                 collapse_binarized_nodes(output_tree)
 
                 completetrees.append({"tree": output_tree,
@@ -609,6 +704,7 @@ class Parser(object):
 
             # extract features
             feats = self.mkfeats(cur_state, doc_dict)
+            n_expanded += 1
 
             # Compute the possible actions given this state.
             # During training, print them out.
@@ -630,11 +726,7 @@ class Parser(object):
 
                 scored_acts.append(ScoredAction(act, 0.0))  # logprob
             else:
-                vectorizer = self.model.feat_vectorizer
-                examples = skll.data.ExamplesTuple(
-                    None, None, vectorizer.transform(Counter(feats)),
-                    vectorizer)
-                scores = [np.log(x) for x in self.model.predict(examples)[0]]
+                scores = self._score_actions(feats)
 
                 # Convert the string labels from the classifier back into
                 # ShiftReduceAction objects and sort them by their scores
@@ -653,10 +745,10 @@ class Parser(object):
 
             # Don't exceed the maximum number of actions
             # to consider for a parser state.
-            scored_acts = scored_acts[:self.max_acts]
+            scored_acts = scored_acts[:max_acts]
 
             while scored_acts:
-                if self.max_acts > 1:
+                if max_acts > 1:
                     # Make copies of the input queue and stack.
                     # This is not necessary if we are doing greedy parsing.
                     # Note that we do not need to make deep copies because
@@ -685,12 +777,18 @@ class Parser(object):
                             .format(doc_dict['doc_id']))
 
             # Default to a flat tree if there is no complete parse.
-            new_tree = Tree.fromstring("(ROOT)")
+            new_tree = Tree('ROOT', [])
             for i in range(len(tagged_edus)):
-                tmp_child = Tree.fromstring('(text)')
+                tmp_child = Tree('text', [])
                 tmp_child.append(i)
                 new_tree.append(tmp_child)
             completetrees.append({"tree": new_tree, "score": 0.0})
+            degraded = dict(degraded or {"reason": "no_complete_tree"},
+                            fallback="flat_tree")
+
+        if degraded is not None:
+            for t in completetrees:
+                t["degraded"] = degraded
 
         if gold_actions is None or not make_features:
             for t in completetrees:
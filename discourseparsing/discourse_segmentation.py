@@ -5,8 +5,18 @@ import shlex
 import subprocess
 import logging
 
-from discourseparsing.tree_util import (HeadedParentedTree,
-                                        find_first_common_ancestor)
+from discourseparsing.compact_tree import CompactTree
+
+
+def _child_containing(ancestor, node):
+    '''
+    Returns the child of `ancestor` that is or dominates `node`, by walking
+    up the parent links from `node`.
+    '''
+    parent = node.parent()
+    while parent != ancestor:
+        node, parent = parent, parent.parent()
+    return node
 
 
 def parse_node_features(nodes):
@@ -57,7 +67,7 @@ def extract_segmentation_features(doc_dict):
         labels_sent = []
         feat_lists_sent = []
 
-        tree = HeadedParentedTree.fromstring(tree_str)
+        tree = CompactTree.fromstring(tree_str)
         for token_num, (token, tree_position, pos_tag) \
                 in enumerate(zip(sent_tokens, sent_tree_positions, pos_tags)):
             feats = []
@@ -75,13 +85,11 @@ def extract_segmentation_features(doc_dict):
             node_p, ancestor_w, ancestor_r = None, None, None
             node_p_parent, node_p_right_sibling = None, None
             if node_r:
-                node_p = find_first_common_ancestor(node_w, node_r)
-                node_p_treeposition = node_p.treeposition()
-                node_p_len = len(node_p_treeposition)
+                node_p = node_w.first_common_ancestor(node_r)
                 # child subtree of node_p that includes node_w
-                ancestor_w = node_p[node_w.treeposition()[node_p_len]]
+                ancestor_w = _child_containing(node_p, node_w)
                 # child subtree of node_p that includes node_r
-                ancestor_r = node_p[node_r.treeposition()[node_p_len]]
+                ancestor_r = _child_containing(node_p, node_r)
                 node_p_parent = node_p.parent()
                 node_p_right_sibling = node_p.right_sibling()
 
@@ -107,16 +115,25 @@ class Segmenter():
         self.model_path = model_path
 
     def segment_document(self, doc_dict):
-        doc_id = doc_dict["doc_id"]
-        logging.info('segmenting document, doc_id = {}'.format(doc_id))
+        self.segment_documents([doc_dict])
 
+    def segment_documents(self, doc_dicts):
+        '''
+        Segments several documents with a single run of crf_test, which
+        saves starting crf_test and loading the CRF++ model for each one.
+        '''
         # Extract features.
         tmpfile = NamedTemporaryFile('w')
-        feat_lists_doc, _ = extract_segmentation_features(doc_dict)
-        for feat_lists_sent in feat_lists_doc:
-            for feat_list_word in feat_lists_sent:
-                print('\t'.join(feat_list_word + ["?"]), file=tmpfile)
-            print('\n', file=tmpfile)
+        n_sentences_docs = []
+        for doc_dict in doc_dicts:
+            logging.info('segmenting document, doc_id = {}'
+                         .format(doc_dict["doc_id"]))
+            feat_lists_doc, _ = extract_segmentation_features(doc_dict)
+            n_sentences_docs.append(len(feat_lists_doc))
+            for feat_lists_sent in feat_lists_doc:
+                for feat_list_word in feat_lists_sent:
+                    print('\t'.join(feat_list_word + ["?"]), file=tmpfile)
+                print('\n', file=tmpfile)
         tmpfile.flush()
 
         # Get predictions from the CRF++ model.
@@ -126,6 +143,17 @@ class Segmenter():
             .decode('utf-8').strip()
         tmpfile.close()
 
+        # crf_test separates sentences with blank lines, so split its output
+        # into sentences and then divide them between the documents.
+        crf_output_sents = crf_output.split('\n\n')
+        sent_idx = 0
+        for doc_dict, n_sentences in zip(doc_dicts, n_sentences_docs):
+            self._add_edu_start_indices(
+                doc_dict, crf_output_sents[sent_idx:sent_idx + n_sentences])
+            sent_idx += n_sentences
+
+    @staticmethod
+    def _add_edu_start_indices(doc_dict, crf_output_sents):
         # an index into the list of sentences
         sent_num = 0
         edu_num = 0
@@ -140,7 +168,7 @@ class Segmenter():
         # number, EDU number).
         edu_start_indices = []
 
-        for sent_num, crf_output_sent in enumerate(crf_output.split('\n\n')):
+        for sent_num, crf_output_sent in enumerate(crf_output_sents):
             for tok_num, line in enumerate(crf_output_sent.split('\n')):
                 # Start a new EDU where the CRF predicts "B-EDU" and
                 # at the beginnings of sentences.
@@ -0,0 +1,163 @@
+# License: MIT
+
+'''
+Bootstrap confidence intervals for RST parser evaluation results.
+
+The evaluation metrics depend on the documents only through their counts of
+matching, predicted, and gold spans (see `rst_eval.compute_rst_eval_counts`),
+so a bootstrap sample of documents can be scored by summing the counts of
+the sampled documents rather than by re-extracting spans from the trees.
+All of the samples are scored at once, as a matrix product of the numbers of
+times each document is sampled and the per-document counts.
+
+For comparing two systems, `compute_paired_bootstrap` resamples the
+documents of both with the same samples and gives intervals and p-values
+for the differences.
+'''
+
+import numpy as np
+from scipy.stats import norm
+
+from discourseparsing.rst_eval import compute_rst_eval_results_from_counts
+
+
+def bootstrap_sample_weights(n_docs, n_samples, random_state=None):
+    '''
+    Returns an array of shape (n_samples, n_docs) with the number of times
+    each document is drawn in each bootstrap sample.
+    '''
+    rng = np.random.RandomState(random_state)
+    return rng.multinomial(n_docs, np.full(n_docs, 1.0 / n_docs),
+                           size=n_samples)
+
+
+def bootstrap_results(counts, weights):
+    '''
+    Returns the evaluation results (as arrays of length n_samples) for the
+    bootstrap samples given by `weights` (see `bootstrap_sample_weights`),
+    with `counts` from `rst_eval.compute_rst_eval_counts`.
+    '''
+    counts = np.asarray(counts)
+    sample_counts = np.dot(weights, counts.reshape(len(counts), -1))
+    return compute_rst_eval_results_from_counts(
+        sample_counts.reshape((len(weights),) + counts.shape[1:]))
+
+
+def jackknife_results(counts):
+    '''
+    Returns the evaluation results (as arrays with one value per document)
+    with each document left out in turn.
+    '''
+    counts = np.asarray(counts)
+    return compute_rst_eval_results_from_counts(counts.sum(axis=0) - counts)
+
+
+def bootstrap_ci(stat, boot_stats, jackknife_stats=None, alpha=0.05,
+                 method='bca'):
+    '''
+    Returns the lower and upper bounds of the 1 - `alpha` confidence interval
+    for a statistic with value `stat`, given its values for the bootstrap
+    samples.  The method is either 'pi' (percentile interval) or 'bca'
+    (bias-corrected and accelerated), which also needs the jackknife values
+    of the statistic.
+    '''
+    if method not in ['bca', 'pi']:
+        raise ValueError('unknown confidence interval method: {}'
+                         .format(method))
+    boot_stats = np.sort(boot_stats)
+    if boot_stats[0] == boot_stats[-1]:
+        # The statistic is the same in all of the samples.
+        return float(boot_stats[0]), float(boot_stats[0])
+    alphas = np.array([alpha / 2, 1 - alpha / 2])
+    if method == 'bca':
+        # The bias correction and acceleration, as in Efron and Tibshirani
+        # (1993, ch. 14).
+        z0 = norm.ppf(np.mean(boot_stats < stat))
+        jackknife_mean = np.mean(jackknife_stats)
+        diffs = jackknife_mean - jackknife_stats
+        denominator = 6.0 * np.sum(diffs ** 2) ** 1.5
+        accel = np.sum(diffs ** 3) / denominator if denominator else 0.0
+        z = norm.ppf(alphas)
+        with np.errstate(invalid='ignore'):
+            alphas = norm.cdf(z0 + (z0 + z) / (1 - accel * (z0 + z)))
+        if np.any(np.isnan(alphas)):
+            # This happens if the statistic is outside the range of the
+            # bootstrap samples, so fall back to the percentile interval.
+            alphas = np.array([alpha / 2, 1 - alpha / 2])
+    indices = np.round((len(boot_stats) - 1) * alphas).astype(int)
+    lower, upper = boot_stats[indices]
+    return float(lower), float(upper)
+
+
+def compute_bootstrap_cis(counts, n_samples=10000, alpha=0.05, method='bca',
+                          random_state=None):
+    '''
+    Returns a dictionary from each evaluation metric to a dictionary with its
+    value on the whole evaluation set ("score") and the bounds of its
+    bootstrap confidence interval ("ci_lower" and "ci_upper"), with
+    `counts` from `rst_eval.compute_rst_eval_counts`.
+    '''
+    counts = np.asarray(counts)
+    scores = compute_rst_eval_results_from_counts(counts.sum(axis=0))
+    weights = bootstrap_sample_weights(len(counts), n_samples, random_state)
+    boot_results = bootstrap_results(counts, weights)
+    jackknife = jackknife_results(counts) if method == 'bca' else {}
+
+    res = {}
+    for metric_name, score in scores.items():
+        lower, upper = bootstrap_ci(score, boot_results[metric_name],
+                                    jackknife.get(metric_name), alpha=alpha,
+                                    method=method)
+        res[metric_name] = {"score": score, "ci_lower": lower,
+                            "ci_upper": upper}
+    return res
+
+
+def compute_paired_bootstrap(counts_a, counts_b, n_samples=10000,
+                             alpha=0.05, method='bca', random_state=None):
+    '''
+    Compares two systems evaluated on the same documents (in the same order),
+    with counts from `rst_eval.compute_rst_eval_counts` for each.  Returns a
+    dictionary from each evaluation metric to a dictionary with the scores of
+    the two systems ("score_a" and "score_b"), the difference ("diff", B
+    minus A), the bounds of its bootstrap confidence interval ("ci_lower" and
+    "ci_upper"), and a two-sided p-value ("p_value") for the null hypothesis
+    of no difference.
+
+    Both systems are scored on the same bootstrap samples.  The p-value is
+    the fraction of samples in which the difference is at least as far from
+    the observed difference as the observed difference is from 0 (i.e., the
+    bootstrap distribution is shifted to be centered at 0, as in Efron and
+    Tibshirani, 1993, ch. 16).
+    '''
+    counts_a = np.asarray(counts_a)
+    counts_b = np.asarray(counts_b)
+    if counts_a.shape != counts_b.shape:
+        raise ValueError('The two systems must be evaluated on the same '
+                         'documents.')
+    scores_a = compute_rst_eval_results_from_counts(counts_a.sum(axis=0))
+    scores_b = compute_rst_eval_results_from_counts(counts_b.sum(axis=0))
+    weights = bootstrap_sample_weights(len(counts_a), n_samples,
+                                       random_state)
+    boot_a = bootstrap_results(counts_a, weights)
+    boot_b = bootstrap_results(counts_b, weights)
+    if method == 'bca':
+        jackknife_a = jackknife_results(counts_a)
+        jackknife_b = jackknife_results(counts_b)
+
+    res = {}
+    for metric_name in scores_a:
+        diff = scores_b[metric_name] - scores_a[metric_name]
+        boot_diffs = boot_b[metric_name] - boot_a[metric_name]
+        jackknife_diffs = jackknife_b[metric_name] \
+            - jackknife_a[metric_name] if method == 'bca' else None
+        lower, upper = bootstrap_ci(diff, boot_diffs, jackknife_diffs,
+                                    alpha=alpha, method=method)
+        p_value = float(np.mean(np.abs(boot_diffs - diff) >= abs(diff)))
+        res[metric_name] = {"score_a": scores_a[metric_name],
+                            "score_b": scores_b[metric_name],
+                            "diff": diff,
+                            "ci_lower": lower,
+                            "ci_upper": upper,
+                            "p_value": p_value}
+    return res
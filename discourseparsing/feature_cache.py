@@ -0,0 +1,144 @@
+# License: MIT
+
+'''
+A content-addressed cache of the featurized training examples for
+tune_rst_parser, so that the gold actions don't have to be replayed through
+the parser to extract features every time a model is trained on the same
+data.
+
+A cache file is named by a hash of the training data file and of the source
+of the modules that the features depend on (see `feature_extractor_version`),
+so changing either one (e.g., editing `Parser.mkfeats`) means that the
+features are extracted again.  The examples are stored as a sparse matrix of
+feature counts in a compressed NumPy .npz file, along with the feature names,
+labels, and example IDs.
+'''
+
+import hashlib
+import os
+from array import array
+
+import numpy as np
+
+from discourseparsing.rst_eval import hash_path
+
+
+# Bump this when the format of the cache files changes.
+FEATURE_CACHE_FORMAT_VERSION = 1
+
+
+def _feature_source_paths():
+    '''
+    Returns the paths of the source files of the modules used to make
+    training examples from the RST treebank data.
+    '''
+    from discourseparsing import (collapse_rst_labels, compact_tree,
+                                  discourse_parsing, discourse_segmentation,
+                                  extract_actions_from_trees, tree_util)
+    return [module.__file__ for module in [collapse_rst_labels, compact_tree,
+                                           discourse_parsing,
+                                           discourse_segmentation,
+                                           extract_actions_from_trees,
+                                           tree_util]]
+
+
+def feature_extractor_version():
+    '''
+    Returns a hash of the source of the feature extraction code.  This
+    includes whole modules, so some changes that don't affect the features
+    will still invalidate the cache.
+    '''
+    hasher = hashlib.sha1()
+    for path in _feature_source_paths():
+        hasher.update(os.path.basename(path).encode('utf-8'))
+        hash_path(path, hasher)
+    return hasher.hexdigest()
+
+
+def feature_cache_path(cache_dir, train_path):
+    '''
+    Returns the path of the cache file in `cache_dir` for the examples from
+    the JSON training file at `train_path`.
+    '''
+    key = hashlib.sha1('{} {} {}'.format(
+        hash_path(train_path), feature_extractor_version(),
+        FEATURE_CACHE_FORMAT_VERSION).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, 'rst_parsing_examples_{}.npz'.format(key))
+
+
+class FeatureCacheWriter(object):
+    '''
+    Collects training examples (dictionaries with a Counter of features "x",
+    a label "y", and an ID "id") in compact arrays and writes them to a
+    cache file when closed.  The file is only created once all of the
+    examples are written, so an interrupted run doesn't leave an incomplete
+    cache behind.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self._feature_ids = {}
+        self._label_ids = {}
+        self._example_ids = []
+        self._labels = array('i')
+        self._indptr = array('q', [0])
+        self._indices = array('i')
+        self._values = array('i')
+
+    def add(self, example):
+        feature_ids = self._feature_ids
+        # The features are stored in their original order, so that the
+        # training file written from the cache is the same.
+        for feat, value in example["x"].items():
+            self._indices.append(feature_ids.setdefault(feat,
+                                                        len(feature_ids)))
+            self._values.append(value)
+        self._indptr.append(len(self._indices))
+        self._labels.append(self._label_ids.setdefault(example["y"],
+                                                       len(self._label_ids)))
+        self._example_ids.append(example["id"])
+
+    def close(self):
+        cache_dir = os.path.dirname(self.path)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        tmp_path = os.path.join(cache_dir, '.tmp{}.{}'.format(
+            os.getpid(), os.path.basename(self.path)))
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                features=np.array(sorted(self._feature_ids,
+                                         key=self._feature_ids.get),
+                                  dtype=str),
+                label_names=np.array(sorted(self._label_ids,
+                                            key=self._label_ids.get),
+                                     dtype=str),
+                example_ids=np.array(self._example_ids, dtype=str),
+                labels=np.frombuffer(self._labels, dtype=np.int32),
+                indptr=np.frombuffer(self._indptr, dtype=np.int64),
+                indices=np.frombuffer(self._indices, dtype=np.int32),
+                values=np.frombuffer(self._values, dtype=np.int32))
+        os.replace(tmp_path, self.path)
+
+
+def iter_cached_examples(path):
+    '''
+    Yields the training examples in a cache file, in the same form as they
+    were added to the FeatureCacheWriter (with dictionaries instead of
+    Counters for the features).
+    '''
+    with np.load(path) as cache:
+        features = cache['features'].tolist()
+        label_names = cache['label_names'].tolist()
+        example_ids = cache['example_ids'].tolist()
+        labels = cache['labels'].tolist()
+        indptr = cache['indptr'].tolist()
+        indices = cache['indices'].tolist()
+        values = cache['values'].tolist()
+
+    for i, example_id in enumerate(example_ids):
+        start, end = indptr[i], indptr[i + 1]
+        yield {"x": {features[j]: value for j, value
+                     in zip(indices[start:end], values[start:end])},
+               "y": label_names[labels[i]],
+               "id": example_id}
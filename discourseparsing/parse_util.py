@@ -1,44 +1,351 @@
 # License: MIT
 
+import asyncio
 import ctypes as c
-import socket
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import http.client
+import itertools
 import logging
+import random
 import re
 import os
+from tempfile import TemporaryDirectory
+import threading
 import xmlrpc.client
 
 import nltk.data
-from nltk.tree import ParentedTree
 
 from discourseparsing.tree_util import (convert_parens_to_ptb_format,
+                                        tree_from_string,
                                         TREE_PRINT_MARGIN)
 from discourseparsing.paragraph_splitting import ParagraphSplitter
+from discourseparsing.syntax_cache import (SyntaxParseCache,
+                                           DEFAULT_MAX_ENTRIES)
+
+
+def parse_zpar_endpoints(hostname=None, port=None):
+    '''
+    Returns a list of (hostname, port) pairs for the ZPar servers to use.
+    `hostname` can be a single hostname or a comma-separated list of
+    `hostname:port` entries (e.g., "host1:8859,host2:8859"). Entries without
+    a port use `port`. If only a port is given, the local machine is used.
+    A single hostname without any port is ignored, as it was before lists
+    of servers were supported, so the ZPar library is used instead.
+    '''
+    if not hostname:
+        return [('localhost', port)] if port else []
+    if not port and ',' not in hostname and ':' not in hostname:
+        logging.warning('No port specified for zpar server {}, so the zpar '
+                        'library will be used.'.format(hostname))
+        return []
+
+    endpoints = []
+    for entry in hostname.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        if ':' in entry:
+            entry_hostname, entry_port = entry.rsplit(':', 1)
+            entry_port = int(entry_port)
+        else:
+            entry_hostname, entry_port = entry, port
+        if not entry_port:
+            raise ValueError('No port specified for zpar server {}'
+                             .format(entry))
+        endpoints.append((entry_hostname or 'localhost', entry_port))
+    return endpoints
+
+
+def zpar_model_id(zpar_model_directory):
+    '''
+    Returns an ID for the ZPar model in `zpar_model_directory`, for keying
+    the syntax cache.  It is a hash of the relative paths, sizes, and
+    modification times of the model's files, so it doesn't depend on how
+    the directory is named, and it changes if the model is retrained in
+    place.
+    '''
+    if not os.path.isdir(zpar_model_directory):
+        raise ValueError('ZPar model directory {} does not exist'
+                         .format(zpar_model_directory))
+    hasher = hashlib.sha1()
+    for dir_path, dir_names, file_names in os.walk(zpar_model_directory):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            path = os.path.join(dir_path, file_name)
+            stat = os.stat(path)
+            hasher.update('{}\t{}\t{}\n'.format(
+                os.path.relpath(path, zpar_model_directory), stat.st_size,
+                stat.st_mtime_ns).encode('utf-8'))
+    return hasher.hexdigest()
+
+
+class ZParServerClient(object):
+    '''
+    A client for one or more ZPar servers (e.g., python-zpar's zpar_server).
+
+    Each endpoint gets one ServerProxy that is kept for the lifetime of the
+    client, so that its HTTP/1.1 connection is reused across requests. The
+    sentences in a batch are sent in a single request via XML-RPC's
+    system.multicall when the server supports it. Batches are spread
+    round-robin over the endpoints, and if an endpoint cannot be reached,
+    the batch is retried on the next one.
+
+    `parse_sentences_async` instead sends the sentences one per request, with
+    up to `max_concurrency` requests in flight at once (each from its own
+    thread and connection).
+    '''
+
+    def __init__(self, endpoints, timeout=None, max_concurrency=8):
+        if not endpoints:
+            raise ValueError('No zpar server endpoints were specified.')
+        self.endpoints = list(endpoints)
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        # ServerProxy objects can't be shared between threads, so each thread
+        # gets its own set of proxies.
+        self._local = threading.local()
+        self._executor = None
+        self._multicall_unsupported = set()
+        # Start at a random endpoint so that several processes sharing the
+        # same list of servers don't all send their first batch to the same
+        # one.
+        self._endpoint_counter = \
+            itertools.count(random.randrange(len(self.endpoints)))
+
+    def _get_proxies(self):
+        if not hasattr(self._local, 'proxies'):
+            self._local.proxies = {}
+        return self._local.proxies
+
+    def _get_proxy(self, endpoint):
+        proxies = self._get_proxies()
+        proxy = proxies.get(endpoint)
+        if proxy is None:
+            transport = _TimeoutTransport(timeout=self.timeout,
+                                          use_builtin_types=True)
+            proxy = xmlrpc.client.ServerProxy(
+                'http://{}:{}'.format(*endpoint), transport=transport,
+                use_builtin_types=True, allow_none=True)
+            proxies[endpoint] = proxy
+        return proxy
+
+    def _close_proxy(self, endpoint):
+        proxy = self._get_proxies().pop(endpoint, None)
+        if proxy is not None:
+            proxy('close')()
+
+    def check_endpoints(self):
+        '''
+        Tries to reach each endpoint, drops the ones that are unreachable,
+        and returns the list of remaining endpoints.
+        '''
+        available = []
+        for endpoint in self.endpoints:
+            logging.info('Trying to connect to zpar server at {}:{} ...'
+                         .format(*endpoint))
+            # Call an empty method just to check that the server exists.
+            try:
+                self._get_proxy(endpoint)._()
+            except xmlrpc.client.Fault:
+                # The above call is expected to raise a Fault.
+                available.append(endpoint)
+            except (OSError, xmlrpc.client.ProtocolError,
+                    http.client.HTTPException):
+                logging.warning('Could not connect to zpar server at {}:{}'
+                                .format(*endpoint))
+                self._close_proxy(endpoint)
+            else:
+                available.append(endpoint)
+        self.endpoints = available
+        self._endpoint_counter = itertools.count()
+        return available
+
+    def _parse_sentences_with_multicall(self, proxy, sentences):
+        multicall = xmlrpc.client.MultiCall(proxy)
+        for sentence in sentences:
+            multicall.parse_sentence(sentence)
+        results = multicall()
+
+        res = []
+        for i, sentence in enumerate(sentences):
+            try:
+                # The server returns an empty string for a sentence that it
+                # can't parse.
+                res.append(results[i] or None)
+            except xmlrpc.client.Fault as fault:
+                logging.warning('The zpar server failed to parse: {} ({})'
+                                .format(sentence, fault.faultString))
+                res.append(None)
+        return res
+
+    def _parse_sentences_on_endpoint(self, endpoint, sentences):
+        proxy = self._get_proxy(endpoint)
+        if len(sentences) > 1 \
+                and endpoint not in self._multicall_unsupported:
+            try:
+                return self._parse_sentences_with_multicall(
+                    proxy, sentences)
+            except xmlrpc.client.Fault as fault:
+                # The whole request failed, which means that the server does
+                # not support system.multicall.
+                logging.info('zpar server at {}:{} does not support '
+                             'system.multicall ({}). Sentences will be sent '
+                             'one at a time.'.format(endpoint[0], endpoint[1],
+                                                     fault.faultString))
+                self._multicall_unsupported.add(endpoint)
+
+        return [proxy.parse_sentence(sentence) or None
+                for sentence in sentences]
+
+    def parse_sentences(self, sentences):
+        '''
+        Parses a list of tokenized sentences, returning a list of tree
+        strings with None for each sentence that could not be parsed.
+        Raises a RuntimeError if none of the endpoints can be reached.
+        '''
+        if not sentences:
+            return []
+
+        n_endpoints = len(self.endpoints)
+        start_index = next(self._endpoint_counter)
+        for i in range(n_endpoints):
+            endpoint = self.endpoints[(start_index + i) % n_endpoints]
+            try:
+                return self._parse_sentences_on_endpoint(endpoint, sentences)
+            except (OSError, xmlrpc.client.ProtocolError,
+                    http.client.HTTPException) as e:
+                logging.warning('Error from zpar server at {}:{} ({}).'
+                                .format(endpoint[0], endpoint[1], e) +
+                                ' Trying the next server.')
+                # Drop the connection so that it is reopened next time.
+                self._close_proxy(endpoint)
+
+        raise RuntimeError('Could not reach any of the zpar servers: {}'
+                           .format(', '.join('{}:{}'.format(*endpoint)
+                                             for endpoint in self.endpoints)))
+
+    async def parse_sentences_async(self, sentences):
+        '''
+        Like `parse_sentences`, but sends each sentence as its own request,
+        keeping up to `max_concurrency` requests in flight. The results are
+        in the same order as `sentences`.
+        '''
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency,
+                thread_name_prefix='zpar_client')
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def parse_sentence(sentence):
+            async with semaphore:
+                res = await loop.run_in_executor(
+                    self._executor, self.parse_sentences, [sentence])
+            return res[0]
+
+        return await asyncio.gather(*[parse_sentence(sentence)
+                                      for sentence in sentences])
+
+    def close(self):
+        '''
+        Shuts down the threads used by `parse_sentences_async`.
+        '''
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+class _TimeoutTransport(xmlrpc.client.Transport):
+    '''
+    An XML-RPC transport whose connections have a socket timeout, so that a
+    hung server leads to failover instead of blocking forever.
+    '''
+
+    def __init__(self, timeout=None, **kwargs):
+        super(_TimeoutTransport, self).__init__(**kwargs)
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super(_TimeoutTransport, self).make_connection(host)
+        if self.timeout is not None:
+            connection.timeout = self.timeout
+        return connection
+
+
+_SENTENCE_TOKENIZER = None
+
+
+def get_sentence_tokenizer():
+    '''
+    Returns NLTK's Punkt sentence tokenizer for English.  It is loaded the
+    first time it is needed and then shared by all SyntaxParserWrapper objects
+    in the process.
+    '''
+    global _SENTENCE_TOKENIZER
+    if _SENTENCE_TOKENIZER is None:
+        _SENTENCE_TOKENIZER = \
+            nltk.data.load('tokenizers/punkt/english.pickle')
+    return _SENTENCE_TOKENIZER
 
 
 class SyntaxParserWrapper():
     def __init__(self, zpar_model_directory=None, hostname=None,
-                 port=None):
+                 port=None, max_concurrency=8, cache_path=None,
+                 cache_max_entries=DEFAULT_MAX_ENTRIES, cache_model_id=None):
         self.zpar_model_directory = zpar_model_directory
         if self.zpar_model_directory is None:
             self.zpar_model_directory = os.getenv('ZPAR_MODEL_DIR',
                                                   'zpar/english')
-
-        self.tokenizer = nltk.data.load('tokenizers/punkt/english.pickle')
-        self._zpar_proxy = None
+        self._endpoints = parse_zpar_endpoints(hostname, port)
+
+        # Optionally cache parses on disk.  The cache is keyed by
+        # `cache_model_id`, which by default is computed from the files in
+        # the model directory.  This process can't tell which model ZPar
+        # servers loaded, so with servers, the ID has to be given.
+        self.cache = None
+        if cache_path:
+            if cache_model_id is None:
+                if self._endpoints:
+                    raise ValueError('A syntax cache model ID must be ' +
+                                     'given to use the syntax cache with ' +
+                                     'ZPar servers.')
+                cache_model_id = zpar_model_id(self.zpar_model_directory)
+            self.cache = SyntaxParseCache(cache_path, cache_model_id,
+                                          max_entries=cache_max_entries)
+
+        self._max_concurrency = max_concurrency
+        self._backend_initialized = False
+        self._zpar_client = None
         self._zpar_ref = None
+        self._zpar_parse_file = None
+        self._zpar_lib_executor = None
 
-        # if a port is specified, then we want to use the server
-        if port:
-
-            # if no hostname was specified, then try the local machine
-            hostname = 'localhost' if not hostname else hostname
-            logging.info('Trying to connect to zpar server at {}:{} ...'
-                         .format(hostname, port))
+    @property
+    def tokenizer(self):
+        return get_sentence_tokenizer()
 
-            # try to see if a server actually exists
-            connected, server_proxy = self._get_rpc(hostname, port)
-            if connected:
-                self._zpar_proxy = server_proxy
+    def load(self):
+        '''
+        Connects to the ZPar server(s) or loads the ZPar shared library and
+        model, if that hasn't been done yet.  This happens when the first
+        sentences are parsed rather than in __init__, since loading the model
+        takes a while, but it can be done up front by calling this (e.g.,
+        before forking worker processes that should share the model).
+        '''
+        if self._backend_initialized:
+            return
+        self._backend_initialized = True
+
+        # if a port or a list of hostname:port endpoints is specified, then
+        # we want to use the server(s)
+        if self._endpoints:
+
+            # try to see if the servers actually exist
+            client = ZParServerClient(self._endpoints,
+                                      max_concurrency=self._max_concurrency)
+            if client.check_endpoints():
+                self._zpar_client = client
             else:
                 logging.warning('Could not connect to zpar server')
 
@@ -63,33 +370,11 @@ class SyntaxParserWrapper():
                 self._initialize_zpar()
 
     def __del__(self):
-        if self._zpar_ref:
+        if getattr(self, '_zpar_ref', None):
             unload_models = self._zpar_ref.unload_models
             unload_models.restype = None
             unload_models()
 
-    @staticmethod
-    def _get_rpc(hostname, port):
-        '''
-        Tries to get the zpar server proxy, if one exists.
-        '''
-
-        proxy = xmlrpc.client.ServerProxy(
-            'http://{}:{}'.format(hostname, port),
-            use_builtin_types=True, allow_none=True)
-        # Call an empty method just to check that the server exists.
-        try:
-            proxy._()
-        except xmlrpc.client.Fault:
-            # The above call is expected to raise a Fault, so just pass here.
-            pass
-        except socket.error:
-            # If no server was found, indicate so...
-            return False, None
-
-        # Otherwise, return that a server was found, and return its proxy.
-        return True, proxy
-
     def _initialize_zpar(self):
         # define the argument and return types for all
         # the functions we want to expose to the client
@@ -101,6 +386,19 @@ class SyntaxParserWrapper():
         parse_sentence.restype = c.c_char_p
         parse_sentence.argtypes = [c.c_char_p]
 
+        # parse_file reads one sentence per line from an input file and
+        # writes one tree per line to an output file.  This lets us send all
+        # the sentences in a document to ZPar in one call.
+        try:
+            parse_file = self._zpar_ref.parse_file
+        except AttributeError:
+            logging.info('The zpar shared library does not have parse_file.' +
+                         ' Sentences will be parsed one at a time.')
+        else:
+            parse_file.restype = None
+            parse_file.argtypes = [c.c_char_p, c.c_char_p]
+            self._zpar_parse_file = parse_file
+
         if load_parser(self.zpar_model_directory.encode('utf-8')):
             self._zpar_ref.unload_models()
             raise Exception('Cannot find parser model at {}'
@@ -112,39 +410,131 @@ class SyntaxParserWrapper():
                      for s in self.tokenizer.tokenize(tmpdoc)]
         return sentences
 
-    def _parse_document_via_server(self, txt, doc_id):
-        sentences = self.tokenize_document(txt)
-        res = []
-        for sentence in sentences:
-            parsed_sent = self._zpar_proxy.parse_sentence(sentence)
-            if parsed_sent:
-                res.append(ParentedTree.fromstring(parsed_sent))
-            else:
-                logging.warning('The syntactic parser was unable to parse: ' +
-                                '{}, doc_id = {}'.format(sentence, doc_id))
-        logging.debug('syntax parsing results: {}'.format(
-            [t.pprint(margin=TREE_PRINT_MARGIN) for t in res]))
-
-        return res
+    def _parse_sentences_via_lib_file(self, sentences):
+        '''
+        Parses a batch of sentences with a single call to ZPar, by writing them
+        to a temporary file.  Returns None if ZPar did not produce one tree
+        per sentence.
+        '''
+        with TemporaryDirectory(prefix='zpar_') as tmpdir:
+            input_path = os.path.join(tmpdir, 'input.txt')
+            output_path = os.path.join(tmpdir, 'output.txt')
+            with open(input_path, 'w', encoding='utf-8') as input_file:
+                for sentence in sentences:
+                    print(sentence, file=input_file)
+            self._zpar_parse_file(input_path.encode('utf-8'),
+                                  output_path.encode('utf-8'))
+            with open(output_path, encoding='utf-8') as output_file:
+                res = [line.strip() for line in output_file]
+
+        # Remove trailing blank lines.
+        while res and not res[-1]:
+            res.pop()
+        if len(res) != len(sentences):
+            logging.warning('ZPar returned {} trees for a batch of {}'
+                            .format(len(res), len(sentences)) +
+                            ' sentences. Parsing one sentence at a time.')
+            return None
+        return [x if x else None for x in res]
+
+    def _parse_sentences_via_lib(self, sentences):
+        if self._zpar_parse_file is not None and len(sentences) > 1:
+            res = self._parse_sentences_via_lib_file(sentences)
+            if res is not None:
+                return res
 
-    def _parse_document_via_lib(self, txt, doc_id):
-        sentences = self.tokenize_document(txt)
         res = []
         for sentence in sentences:
             parsed_sent = self._zpar_ref.parse_sentence(
                 sentence.encode("utf-8"))
-            if parsed_sent:
-                res.append(
-                    ParentedTree.fromstring(parsed_sent.decode('utf-8')))
-            else:
-                logging.warning('The syntactic parser was unable to parse: ' +
-                                '{}, doc_id = {}'.format(sentence, doc_id))
-        logging.debug('syntax parsing results: {}'.format(
-            [t.pprint(margin=TREE_PRINT_MARGIN) for t in res]))
-
+            res.append(parsed_sent.decode('utf-8') if parsed_sent else None)
         return res
 
-    def parse_document(self, doc_dict):
+    def _find_uncached_sentences(self, sentences):
+        '''
+        Looks up the sentences in the cache.  Returns the list of cached parses
+        (with None for sentences that aren't cached) and the list of unique
+        sentences that still need to be parsed.
+        '''
+        res = self.cache.get_many(sentences)
+        uncached = list({sentence: None for sentence, parsed_sent
+                         in zip(sentences, res) if parsed_sent is None})
+        return res, uncached
+
+    def _add_parses_to_cache(self, sentences, res, uncached, parsed_sents):
+        self.cache.put_many(uncached, parsed_sents)
+        parse_dict = dict(zip(uncached, parsed_sents))
+        return [parse_dict[sentence] if parsed_sent is None else parsed_sent
+                for sentence, parsed_sent in zip(sentences, res)]
+
+    def parse_sentences(self, sentences):
+        '''
+        Parses a list of tokenized sentences (see tokenize_document) as a
+        batch.  Returns a list of tree strings, with None for each sentence
+        that could not be parsed.
+        '''
+        if not sentences:
+            return []
+
+        if self.cache is None:
+            return self._parse_sentences_uncached(sentences)
+        res, uncached = self._find_uncached_sentences(sentences)
+        if not uncached:
+            return res
+        parsed_sents = self._parse_sentences_uncached(uncached)
+        return self._add_parses_to_cache(sentences, res, uncached,
+                                         parsed_sents)
+
+    def _parse_sentences_uncached(self, sentences):
+        self.load()
+
+        # try to use the server first
+        if self._zpar_client:
+            return self._zpar_client.parse_sentences(sentences)
+
+        # then fall back to the shared library
+        if self._zpar_ref is None:
+            raise RuntimeError('The ZPar server is unavailable.')
+        return self._parse_sentences_via_lib(sentences)
+
+    async def parse_sentences_async(self, sentences):
+        '''
+        An async version of `parse_sentences`. With ZPar servers, up to
+        `max_concurrency` sentences are parsed concurrently. The shared
+        library isn't thread-safe, so with it, batches are parsed one at a
+        time in a separate thread.
+        '''
+        if not sentences:
+            return []
+
+        if self.cache is None:
+            return await self._parse_sentences_uncached_async(sentences)
+        res, uncached = self._find_uncached_sentences(sentences)
+        if not uncached:
+            return res
+        parsed_sents = await self._parse_sentences_uncached_async(uncached)
+        return self._add_parses_to_cache(sentences, res, uncached,
+                                         parsed_sents)
+
+    async def _parse_sentences_uncached_async(self, sentences):
+        self.load()
+        if self._zpar_client:
+            return await self._zpar_client.parse_sentences_async(sentences)
+
+        if self._zpar_ref is None:
+            raise RuntimeError('The ZPar server is unavailable.')
+        if self._zpar_lib_executor is None:
+            self._zpar_lib_executor = ThreadPoolExecutor(max_workers=1)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._zpar_lib_executor,
+                                          self._parse_sentences_via_lib,
+                                          sentences)
+
+    def _split_document(self, doc_dict):
+        '''
+        Splits the raw text of a document into paragraphs and the paragraphs
+        into tokenized sentences.
+        '''
         doc_id = doc_dict["doc_id"]
         logging.info('syntax parsing, doc_id = {}'.format(doc_id))
 
@@ -152,19 +542,34 @@ class SyntaxParserWrapper():
         # quotes, etc.? The tokenizer doesn't appear to handle it well
         paragraphs = ParagraphSplitter.find_paragraphs(doc_dict["raw_text"],
                                                        doc_id=doc_id)
+        paragraph_sentences = [self.tokenize_document(paragraph)
+                               for paragraph in paragraphs]
+        return paragraph_sentences
 
+    @staticmethod
+    def _group_trees(doc_id, paragraph_sentences, parsed_sents):
+        '''
+        Converts the parses of the sentences from all the paragraphs into
+        trees, and returns the trees along with a list of indicators of
+        whether each tree starts a paragraph.
+        '''
         starts_paragraph_list = []
         trees = []
         no_parse_for_paragraph = False
-        for paragraph in paragraphs:
-            # try to use the server first
-            if self._zpar_proxy:
-                trees_p = self._parse_document_via_server(paragraph, doc_id)
-            # then fall back to the shared library
-            else:
-                if self._zpar_ref is None:
-                    raise RuntimeError('The ZPar server is unavailable.')
-                trees_p = self._parse_document_via_lib(paragraph, doc_id)
+        parse_idx = 0
+        for sentences in paragraph_sentences:
+            trees_p = []
+            for sentence in sentences:
+                parsed_sent = parsed_sents[parse_idx]
+                parse_idx += 1
+                if parsed_sent:
+                    trees_p.append(tree_from_string(parsed_sent))
+                else:
+                    logging.warning('The syntactic parser was unable to ' +
+                                    'parse: {}, doc_id = {}'
+                                    .format(sentence, doc_id))
+            logging.debug('syntax parsing results: {}'.format(
+                [t.pprint(margin=TREE_PRINT_MARGIN) for t in trees_p]))
 
             if len(trees_p) > 0:
                 starts_paragraph_list.append(True)
@@ -181,8 +586,55 @@ class SyntaxParserWrapper():
         # Check that either the number of True indicators in
         # starts_paragraph_list equals the number of paragraphs, or that the
         # syntax parser had to skip a paragraph entirely.
-        assert (sum(starts_paragraph_list) == len(paragraphs)
+        assert (sum(starts_paragraph_list) == len(paragraph_sentences)
                 or no_parse_for_paragraph)
         assert len(trees) == len(starts_paragraph_list)
 
         return trees, starts_paragraph_list
+
+    def parse_document(self, doc_dict):
+        paragraph_sentences = self._split_document(doc_dict)
+
+        # Parse the sentences from all the paragraphs as one batch.
+        parsed_sents = self.parse_sentences(
+            [sentence for sentences in paragraph_sentences
+             for sentence in sentences])
+
+        return self._group_trees(doc_dict["doc_id"], paragraph_sentences,
+                                 parsed_sents)
+
+    def parse_documents(self, doc_dicts):
+        '''
+        Like `parse_document`, but parses the sentences of several documents
+        as one batch.  Returns a list of (trees, starts_paragraph_list)
+        tuples, one per document.
+        '''
+        paragraph_sentences_docs = [self._split_document(doc_dict)
+                                    for doc_dict in doc_dicts]
+        parsed_sents = self.parse_sentences(
+            [sentence for paragraph_sentences in paragraph_sentences_docs
+             for sentences in paragraph_sentences
+             for sentence in sentences])
+
+        res = []
+        parse_idx = 0
+        for doc_dict, paragraph_sentences in zip(doc_dicts,
+                                                 paragraph_sentences_docs):
+            n_sentences = sum(len(x) for x in paragraph_sentences)
+            res.append(self._group_trees(
+                doc_dict["doc_id"], paragraph_sentences,
+                parsed_sents[parse_idx:parse_idx + n_sentences]))
+            parse_idx += n_sentences
+        return res
+
+    async def parse_document_async(self, doc_dict):
+        '''
+        An async version of `parse_document`, which parses the sentences of
+        the document concurrently (see `parse_sentences_async`).
+        '''
+        paragraph_sentences = self._split_document(doc_dict)
+        parsed_sents = await self.parse_sentences_async(
+            [sentence for sentences in paragraph_sentences
+             for sentence in sentences])
+        return self._group_trees(doc_dict["doc_id"], paragraph_sentences,
+                                 parsed_sents)
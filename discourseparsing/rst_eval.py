@@ -4,47 +4,85 @@
 from collections import Counter
 import json
 import logging
+import os
 from operator import itemgetter
+import sys
 
-from nltk.tree import ParentedTree
+# The modules that import NLTK and SKLL are imported in the functions that
+# use them, so that the command line interface starts quickly (e.g., for
+# --help).
 
-from discourseparsing.discourse_parsing import Parser
-from discourseparsing.discourse_segmentation import (Segmenter,
-                                                     extract_edus_tokens)
-from discourseparsing.parse_util import SyntaxParserWrapper
-from discourseparsing.rst_parse import segment_and_parse
-from discourseparsing.collapse_rst_labels import collapse_rst_labels
 
+def _extract_span_array(edu_tokens_lists, tree, label_ids):
+    '''
+    Returns an integer array with a row of (label ID, start token index, end
+    token index) for each labeled span in an RST tree, whose leaves are
+    indices into the list of EDUs.  New labels are added to `label_ids`, a
+    dictionary from labels to IDs.
+    '''
+    import numpy as np
+    from nltk.tree import Tree
 
-def _extract_spans(doc_id, edu_tokens_lists, tree):
     # Precompute the token indices for each EDU.
-    edu_token_spans = []
-    prev_end = -1
-    for edu_tokens_list in edu_tokens_lists:
-        start = prev_end + 1
-        end = start + len(edu_tokens_list) - 1
-        edu_token_spans.append((start, end))
-        prev_end = end
+    edu_lengths = [len(x) for x in edu_tokens_lists]
+    edu_token_ends = (np.cumsum(edu_lengths, dtype=np.int64) - 1).tolist()
+    edu_token_starts = [end - length + 1 for end, length
+                        in zip(edu_token_ends, edu_lengths)]
     # TODO Are just the start and end indices sufficient if there are same-unit
     # relations, where some other EDU (e.g., attribution) might be in the
     # middle?  Or should we use a list of tokens instead of just (start, end)
     # indices?
 
-    # Now compute the token spans for each subtree in the RST tree,
-    # whose leaves are indices into the list of EDUs.
-    res = set()
-    for subtree in tree.subtrees():
-        if subtree.label() == 'text' or subtree.label() == 'ROOT':
+    # List the subtrees so that each one comes before its descendants, and
+    # then compute the first and last EDU of each subtree from its children
+    # in the reverse order (i.e., a post-order pass, without calling
+    # leaves() for each subtree).
+    subtrees = [tree]
+    i = 0
+    while i < len(subtrees):
+        subtrees.extend(child for child in subtrees[i]
+                        if isinstance(child, Tree))
+        i += 1
+
+    edu_ranges = {}
+    rows = []
+    # Tree.__getitem__ also handles tree positions, so use the faster list
+    # method.
+    get_child = list.__getitem__
+    for subtree in reversed(subtrees):
+        first_child = get_child(subtree, 0)
+        last_child = get_child(subtree, -1)
+        first_edu = edu_ranges[id(first_child)][0] \
+            if isinstance(first_child, Tree) else int(first_child)
+        last_edu = edu_ranges[id(last_child)][1] \
+            if isinstance(last_child, Tree) else int(last_child)
+        edu_ranges[id(subtree)] = (first_edu, last_edu)
+
+        label = subtree.label()
+        if label == 'text' or label == 'ROOT':
             # TODO should the nodes immediately above the text nodes be skipped
             # as well (they seem important for evaluating labeled spans but
             # trivial for the case of evaluating unlabeled spans)
             continue
-        leaves = subtree.leaves()
-        res.add((doc_id,
-                 subtree.label(),
-                 edu_token_spans[int(leaves[0])][0],
-                 edu_token_spans[int(leaves[-1])][1]))
-    return res
+        rows.append((label_ids.setdefault(label, len(label_ids)),
+                     edu_token_starts[first_edu], edu_token_ends[last_edu]))
+    return np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+
+def _extract_span_arrays(edu_tokens_lists_list, trees, label_ids):
+    '''
+    Returns an integer array with a row of (document index, label ID, start
+    token index, end token index) for each labeled span in the trees.
+    '''
+    import numpy as np
+
+    arrays = [np.zeros((0, 4), dtype=np.int64)]
+    for doc_index, (edu_tokens_lists, tree) in enumerate(
+            zip(edu_tokens_lists_list, trees)):
+        spans = _extract_span_array(edu_tokens_lists, tree, label_ids)
+        arrays.append(np.column_stack([np.full(len(spans), doc_index,
+                                               dtype=np.int64), spans]))
+    return np.concatenate(arrays)
 
 
 def compute_p_r_f1(gold_tuples, pred_tuples):
@@ -54,32 +92,138 @@ def compute_p_r_f1(gold_tuples, pred_tuples):
     return precision, recall, f1
 
 
+# The levels of evaluation (spans with full labels, spans with nuclearity
+# labels, and unlabeled spans), in the order of the rows of the arrays from
+# compute_rst_eval_counts.
+EVAL_LEVELS = ['labeled', 'nuc', 'span']
+
+
+def _compute_rst_eval_counts(pred_edu_tokens_lists, pred_trees, gold):
+    '''
+    Returns the counts from compute_rst_eval_counts, along with Counters of
+    the labels of the false positives and false negatives, for predictions
+    of the documents in a GoldEvalData.
+    '''
+    import numpy as np
+
+    # Extract arrays of labeled spans for the predicted trees, with the same
+    # label IDs as the gold spans.
+    label_ids = dict(gold.label_ids)
+    pred_spans = _extract_span_arrays(pred_edu_tokens_lists, pred_trees,
+                                      label_ids)
+    gold_spans = gold.spans
+    labels = sorted(label_ids, key=label_ids.get)
+    nuc_ids = {}
+    nuc_id_for_label = np.array(
+        [nuc_ids.setdefault(label.split(':')[0], len(nuc_ids))
+         for label in labels], dtype=np.int64)
+
+    # Encode each (document, label, start, end) tuple as a single integer,
+    # so that the spans can be deduplicated and matched as sorted arrays.
+    n_docs = len(gold)
+    n_labels = max(len(labels), 1)
+    n_positions = int(max(pred_spans[:, 3].max(initial=0),
+                          gold_spans[:, 3].max(initial=0))) + 1
+    if n_docs * n_labels * n_positions ** 2 >= 2 ** 63:
+        raise ValueError('The evaluation set is too large to encode spans ' +
+                         'as 64-bit integers.')
+    doc_radix = n_labels * n_positions ** 2
+
+    def encode(spans, span_labels):
+        return np.unique(((spans[:, 0] * n_labels + span_labels)
+                          * n_positions + spans[:, 2]) * n_positions
+                         + spans[:, 3])
+
+    counts = np.zeros((n_docs, len(EVAL_LEVELS), 3), dtype=np.int64)
+    for level_index, level in enumerate(EVAL_LEVELS):
+        if level == 'labeled':
+            pred_labels = pred_spans[:, 1]
+            gold_labels = gold_spans[:, 1]
+        elif level == 'nuc':
+            # Project the labels to just nuclearity.
+            pred_labels = nuc_id_for_label[pred_spans[:, 1]]
+            gold_labels = nuc_id_for_label[gold_spans[:, 1]]
+        else:
+            pred_labels = np.zeros(len(pred_spans), dtype=np.int64)
+            gold_labels = np.zeros(len(gold_spans), dtype=np.int64)
+        pred_keys = encode(pred_spans, pred_labels)
+        gold_keys = encode(gold_spans, gold_labels)
+        matched_keys = np.intersect1d(pred_keys, gold_keys,
+                                      assume_unique=True)
+        for i, keys in enumerate([matched_keys, pred_keys, gold_keys]):
+            counts[:, level_index, i] = np.bincount(keys // doc_radix,
+                                                    minlength=n_docs)
+
+        if level == 'labeled':
+            label_counts = [
+                np.bincount(
+                    (np.setdiff1d(keys_a, keys_b, assume_unique=True)
+                     // n_positions ** 2) % n_labels,
+                    minlength=len(labels))
+                for keys_a, keys_b in [(pred_keys, gold_keys),
+                                       (gold_keys, pred_keys)]]
+            false_positives, false_negatives = [
+                Counter({label: int(n) for label, n in zip(labels, x) if n})
+                for x in label_counts]
+    return counts, false_positives, false_negatives
+
+
+def compute_rst_eval_counts(pred_edu_tokens_lists, pred_trees,
+                            gold_edu_tokens_lists, gold_trees):
+    '''
+    Returns an integer array of shape (number of documents, 3, 3) with
+    the numbers of matching, predicted, and gold spans (the last axis) in
+    each document for each of the EVAL_LEVELS (the middle axis).  The
+    counts are sufficient statistics for the evaluation results: the
+    results for any set of documents (e.g., a bootstrap sample) are
+    `compute_rst_eval_results_from_counts` of the sum of their counts.
+    '''
+    gold = GoldEvalData(gold_edu_tokens_lists, gold_trees)
+    return gold.compute_counts(pred_edu_tokens_lists, pred_trees)
+
+
+def compute_rst_eval_results_from_counts(counts):
+    '''
+    Computes precision, recall, and F1 for each evaluation level from counts
+    of matching, predicted, and gold spans, summed over documents (see
+    compute_rst_eval_counts).  `counts` may have extra leading axes (e.g.,
+    one for bootstrap samples), in which case the values in the result are
+    arrays.  F1 is 0 where there are no matching spans.
+    '''
+    import numpy as np
+
+    counts = np.asarray(counts, dtype=np.float64)
+    res = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for level_index, level in enumerate(EVAL_LEVELS):
+            matched = counts[..., level_index, 0]
+            precision = matched / counts[..., level_index, 1]
+            recall = matched / counts[..., level_index, 2]
+            f1 = np.where(matched > 0,
+                          2.0 * precision * recall / (precision + recall),
+                          0.0)
+            res[level + '_precision'] = precision
+            res[level + '_recall'] = recall
+            res[level + '_f1'] = f1
+    if counts.ndim == 2:
+        res = {key: float(value) for key, value in res.items()}
+    return res
+
+
 def compute_rst_eval_results(pred_edu_tokens_lists, pred_trees,
                              gold_edu_tokens_lists, gold_trees):
+    gold = GoldEvalData(gold_edu_tokens_lists, gold_trees)
+    return gold.evaluate(pred_edu_tokens_lists, pred_trees)
 
-    # Extract sets of labeled spans for the gold and predicted trees.
-    pred_tuples = set()
-    for i, (edu_tokens_list, tree) in enumerate(zip(pred_edu_tokens_lists,
-                                                    pred_trees)):
-        pred_tuples |= _extract_spans(i, edu_tokens_list, tree)
-    gold_tuples = set()
-    for i, (edu_tokens_list, tree) in enumerate(zip(gold_edu_tokens_lists,
-                                                    gold_trees)):
-        gold_tuples |= _extract_spans(i, edu_tokens_list, tree)
 
-    # Evaluate F1 for unlabeled spans, spans with nuclearity labels,
-    # and spans with full labels.
-
-    # Compute p/r/f1 for labeled spans.
-    labeled_precision, labeled_recall, labeled_f1 \
-        = compute_p_r_f1(gold_tuples, pred_tuples)
+def _compute_rst_eval_results(pred_edu_tokens_lists, pred_trees, gold):
+    counts, false_positives, false_negatives = \
+        _compute_rst_eval_counts(pred_edu_tokens_lists, pred_trees, gold)
 
     logging.info('false positives: {}'.format(
-        sorted(Counter([x[1] for x in pred_tuples - gold_tuples]).items(),
-               key=itemgetter(1))))
+        sorted(false_positives.items(), key=itemgetter(1))))
     logging.info('false negatives: {}'.format(
-        sorted(Counter([x[1] for x in gold_tuples - pred_tuples]).items(),
-               key=itemgetter(1))))
+        sorted(false_negatives.items(), key=itemgetter(1))))
     # confusions = [(x[1], y[1]) for x, y in
     #               itertools.product(gold_tuples, pred_tuples)
     #               if x[0] == y[0] and x[2:3] == y[2:3] and x[1] != y[1]]
@@ -87,107 +231,392 @@ def compute_rst_eval_results(pred_edu_tokens_lists, pred_trees,
     #     sorted(Counter(confusions).items(),
     #            key=itemgetter(1))))
 
-    # Compute p/r/f1 for spans + nuclearity.
-    gold_tuples = {(tup[0], tup[1].split(':')[0], tup[2], tup[3])
-                   for tup in gold_tuples}
-    pred_tuples = {(tup[0], tup[1].split(':')[0], tup[2], tup[3])
-                   for tup in pred_tuples}
-    nuc_precision, nuc_recall, nuc_f1 = \
-        compute_p_r_f1(gold_tuples, pred_tuples)
-
-    # Compute p/r/f1 for just spans.
-    gold_tuples = {(tup[0], tup[2], tup[3])
-                   for tup in gold_tuples}
-    pred_tuples = {(tup[0], tup[2], tup[3])
-                   for tup in pred_tuples}
-    span_precision, span_recall, span_f1 = \
-        compute_p_r_f1(gold_tuples, pred_tuples)
-
-    # Create a list of all the eval statistics.
-    res = {"labeled_precision": labeled_precision,
-           "labeled_recall": labeled_recall,
-           "labeled_f1": labeled_f1,
-           "nuc_precision": nuc_precision,
-           "nuc_recall": nuc_recall,
-           "nuc_f1": nuc_f1,
-           "span_precision": span_precision,
-           "span_recall": span_recall,
-           "span_f1": span_f1}
-
-    return res
+    # Evaluate F1 for unlabeled spans, spans with nuclearity labels,
+    # and spans with full labels.
+    return compute_rst_eval_results_from_counts(counts.sum(axis=0))
+
+
+def extract_gold_for_eval(doc_dict):
+    '''
+    Returns the gold standard EDU tokens and RST tree (with collapsed labels)
+    for an evaluation document.
+    '''
+    from discourseparsing.discourse_segmentation import extract_edus_tokens
+    from discourseparsing.collapse_rst_labels import collapse_rst_labels
+    from discourseparsing.tree_util import tree_from_string
+
+    gold_edu_tokens = extract_edus_tokens(doc_dict['edu_start_indices'],
+                                          doc_dict['tokens'])
+
+    # Collapse the RST labels to use the coarse relations that the parser
+    # produces.
+    gold_tree = tree_from_string(doc_dict['rst_tree'])
+    collapse_rst_labels(gold_tree)
+    return gold_edu_tokens, gold_tree
+
+
+class GoldEvalData(object):
+    '''
+    The gold standard side of an evaluation set: the EDU tokens, the RST
+    trees with collapsed labels, and the arrays of labeled spans, which only
+    need to be computed once however many times the set is used (e.g., for
+    each model when tuning).  See load_gold_eval_data for caching them.
+    '''
+
+    def __init__(self, gold_edu_tokens_lists, gold_trees):
+        self.edu_tokens_lists = list(gold_edu_tokens_lists)
+        self.trees = list(gold_trees)
+        self.label_ids = {}
+        self.spans = _extract_span_arrays(self.edu_tokens_lists, self.trees,
+                                          self.label_ids)
+
+    @classmethod
+    def from_eval_data(cls, eval_data):
+        gold_edu_tokens_lists = []
+        gold_trees = []
+        for doc_dict in eval_data:
+            gold_edu_tokens, gold_tree = extract_gold_for_eval(doc_dict)
+            gold_edu_tokens_lists.append(gold_edu_tokens)
+            gold_trees.append(gold_tree)
+        return cls(gold_edu_tokens_lists, gold_trees)
+
+    def __len__(self):
+        return len(self.trees)
+
+    def compute_counts(self, pred_edu_tokens_lists, pred_trees):
+        '''
+        Returns the counts from compute_rst_eval_counts for predictions of
+        these documents.
+        '''
+        return _compute_rst_eval_counts(pred_edu_tokens_lists, pred_trees,
+                                        self)[0]
+
+    def evaluate(self, pred_edu_tokens_lists, pred_trees):
+        '''
+        Returns the results from compute_rst_eval_results for predictions of
+        these documents.
+        '''
+        return _compute_rst_eval_results(pred_edu_tokens_lists, pred_trees,
+                                         self)
+
+
+# Bump this when the gold standard preprocessing changes (e.g., the label
+# collapsing) to invalidate the files cached by load_gold_eval_data.
+GOLD_CACHE_VERSION = 1
+
+# GoldEvalData objects loaded by load_gold_eval_data, keyed by file hash.
+_gold_eval_data_cache = {}
+
+
+def read_eval_set(eval_path):
+    '''
+    Reads the JSON evaluation set at `eval_path` (or from standard input if
+    it's "-").  Returns the list of documents and the SHA-1 hex digest of the
+    file (the same as from hash_path), so that the file only has to be read
+    once.
+    '''
+    import hashlib
+
+    if eval_path == '-':
+        contents = sys.stdin.buffer.read()
+    else:
+        with open(eval_path, 'rb') as f:
+            contents = f.read()
+    return (json.loads(contents.decode('utf-8')),
+            hashlib.sha1(contents).hexdigest())
+
+
+def load_gold_eval_data(eval_data, eval_data_hash=None, cache_dir=None):
+    '''
+    Returns a GoldEvalData for the documents in `eval_data`.  If the hash of
+    the evaluation set file is given (see read_eval_set), the GoldEvalData
+    is cached in memory and, if `cache_dir` is given, in a file there, keyed
+    by the hash.
+    '''
+    import pickle
+
+    if eval_data_hash is None:
+        return GoldEvalData.from_eval_data(eval_data)
+    key = '{}_v{}'.format(eval_data_hash, GOLD_CACHE_VERSION)
+    if key in _gold_eval_data_cache:
+        return _gold_eval_data_cache[key]
+
+    cache_path = os.path.join(cache_dir, 'gold_{}.pickle'.format(key)) \
+        if cache_dir is not None else None
+    if cache_path is not None and os.path.exists(cache_path):
+        logging.info('Loading cached gold standard data from {}'
+                     .format(cache_path))
+        with open(cache_path, 'rb') as f:
+            gold = pickle.load(f)
+    else:
+        gold = GoldEvalData.from_eval_data(eval_data)
+        if cache_path is not None:
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir)
+            tmp_path = '{}.tmp{}'.format(cache_path, os.getpid())
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(gold, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+    _gold_eval_data_cache[key] = gold
+    return gold
+
+
+def _predict_rst_tree_for_eval(doc_dict, syntax_parser, segmenter,
+                               rst_parser, use_gold_syntax, extract_gold):
+    '''
+    Returns the predicted EDU tokens and RST tree for a document and, if
+    `extract_gold` is true, the gold standard ones (otherwise, None and
+    None).
+    '''
+    from discourseparsing.rst_parse import segment_and_parse
+
+    logging.info('processing {}...'.format(doc_dict['path_basename']))
+    gold_edu_tokens, gold_tree = extract_gold_for_eval(doc_dict) \
+        if extract_gold else (None, None)
+
+    # TODO when not using gold syntax, should the script still use gold
+    # standard tokens?
+
+    # remove gold standard trees or EDU boundaries if evaluating
+    # using automatic preprocessing
+    if not use_gold_syntax:
+        # TODO will merging the EDU strings here to make the raw_text
+        # variable produce the appropriate eval result when not using gold
+        # standard trees?
+        doc_dict['raw_text'] = ' '.join(doc_dict['edu_strings'])
+        del doc_dict['syntax_trees']
+        del doc_dict['token_tree_positions']
+        del doc_dict['tokens']
+        del doc_dict['pos_tags']
+    if segmenter is not None:
+        del doc_dict['edu_start_indices']
+
+    # predict the RST tree
+    tokens, trees = segment_and_parse(doc_dict, syntax_parser,
+                                      segmenter, rst_parser)
+    return tokens, next(trees)['tree'], gold_edu_tokens, gold_tree
+
+
+# The models and data for the worker processes in predict_rst_trees_for_eval,
+# which are set when each process starts (see _initialize_eval_worker).
+# With the fork start method, they are inherited rather than pickled.
+_eval_worker_args = None
+
+
+def _initialize_eval_worker(eval_data, syntax_parser, segmenter, rst_parser,
+                            use_gold_syntax, extract_gold):
+    global _eval_worker_args
+    _eval_worker_args = (eval_data, syntax_parser, segmenter, rst_parser,
+                         use_gold_syntax, extract_gold)
+
+
+def _predict_rst_tree_in_worker(doc_index):
+    eval_data, syntax_parser, segmenter, rst_parser, use_gold_syntax, \
+        extract_gold = _eval_worker_args
+    return _predict_rst_tree_for_eval(eval_data[doc_index], syntax_parser,
+                                      segmenter, rst_parser, use_gold_syntax,
+                                      extract_gold)
 
 
 def predict_rst_trees_for_eval(syntax_parser, segmenter, rst_parser, eval_data,
-                               use_gold_syntax=True):
-    pred_edu_tokens_lists = []
-    pred_trees = []
-    gold_edu_tokens_lists = []
-    gold_trees = []
-
-    for doc_dict in eval_data:
-        logging.info('processing {}...'.format(doc_dict['path_basename']))
-        gold_edu_tokens_lists.append( \
-            extract_edus_tokens(doc_dict['edu_start_indices'],
-                                doc_dict['tokens']))
-
-        # Collapse the RST labels to use the coarse relations that the parser
-        # produces.
-        gold_tree = ParentedTree.fromstring(doc_dict['rst_tree'])
-        collapse_rst_labels(gold_tree)
-        gold_trees.append(gold_tree)
-
-        # TODO when not using gold syntax, should the script still use gold
-        # standard tokens?
-
-        # remove gold standard trees or EDU boundaries if evaluating
-        # using automatic preprocessing
-        if not use_gold_syntax:
-            # TODO will merging the EDU strings here to make the raw_text
-            # variable produce the appropriate eval result when not using gold
-            # standard trees?
-            doc_dict['raw_text'] = ' '.join(doc_dict['edu_strings'])
-            del doc_dict['syntax_trees']
-            del doc_dict['token_tree_positions']
-            del doc_dict['tokens']
-            del doc_dict['pos_tags']
-        if segmenter is not None:
-            del doc_dict['edu_start_indices']
-
-        # predict the RST tree
-        tokens, trees = segment_and_parse(doc_dict, syntax_parser,
-                                          segmenter, rst_parser)
-        pred_trees.append(next(trees)['tree'])
-        pred_edu_tokens_lists.append(tokens)
+                               use_gold_syntax=True, max_workers=1,
+                               gold=None):
+    '''
+    Predicts RST trees for the evaluation documents, with `max_workers`
+    processes if it's greater than 1 and the platform can fork processes
+    (the workers inherit the models, which might not be picklable).  The
+    results are in the order of `eval_data` either way, so the evaluation
+    results are the same.  The
+    gold standard EDU tokens and trees are taken from `gold` (a
+    GoldEvalData for `eval_data`) if it's given.
+    '''
+    import multiprocessing
+
+    extract_gold = gold is None
+    if max_workers > 1 and len(eval_data) > 1 \
+            and 'fork' in multiprocessing.get_all_start_methods():
+        from concurrent.futures import ProcessPoolExecutor
+
+        # Load the RST parsing model before starting the workers, so that
+        # they share it rather than each loading it.
+        rst_parser.load_model()
+        with ProcessPoolExecutor(
+                max_workers=min(max_workers, len(eval_data)),
+                initializer=_initialize_eval_worker,
+                initargs=(eval_data, syntax_parser, segmenter, rst_parser,
+                          use_gold_syntax, extract_gold),
+                mp_context=multiprocessing.get_context('fork')) as executor:
+            results = list(executor.map(_predict_rst_tree_in_worker,
+                                        range(len(eval_data))))
+    else:
+        results = [_predict_rst_tree_for_eval(doc_dict, syntax_parser,
+                                              segmenter, rst_parser,
+                                              use_gold_syntax, extract_gold)
+                   for doc_dict in eval_data]
+
+    pred_edu_tokens_lists = [x[0] for x in results]
+    pred_trees = [x[1] for x in results]
+    if gold is not None:
+        gold_edu_tokens_lists = gold.edu_tokens_lists
+        gold_trees = gold.trees
+    else:
+        gold_edu_tokens_lists = [x[2] for x in results]
+        gold_trees = [x[3] for x in results]
     return (pred_edu_tokens_lists, pred_trees, gold_edu_tokens_lists,
             gold_trees)
 
 
 def predict_and_evaluate_rst_trees(syntax_parser, segmenter, rst_parser,
-                                   eval_data, use_gold_syntax=True):
-
-    pred_edu_tokens_lists, pred_trees, gold_edu_tokens_lists, gold_trees = \
+                                   eval_data, use_gold_syntax=True,
+                                   max_workers=1, gold=None):
+    # Preprocess the gold standard data before parsing, which may remove
+    # some of it from the documents.
+    if gold is None:
+        gold = GoldEvalData.from_eval_data(eval_data)
+
+    pred_edu_tokens_lists, pred_trees, _, _ = \
         predict_rst_trees_for_eval(syntax_parser, segmenter, rst_parser,
-                                   eval_data, use_gold_syntax=use_gold_syntax)
+                                   eval_data, use_gold_syntax=use_gold_syntax,
+                                   max_workers=max_workers, gold=gold)
+
+    res = gold.evaluate(pred_edu_tokens_lists, pred_trees)
+    return res
 
-    res = compute_rst_eval_results(pred_edu_tokens_lists, pred_trees,
-                                   gold_edu_tokens_lists, gold_trees)
+
+def _open_predictions_file(path, mode):
+    if path.endswith('.gz'):
+        import gzip
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def save_predictions(path, doc_ids, pred_edu_tokens_lists, pred_trees):
+    '''
+    Writes predicted EDU tokens and RST trees to a file with one JSON object
+    per line, with "doc_id", "edu_tokens", and "tree" keys.  The file is
+    compressed if `path` ends with ".gz".
+    '''
+    from discourseparsing.tree_util import TREE_PRINT_MARGIN
+
+    with _open_predictions_file(path, 'w') as f:
+        for doc_id, edu_tokens, tree in zip(doc_ids, pred_edu_tokens_lists,
+                                            pred_trees):
+            print(json.dumps({"doc_id": doc_id,
+                              "edu_tokens": edu_tokens,
+                              "tree": tree.pformat(margin=TREE_PRINT_MARGIN)}),
+                  file=f)
+
+
+def load_predictions(path):
+    '''
+    Reads a file written by save_predictions and returns a dictionary from
+    document IDs to (EDU tokens, RST tree) tuples.
+    '''
+    from discourseparsing.tree_util import tree_from_string
+
+    res = {}
+    with _open_predictions_file(path, 'r') as f:
+        for line in f:
+            pred = json.loads(line)
+            res[pred["doc_id"]] = (pred["edu_tokens"],
+                                   tree_from_string(pred["tree"]))
     return res
 
 
+def predictions_for_eval(predictions, eval_data, gold=None):
+    '''
+    Returns the predicted and gold EDU tokens and RST trees, in the same form
+    as predict_rst_trees_for_eval, with predictions from load_predictions
+    for the documents in `eval_data` (identified by "path_basename").  The
+    gold standard ones are taken from `gold` if it's given.
+    '''
+    missing = [doc_dict['path_basename'] for doc_dict in eval_data
+               if doc_dict['path_basename'] not in predictions]
+    if missing:
+        raise ValueError('No predictions for {} of the evaluation '
+                         'documents (e.g., {})'.format(len(missing),
+                                                       missing[0]))
+
+    pred_edu_tokens_lists = []
+    pred_trees = []
+    for doc_dict in eval_data:
+        pred_edu_tokens, pred_tree = predictions[doc_dict['path_basename']]
+        pred_edu_tokens_lists.append(pred_edu_tokens)
+        pred_trees.append(pred_tree)
+    if gold is None:
+        gold = GoldEvalData.from_eval_data(eval_data)
+    return (pred_edu_tokens_lists, pred_trees, gold.edu_tokens_lists,
+            gold.trees)
+
+
+def hash_path(path, hasher=None):
+    '''
+    Returns the SHA-1 hex digest of the contents of a file or of all of the
+    files in a directory (e.g., a parsing model directory), or updates
+    `hasher` with them.
+    '''
+    import hashlib
+
+    res = hasher if hasher is not None else hashlib.sha1()
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            res.update(name.encode('utf-8'))
+            hash_path(os.path.join(path, name), res)
+    else:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                res.update(block)
+    return res.hexdigest()
+
+
+def evaluate_with_saved_predictions(rst_parser, eval_data, predictions_path,
+                                    max_workers=1, gold=None):
+    '''
+    Evaluates an RST parser on `eval_data` (with gold syntax and EDUs) like
+    predict_and_evaluate_rst_trees, but saves the predictions to
+    `predictions_path`, or, if that file already exists, evaluates the
+    predictions in it instead of parsing the documents again.  The caller is
+    responsible for making the path specific to the model and evaluation
+    data (e.g., with hash_path).
+    '''
+    if gold is None:
+        gold = GoldEvalData.from_eval_data(eval_data)
+    if os.path.exists(predictions_path):
+        logging.info('Evaluating saved predictions from {}'
+                     .format(predictions_path))
+        pred_edu_tokens_lists, pred_trees, _, _ = predictions_for_eval(
+            load_predictions(predictions_path), eval_data, gold=gold)
+        return gold.evaluate(pred_edu_tokens_lists, pred_trees)
+
+    doc_ids = [doc_dict['path_basename'] for doc_dict in eval_data]
+    pred_edu_tokens_lists, pred_trees, _, _ = \
+        predict_rst_trees_for_eval(None, None, rst_parser, eval_data,
+                                   max_workers=max_workers, gold=gold)
+    # Write to a temporary file first so that an interrupted run doesn't
+    # leave an incomplete file behind to be reused.
+    # (The name keeps the extension, which determines the compression.)
+    tmp_path = os.path.join(os.path.dirname(predictions_path), '.tmp{}.{}'
+                            .format(os.getpid(),
+                                    os.path.basename(predictions_path)))
+    save_predictions(tmp_path, doc_ids, pred_edu_tokens_lists, pred_trees)
+    os.replace(tmp_path, predictions_path)
+    return gold.evaluate(pred_edu_tokens_lists, pred_trees)
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(
         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument('evaluation_set',
-                        help='The dev or test set JSON file',
-                        type=argparse.FileType('r'))
+                        help='The dev or test set JSON file ("-" for ' +
+                        'standard input)')
     parser.add_argument('-g', '--segmentation_model',
                         help='Path to segmentation model.  If not specified,' +
                         'then gold EDUs will be used.',
                         default=None)
     parser.add_argument('-p', '--parsing_model',
-                        help='Path to RST parsing model.',
-                        required=True)
+                        help='Path to RST parsing model.  Required unless ' +
+                        '--from_predictions is given.')
     parser.add_argument('-z', '--zpar_directory', default='zpar')
     parser.add_argument('-t', '--use_gold_syntax',
                         help='If specified, then gold PTB syntax trees will' +
@@ -198,13 +627,32 @@ def main():
     parser.add_argument('-s', '--max_states',
                         help='Maximum number of states to retain for ' +
                         'best-first search', type=int, default=1)
+    parser.add_argument('-m', '--max_workers', type=int, default=1,
+                        help='number of processes to parse the evaluation ' +
+                        'documents with')
+    parser.add_argument('-o', '--save_predictions', default=None,
+                        help='path to save the predicted EDUs and trees to ' +
+                        '(compressed if it ends with .gz), e.g., for ' +
+                        'util/compute_paired_bootstrap.py')
+    parser.add_argument('-f', '--from_predictions', default=None,
+                        help='path to predictions saved with ' +
+                        '--save_predictions to evaluate instead of ' +
+                        'parsing the documents (no models are loaded)')
+    parser.add_argument('--gold_cache_dir', default=None,
+                        help='directory for caching the preprocessed gold ' +
+                        'standard trees and spans of evaluation sets, ' +
+                        'keyed by the hash of the evaluation set file')
     parser.add_argument('-v', '--verbose',
                         help='Print more status information. For every ' +
                         'additional time this flag is specified, ' +
                         'output gets more verbose.',
                         default=0, action='count')
     args = parser.parse_args()
-    assert args.use_gold_syntax or args.segmentation_model
+    if args.from_predictions is None:
+        if args.parsing_model is None:
+            parser.error('--parsing_model is required unless ' +
+                         '--from_predictions is given')
+        assert args.use_gold_syntax or args.segmentation_model
 
     # Convert verbose flag to actually logging level
     log_levels = [logging.WARNING, logging.INFO, logging.DEBUG]
@@ -215,6 +663,22 @@ def main():
                                 '%(message)s'), level=log_level)
     logger = logging.getLogger(__name__)
 
+    eval_data, eval_data_hash = read_eval_set(args.evaluation_set)
+    gold = load_gold_eval_data(eval_data, eval_data_hash,
+                               cache_dir=args.gold_cache_dir)
+
+    if args.from_predictions:
+        # Recompute the metrics from the saved predictions and the gold data.
+        pred_edu_tokens_lists, pred_trees, _, _ = predictions_for_eval(
+            load_predictions(args.from_predictions), eval_data, gold=gold)
+        results = gold.evaluate(pred_edu_tokens_lists, pred_trees)
+        print(json.dumps(sorted(results.items())))
+        return
+
+    from discourseparsing.discourse_parsing import Parser
+    from discourseparsing.discourse_segmentation import Segmenter
+    from discourseparsing.parse_util import SyntaxParserWrapper
+
     # read the models
     logger.info('Loading models')
 
@@ -228,12 +692,16 @@ def main():
                         n_best=1)
     rst_parser.load_model(args.parsing_model)
 
-    eval_data = json.load(args.evaluation_set)
-
-    results = \
-        predict_and_evaluate_rst_trees(syntax_parser, segmenter, rst_parser,
-                                       eval_data,
-                                       use_gold_syntax=args.use_gold_syntax)
+    doc_ids = [doc_dict['path_basename'] for doc_dict in eval_data]
+    pred_edu_tokens_lists, pred_trees, _, _ = \
+        predict_rst_trees_for_eval(syntax_parser, segmenter, rst_parser,
+                                   eval_data,
+                                   use_gold_syntax=args.use_gold_syntax,
+                                   max_workers=args.max_workers, gold=gold)
+    if args.save_predictions:
+        save_predictions(args.save_predictions, doc_ids,
+                         pred_edu_tokens_lists, pred_trees)
+    results = gold.evaluate(pred_edu_tokens_lists, pred_trees)
     print(json.dumps(sorted(results.items())))
 
 
@@ -4,58 +4,102 @@
 import logging
 import json
 
-from discourseparsing.discourse_parsing import Parser
-from discourseparsing.discourse_segmentation import (Segmenter,
-                                                     extract_edus_tokens)
-from discourseparsing.parse_util import SyntaxParserWrapper
-from discourseparsing.tree_util import (TREE_PRINT_MARGIN,
-                                        extract_preterminals,
-                                        extract_converted_terminals)
-from discourseparsing.io_util import read_text_file
+from discourseparsing.syntax_cache import DEFAULT_MAX_ENTRIES
 
+# The modules that import NLTK and SKLL are imported in the functions that
+# use them, so that the command line interface starts quickly (e.g., for
+# --help).
 
-def segment_and_parse(doc_dict, syntax_parser, segmenter, rst_parser):
+
+def is_blank_document(doc_dict):
     '''
-    A method to perform syntax parsing, discourse segmentation, and RST parsing
-    as necessary, given a partial document dictionary.
-    See `convert_rst_discourse_tb.py` for details about document dictionaries.
+    Returns whether the raw text of the document is blank.
+    (Checks whether raw_text is available so this does not crash
+    when evaluating on pre-parsed treebank documents.)
     '''
-
-    # Return empty lists if the input was blank.
-    # (Check whether raw_text is available so this does not crash
-    # when evaluating on pre-parsed treebank documents.)
     if 'raw_text' in doc_dict and not doc_dict['raw_text'].strip():
         # TODO add a unit test for this.
         logging.warning('The input contained no non-whitespace characters.' +
                         ' doc_id = {}'.format(doc_dict["doc_id"]))
-        return [], []
+        return True
+    return False
 
-    if 'syntax_trees' not in doc_dict:
-        # Do syntactic parsing.
-        trees, starts_paragraph_list = \
-            syntax_parser.parse_document(doc_dict)
-        doc_dict['syntax_trees'] = [t.pprint(margin=TREE_PRINT_MARGIN)
-                                    for t in trees]
-        preterminals = [extract_preterminals(t) for t in trees]
-        doc_dict['token_tree_positions'] = [[x.treeposition() for x in
-                                             preterminals_sentence]
-                                            for preterminals_sentence
-                                            in preterminals]
-        doc_dict['tokens'] = [extract_converted_terminals(t) for t in trees]
-        doc_dict['pos_tags'] = [[x.label() for x in preterminals_sentence]
-                                for preterminals_sentence in preterminals]
+
+def make_output(edu_tokens, complete_trees):
+    '''
+    Returns the output dictionary for a document, with its EDUs and its
+    scored RST trees.  If the RST parser ran out of budget or had to fall
+    back to a flat tree, this is recorded under "degraded" (see
+    `Parser.parse`).
+    '''
+    from discourseparsing.tree_util import TREE_PRINT_MARGIN
+
+    res = {"edu_tokens": edu_tokens,
+           "scored_rst_trees": [
+               {"score": tree["score"],
+                "tree": tree["tree"].pformat(margin=TREE_PRINT_MARGIN)}
+               for tree in complete_trees]}
+    if complete_trees and complete_trees[0].get("degraded"):
+        res["degraded"] = complete_trees[0]["degraded"]
+    return res
+
+
+def add_syntax_info(doc_dict, trees):
+    '''
+    Adds the syntax trees from the syntactic parser, along with their tokens,
+    POS tags, and token positions, to the document dictionary.
+    '''
+    from discourseparsing.tree_util import (TREE_PRINT_MARGIN,
+                                            extract_preterminals,
+                                            extract_converted_terminals)
+
+    doc_dict['syntax_trees'] = [t.pprint(margin=TREE_PRINT_MARGIN)
+                                for t in trees]
+    preterminals = [extract_preterminals(t) for t in trees]
+    doc_dict['token_tree_positions'] = [[x.treeposition() for x in
+                                         preterminals_sentence]
+                                        for preterminals_sentence
+                                        in preterminals]
+    doc_dict['tokens'] = [extract_converted_terminals(t) for t in trees]
+    doc_dict['pos_tags'] = [[x.label() for x in preterminals_sentence]
+                            for preterminals_sentence in preterminals]
+
+
+def add_edu_segmentation(doc_dict, segmenter, starts_paragraph_list):
+    '''
+    Performs discourse segmentation for a document dictionary that has
+    syntax trees, and adds the EDU start indices and whether each EDU starts
+    a paragraph.
+    '''
+    segmenter.segment_document(doc_dict)
+    add_edu_starts_paragraph(doc_dict, starts_paragraph_list)
+
+
+def add_edu_starts_paragraph(doc_dict, starts_paragraph_list):
+    '''
+    Adds whether each EDU starts a paragraph to a segmented document
+    dictionary.
+    '''
+    # Extract whether each EDU starts a paragraph.
+    edu_starts_paragraph = []
+    for tree_idx, tok_idx, _ in doc_dict['edu_start_indices']:
+        val = (tok_idx == 0 and starts_paragraph_list[tree_idx])
+        edu_starts_paragraph.append(val)
+    assert len(edu_starts_paragraph) == len(doc_dict['edu_start_indices'])
+    doc_dict['edu_starts_paragraph'] = edu_starts_paragraph
+
+
+def segment_and_rst_parse(doc_dict, segmenter, rst_parser,
+                          starts_paragraph_list=None):
+    '''
+    Performs discourse segmentation (if necessary) and RST parsing for a
+    document dictionary that already has syntax trees.
+    '''
+    from discourseparsing.discourse_segmentation import extract_edus_tokens
 
     if 'edu_start_indices' not in doc_dict:
         # Do discourse segmentation.
-        segmenter.segment_document(doc_dict)
-
-        # Extract whether each EDU starts a paragraph.
-        edu_starts_paragraph = []
-        for tree_idx, tok_idx, _ in doc_dict['edu_start_indices']:
-            val = (tok_idx == 0 and starts_paragraph_list[tree_idx])
-            edu_starts_paragraph.append(val)
-        assert len(edu_starts_paragraph) == len(doc_dict['edu_start_indices'])
-        doc_dict['edu_starts_paragraph'] = edu_starts_paragraph
+        add_edu_segmentation(doc_dict, segmenter, starts_paragraph_list)
 
     # Extract a list of lists of (word, POS) tuples.
     edu_tokens = extract_edus_tokens(doc_dict['edu_start_indices'],
@@ -67,6 +111,65 @@ def segment_and_parse(doc_dict, syntax_parser, segmenter, rst_parser):
     return edu_tokens, rst_parse_trees
 
 
+def segment_and_parse(doc_dict, syntax_parser, segmenter, rst_parser):
+    '''
+    A method to perform syntax parsing, discourse segmentation, and RST parsing
+    as necessary, given a partial document dictionary.
+    See `convert_rst_discourse_tb.py` for details about document dictionaries.
+    '''
+
+    # Return empty lists if the input was blank.
+    if is_blank_document(doc_dict):
+        return [], []
+
+    starts_paragraph_list = None
+    if 'syntax_trees' not in doc_dict:
+        # Do syntactic parsing.
+        trees, starts_paragraph_list = \
+            syntax_parser.parse_document(doc_dict)
+        add_syntax_info(doc_dict, trees)
+
+    return segment_and_rst_parse(doc_dict, segmenter, rst_parser,
+                                 starts_paragraph_list)
+
+
+async def segment_and_parse_async(doc_dict, syntax_parser, segmenter,
+                                  rst_parser):
+    '''
+    Like `segment_and_parse`, but awaits
+    `SyntaxParserWrapper.parse_document_async` for the syntactic parsing, so
+    that several documents (and the sentences in each) can be sent to the
+    ZPar servers concurrently.
+    '''
+    if is_blank_document(doc_dict):
+        return [], []
+
+    starts_paragraph_list = None
+    if 'syntax_trees' not in doc_dict:
+        trees, starts_paragraph_list = \
+            await syntax_parser.parse_document_async(doc_dict)
+        add_syntax_info(doc_dict, trees)
+
+    return segment_and_rst_parse(doc_dict, segmenter, rst_parser,
+                                 starts_paragraph_list)
+
+
+def add_parser_budget_args(parser):
+    '''
+    Adds the command line options for the RST parser's per-document budgets
+    (see `Parser.parse`) to an ArgumentParser.
+    '''
+    parser.add_argument('--max_seconds', type=float, default=None,
+                        help='time budget in seconds for the RST parsing ' +
+                        'search for a document, after which the best ' +
+                        'partial parse is finished greedily (or a flat ' +
+                        'tree is returned)')
+    parser.add_argument('--max_expanded_states', type=int, default=None,
+                        help='budget for the number of states the RST ' +
+                        'parsing search expands for a document, as for ' +
+                        '--max_seconds')
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(
@@ -91,9 +194,25 @@ def main():
                         help='Maximum number of states to retain for \
                               best-first search',
                         type=int, default=1)
+    add_parser_budget_args(parser)
     parser.add_argument('-zp', '--zpar_port', type=int)
-    parser.add_argument('-zh', '--zpar_hostname', default=None)
+    parser.add_argument('-zh', '--zpar_hostname', default=None,
+                        help='hostname of a zpar server, or a comma-' +
+                        'separated list of hostname:port entries for ' +
+                        'several servers')
     parser.add_argument('-zm', '--zpar_model_directory', default=None)
+    parser.add_argument('--syntax_cache', default=None,
+                        help='path to a SQLite file for caching syntactic ' +
+                        'parses of sentences (shared across runs and ' +
+                        'processes)')
+    parser.add_argument('--syntax_cache_size', type=int,
+                        default=DEFAULT_MAX_ENTRIES,
+                        help='maximum number of parses to keep in the ' +
+                        'syntax cache')
+    parser.add_argument('--syntax_cache_model_id', default=None,
+                        help='ID of the ZPar model for keying the syntax ' +
+                        'cache (required with ZPar servers; by default, ' +
+                        'computed from the files in the model directory)')
     parser.add_argument('-v', '--verbose',
                         help='Print more status information. For every ' +
                         'additional time this flag is specified, ' +
@@ -109,17 +228,29 @@ def main():
     logging.basicConfig(format=('%(asctime)s - %(name)s - %(levelname)s - ' +
                                 '%(message)s'), level=log_level)
 
+    from discourseparsing.discourse_parsing import Parser
+    from discourseparsing.discourse_segmentation import Segmenter
+    from discourseparsing.parse_util import SyntaxParserWrapper
+    from discourseparsing.io_util import read_text_file
+
     # Read the models.
     logging.info('Loading models')
     syntax_parser = \
         SyntaxParserWrapper(port=args.zpar_port, hostname=args.zpar_hostname,
-                            zpar_model_directory=args.zpar_model_directory)
+                            zpar_model_directory=args.zpar_model_directory,
+                            cache_path=args.syntax_cache,
+                            cache_max_entries=args.syntax_cache_size,
+                            cache_model_id=args.syntax_cache_model_id)
     segmenter = Segmenter(args.segmentation_model)
 
     parser = Parser(max_acts=args.max_acts,
                     max_states=args.max_states,
-                    n_best=args.n_best)
-    parser.load_model(args.parsing_model)
+                    n_best=args.n_best,
+                    max_seconds=args.max_seconds,
+                    max_expanded_states=args.max_expanded_states)
+    # Read the model when the first document is ready to be parsed, so that
+    # the syntactic parsing of it doesn't have to wait.
+    parser.load_model(args.parsing_model, lazy=True)
 
     for input_path in args.input_paths:
         logging.info('rst_parse input file: {}'.format(input_path))
@@ -132,11 +263,11 @@ def main():
         edu_tokens, complete_trees = segment_and_parse(doc_dict, syntax_parser,
                                                        segmenter, parser)
 
-        print(json.dumps({"edu_tokens": edu_tokens, \
-            "scored_rst_trees": [{"score": tree["score"],
-                                  "tree": tree["tree"]
-                                          .pprint(margin=TREE_PRINT_MARGIN)}
-                                 for tree in complete_trees]}))
+        print(json.dumps(make_output(edu_tokens, complete_trees)))
+
+    if syntax_parser.cache is not None:
+        logging.info('syntax cache stats: {}'
+                     .format(syntax_parser.cache.stats()))
 
 
 if __name__ == '__main__':
@@ -1,41 +1,587 @@
 #!/usr/bin/env python3
 # License: MIT
 
+import gc
 import json
 import logging
-from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
 from multiprocessing import cpu_count
 import math
 
+from discourseparsing.batch_progress import BatchProgress
 from discourseparsing.discourse_parsing import Parser
 from discourseparsing.discourse_segmentation import Segmenter
-from discourseparsing.parse_util import SyntaxParserWrapper
-from discourseparsing.rst_parse import segment_and_parse
-from discourseparsing.tree_util import TREE_PRINT_MARGIN
+from discourseparsing.parse_util import (SyntaxParserWrapper,
+                                         get_sentence_tokenizer,
+                                         parse_zpar_endpoints)
+from discourseparsing.rst_parse import (add_parser_budget_args, make_output,
+                                        segment_and_parse)
+from discourseparsing.syntax_cache import (SyntaxParseCache,
+                                           DEFAULT_MAX_ENTRIES)
+from discourseparsing.syntax_parser_pool import SyntaxParserPool
 
 
-def batch_process(docs, output_path, zpar_model_directory,
-                  segmentation_model, parsing_model):
+def load_models(zpar_model_directory, segmentation_model, parsing_model,
+                zpar_hostname=None, zpar_port=None, syntax_cache=None,
+                syntax_cache_size=DEFAULT_MAX_ENTRIES,
+                syntax_cache_model_id=None,
+                syntax_pool_connector=None, max_seconds=None,
+                max_expanded_states=None):
     '''
-    docs is a list or tuple of (doc_id, text) tuples.
+    Returns the syntactic parser, segmenter, and RST parser for processing
+    documents.  If `syntax_pool_connector` is given, syntactic parsing is
+    done by the corresponding SyntaxParserPool.  `max_seconds` and
+    `max_expanded_states` are the RST parser's per-document budgets (see
+    `Parser.parse`).
     '''
-    syntax_parser = SyntaxParserWrapper(zpar_model_directory)
+    syntax_parser = load_syntax_parser(
+        zpar_model_directory=zpar_model_directory,
+        zpar_hostname=zpar_hostname, zpar_port=zpar_port,
+        syntax_cache=syntax_cache, syntax_cache_size=syntax_cache_size,
+        syntax_cache_model_id=syntax_cache_model_id,
+        syntax_pool_connector=syntax_pool_connector)
     segmenter = Segmenter(segmentation_model)
+    parser = load_rst_parser(parsing_model, max_seconds=max_seconds,
+                             max_expanded_states=max_expanded_states)
+    return syntax_parser, segmenter, parser
 
-    parser = Parser(max_acts=1, max_states=1, n_best=1)
-    parser.load_model(parsing_model)
 
-    with open(output_path, 'w') as outfile:
-        for doc_id, text in docs:
-            logging.info('doc_id: {}'.format(doc_id))
-            doc_dict = {"doc_id": doc_id, "raw_text": text}
-            edu_tokens, complete_trees = \
-                segment_and_parse(doc_dict, syntax_parser, segmenter, parser)
-            print(json.dumps({"doc_id": doc_id, "edu_tokens": edu_tokens, \
-                "scored_rst_trees": \
-                [{"score": tree["score"],
-                  "tree": tree["tree"].pprint(margin=TREE_PRINT_MARGIN)}
-                 for tree in complete_trees]}), file=outfile)
+def load_rst_parser(parsing_model, max_seconds=None,
+                    max_expanded_states=None):
+    parser = Parser(max_acts=1, max_states=1, n_best=1,
+                    max_seconds=max_seconds,
+                    max_expanded_states=max_expanded_states)
+    parser.load_model(parsing_model, lazy=True)
+    return parser
+
+
+def load_syntax_parser(zpar_model_directory=None, zpar_hostname=None,
+                       zpar_port=None, syntax_cache=None,
+                       syntax_cache_size=DEFAULT_MAX_ENTRIES,
+                       syntax_cache_model_id=None,
+                       syntax_pool_connector=None):
+    if syntax_pool_connector is not None:
+        return syntax_pool_connector.connect(
+            cache_path=syntax_cache, cache_max_entries=syntax_cache_size,
+            cache_model_id=syntax_cache_model_id)
+    return SyntaxParserWrapper(
+        zpar_model_directory, hostname=zpar_hostname, port=zpar_port,
+        cache_path=syntax_cache, cache_max_entries=syntax_cache_size,
+        cache_model_id=syntax_cache_model_id)
+
+
+def make_output_line(doc_id, edu_tokens, complete_trees):
+    return json.dumps({"doc_id": doc_id,
+                       **make_output(edu_tokens, complete_trees)})
+
+
+def document_stats(doc_dict, edu_tokens):
+    '''
+    Returns the numbers of sentences, EDUs, tokens, and characters in a
+    parsed document, for progress reporting (see batch_progress.py).
+    '''
+    tokens = doc_dict.get('tokens', [])
+    return {"sentences": len(tokens),
+            "edus": len(edu_tokens),
+            "tokens": sum(len(x) for x in tokens),
+            "chars": len(doc_dict.get('raw_text', ''))}
+
+
+def process_document(doc_id, text, syntax_parser, segmenter, parser,
+                     stats=None):
+    '''
+    Parses one document and returns the output line (JSON) for it.  If
+    `stats` is a dictionary, the document's statistics (see
+    `document_stats`) are added to it.
+    '''
+    logging.info('doc_id: {}'.format(doc_id))
+    doc_dict = {"doc_id": doc_id, "raw_text": text}
+    edu_tokens, complete_trees = \
+        segment_and_parse(doc_dict, syntax_parser, segmenter, parser)
+    if stats is not None:
+        stats.update(document_stats(doc_dict, edu_tokens))
+    return make_output_line(doc_id, edu_tokens, complete_trees)
+
+
+# The models used by each worker process in parse_documents, which are
+# loaded once when the process starts (see _initialize_worker).
+_worker_models = None
+
+# A queue to which each worker process in parse_documents sends its PID and
+# the time when it starts a document, for progress reporting.
+_document_start_queue = None
+
+
+def _initialize_worker(model_kwargs, start_queue=None):
+    global _worker_models, _document_start_queue
+    _worker_models = load_models(**model_kwargs)
+    _document_start_queue = start_queue
+
+
+# The models loaded by the parent process before it forks the workers (see
+# _preload_models), which the workers then share copy-on-write instead of
+# each loading their own.
+_preloaded_models = None
+
+
+def _preload_models(model_kwargs, syntax_workers):
+    '''
+    Loads the segmenter, the RST parsing model, and the sentence tokenizer
+    in this process.  ZPar is also loaded here if each worker would
+    otherwise load the ZPar library and model itself.  The syntactic parser
+    is left to the workers when it is a client for ZPar servers or for a
+    SyntaxParserPool, since each worker needs its own connection.
+    '''
+    global _preloaded_models
+    syntax_parser = None
+    if syntax_workers == 0 and not parse_zpar_endpoints(
+            model_kwargs.get('zpar_hostname'), model_kwargs.get('zpar_port')):
+        syntax_parser = load_syntax_parser(
+            zpar_model_directory=model_kwargs.get('zpar_model_directory'),
+            syntax_cache=model_kwargs.get('syntax_cache'),
+            syntax_cache_size=model_kwargs.get('syntax_cache_size',
+                                               DEFAULT_MAX_ENTRIES),
+            syntax_cache_model_id=model_kwargs.get('syntax_cache_model_id'))
+        syntax_parser.load()
+    segmenter = Segmenter(model_kwargs['segmentation_model'])
+    parser = load_rst_parser(
+        model_kwargs['parsing_model'],
+        max_seconds=model_kwargs.get('max_seconds'),
+        max_expanded_states=model_kwargs.get('max_expanded_states'))
+    _load_lazy_models(parser)
+    _preloaded_models = (syntax_parser, segmenter, parser)
+
+    # Move everything allocated so far out of the garbage collector's
+    # reach, so that collections in the workers don't write to (and thus
+    # copy) the pages holding the shared models.
+    gc.freeze()
+
+
+def _load_lazy_models(parser):
+    '''
+    Loads the parts of the models that are otherwise loaded when the first
+    document is parsed.
+    '''
+    parser.load_model()
+    get_sentence_tokenizer()
+
+
+# The keyword arguments of load_models that are for load_syntax_parser.
+_SYNTAX_PARSER_KWARGS = {'zpar_model_directory', 'zpar_hostname',
+                         'zpar_port', 'syntax_cache', 'syntax_cache_size',
+                         'syntax_cache_model_id', 'syntax_pool_connector'}
+
+
+def _initialize_forked_worker(model_kwargs, start_queue=None):
+    global _worker_models, _document_start_queue
+    _document_start_queue = start_queue
+    syntax_parser, segmenter, parser = _preloaded_models
+    if syntax_parser is None:
+        syntax_parser = load_syntax_parser(**{
+            key: value for key, value in model_kwargs.items()
+            if key in _SYNTAX_PARSER_KWARGS})
+    _worker_models = (syntax_parser, segmenter, parser)
+
+
+def _process_document_in_worker(doc_id, text):
+    '''
+    Returns the output line for a document and its statistics for progress
+    reporting.
+    '''
+    if _document_start_queue is not None:
+        _document_start_queue.put((os.getpid(), time.time()))
+    start_time = time.perf_counter()
+    stats = {"worker": os.getpid()}
+    line = process_document(doc_id, text, *_worker_models, stats=stats)
+    stats["seconds"] = time.perf_counter() - start_time
+    return line, stats
+
+
+class ShardWriter(object):
+    '''
+    Writes output lines, which may arrive in any order, to the files
+    `output_prefix.0`, `output_prefix.1`, etc., in input order, with
+    `shard_size` consecutive documents per file.
+
+    Each line is appended to `output_prefix.N.partial`, along with the
+    document's position in the input, and flushed as soon as it is added, so
+    that if the run dies, only the documents that were still being parsed
+    are lost.  Once a shard has all of its documents (or when `close` is
+    called, for the last one), its lines are sorted into input order and the
+    file is atomically renamed to `output_prefix.N`.
+
+    The shard size is saved in `output_prefix.manifest.json`.  With
+    `resume=True`, the shard size from an earlier run is used, and the
+    documents in its finished and partial shards are marked as done (see
+    `is_done`).  Otherwise, any shards from an earlier run are removed, so
+    that they aren't mixed up with the new output.
+    '''
+
+    def __init__(self, output_prefix, shard_size, resume=False):
+        self.output_prefix = output_prefix
+        self.shard_size = shard_size
+        self.n_written = 0
+        self._done_positions = set()
+        self._finished_shards = {}
+        self._shard_counts = {}
+        self._partial_files = {}
+
+        manifest_path = '{}.manifest.json'.format(output_prefix)
+        if resume and os.path.exists(manifest_path):
+            with open(manifest_path) as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest['shard_size'] != shard_size:
+                logging.warning('Using the shard size of the earlier run ' +
+                                '({}) instead of {}.'
+                                .format(manifest['shard_size'], shard_size))
+            self.shard_size = manifest['shard_size']
+            self._load_earlier_output()
+        else:
+            self._remove_earlier_output()
+            with open(manifest_path, 'w') as manifest_file:
+                json.dump({"shard_size": self.shard_size}, manifest_file)
+
+    def _shard_path(self, shard):
+        return '{}.{}'.format(self.output_prefix, shard)
+
+    def _find_earlier_output(self):
+        '''
+        Returns dictionaries from shard numbers to the paths of the finished
+        and partial shard files from an earlier run.
+        '''
+        output_dir = os.path.dirname(self.output_prefix) or '.'
+        prefix = os.path.basename(self.output_prefix) + '.'
+        shard_paths = {}
+        partial_paths = {}
+        for file_name in os.listdir(output_dir):
+            if not file_name.startswith(prefix):
+                continue
+            suffix = file_name[len(prefix):]
+            path = os.path.join(output_dir, file_name)
+            if suffix.isdigit():
+                shard_paths[int(suffix)] = path
+            elif suffix.endswith('.partial') \
+                    and suffix[:-len('.partial')].isdigit():
+                partial_paths[int(suffix[:-len('.partial')])] = path
+        return shard_paths, partial_paths
+
+    def _remove_earlier_output(self):
+        shard_paths, partial_paths = self._find_earlier_output()
+        paths = list(shard_paths.values()) + list(partial_paths.values())
+        if paths:
+            logging.warning('Removing {} output files from an earlier run '
+                            '(use --resume to keep them).'.format(len(paths)))
+        for path in paths:
+            os.remove(path)
+
+    def _load_earlier_output(self):
+        shard_paths, partial_paths = self._find_earlier_output()
+        for shard, path in shard_paths.items():
+            with open(path) as shard_file:
+                n_lines = sum(1 for _ in shard_file)
+            self._finished_shards[shard] = n_lines
+            start = shard * self.shard_size
+            self._done_positions.update(range(start, start + n_lines))
+        for shard, path in partial_paths.items():
+            if shard in self._finished_shards:
+                # The earlier run died after finishing this shard but before
+                # removing its partial file.
+                os.remove(path)
+            else:
+                self._load_partial_shard(shard, path)
+        logging.info('Found output for {} documents from an earlier run.'
+                     .format(len(self._done_positions)))
+
+    def _load_partial_shard(self, shard, path):
+        with open(path) as partial_file:
+            lines = partial_file.readlines()
+        # Drop a line that was cut off if the earlier run died while writing
+        # it, and rewrite the file so that new lines can be appended.
+        if lines and not lines[-1].endswith('\n'):
+            lines.pop()
+            with open(path + '.tmp', 'w') as tmp_file:
+                tmp_file.writelines(lines)
+            os.replace(path + '.tmp', path)
+        self._shard_counts[shard] = len(lines)
+        self._done_positions.update(int(line.split('\t', 1)[0])
+                                    for line in lines)
+
+    def is_done(self, position):
+        '''
+        Returns whether the output for the document at `position` was
+        written by an earlier run (when resuming).
+        '''
+        return position in self._done_positions
+
+    def add(self, position, line):
+        '''
+        Adds the output line for the document at `position` in the input.
+        '''
+        shard = position // self.shard_size
+        partial_file = self._partial_files.get(shard)
+        if partial_file is None:
+            # Append to partial output from an earlier run, if any.
+            mode = 'a' if shard in self._shard_counts else 'w'
+            partial_file = open(self._shard_path(shard) + '.partial', mode)
+            self._partial_files[shard] = partial_file
+            self._shard_counts.setdefault(shard, 0)
+        print('{}\t{}'.format(position, line), file=partial_file)
+        partial_file.flush()
+        self.n_written += 1
+
+        self._shard_counts[shard] += 1
+        if self._shard_counts[shard] == self.shard_size:
+            self._finish_shard(shard)
+
+    def _finish_shard(self, shard):
+        partial_file = self._partial_files.pop(shard, None)
+        if partial_file is not None:
+            partial_file.close()
+        partial_path = self._shard_path(shard) + '.partial'
+        with open(partial_path) as partial_file:
+            lines = [line.split('\t', 1) for line in partial_file]
+        lines.sort(key=lambda x: int(x[0]))
+        tmp_path = self._shard_path(shard) + '.tmp'
+        with open(tmp_path, 'w') as tmp_file:
+            tmp_file.writelines(line for _, line in lines)
+        os.replace(tmp_path, self._shard_path(shard))
+        os.remove(partial_path)
+        self._finished_shards[shard] = self._shard_counts.pop(shard)
+
+    def close(self):
+        '''
+        Finishes the remaining shards.  This should only be called after all
+        the documents have been added.
+        '''
+        for shard in sorted(self._shard_counts):
+            self._finish_shard(shard)
+
+
+@contextmanager
+def _worker_pool(max_workers, model_kwargs, syntax_workers=0, preload=True,
+                 start_queue=None):
+    '''
+    Returns a ProcessPoolExecutor whose processes have the models, along
+    with the SyntaxParserPool they share if `syntax_workers` is greater than
+    0.  If `start_queue` is given, the processes report the documents they
+    start to it (see `_add_document_starts`).
+
+    With `preload=True`, where the platform can fork processes, the models
+    are loaded once in this process and the workers are forked from it, so
+    the models' memory is shared between the workers as long as it isn't
+    written to.  Otherwise, each worker loads its own models when it starts
+    (see _initialize_worker).
+    '''
+    preload = preload \
+        and 'fork' in multiprocessing.get_all_start_methods()
+    if preload:
+        _preload_models(model_kwargs, syntax_workers)
+
+    syntax_pool = None
+    if syntax_workers > 0:
+        syntax_pool = SyntaxParserPool(
+            syntax_workers, max_workers,
+            zpar_model_directory=model_kwargs.get('zpar_model_directory'),
+            hostname=model_kwargs.get('zpar_hostname'),
+            port=model_kwargs.get('zpar_port'))
+        model_kwargs = dict(model_kwargs,
+                            syntax_pool_connector=syntax_pool.connector())
+
+    if preload:
+        executor_kwargs = {"mp_context": multiprocessing.get_context('fork'),
+                           "initializer": _initialize_forked_worker}
+    else:
+        executor_kwargs = {"initializer": _initialize_worker}
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 initargs=(model_kwargs, start_queue),
+                                 **executor_kwargs) as executor:
+            yield executor
+    finally:
+        if syntax_pool is not None:
+            syntax_pool.close()
+        if preload:
+            _release_preloaded_models()
+
+
+def _release_preloaded_models():
+    global _preloaded_models
+    _preloaded_models = None
+    gc.unfreeze()
+
+
+def _add_document_starts(start_queue, progress):
+    '''
+    Passes the document starts that the workers have reported on to the
+    BatchProgress.
+    '''
+    now = time.time()
+    while True:
+        try:
+            worker_id, start_time = start_queue.get_nowait()
+        except queue.Empty:
+            return
+        progress.start(worker_id, max(now - start_time, 0.0))
+
+
+def parse_documents(docs, output_prefix, max_workers, model_kwargs,
+                    syntax_workers=0, resume=False, preload=True,
+                    progress_interval=None):
+    '''
+    Parses a list of (doc_id, text) tuples with `max_workers` processes and
+    writes the output to `output_prefix.N` files, as many as `max_workers`,
+    each with a contiguous part of the input, in order.
+
+    Each document is a separate task.  The tasks are submitted longest-first
+    so that the long documents, which take much more time to parse, don't
+    end up being parsed at the end while the other processes are idle.  The
+    models are loaded once, before the workers are forked, or with
+    `preload=False`, once per process (see `_worker_pool`).  `model_kwargs`
+    are the keyword arguments for `load_models`.
+
+    With `resume=True`, documents whose output was written by an earlier
+    run with the same input and output prefix are skipped (see
+    ShardWriter).
+
+    Progress is logged every `progress_interval` seconds (see
+    BatchProgress), and a summary of the throughput and latencies is
+    returned.
+    '''
+    if not docs:
+        return None
+    writer = ShardWriter(output_prefix, math.ceil(len(docs) / max_workers),
+                         resume=resume)
+    order = sorted((i for i in range(len(docs)) if not writer.is_done(i)),
+                   key=lambda i: len(docs[i][1]), reverse=True)
+    if not order:
+        writer.close()
+        return None
+    max_workers = min(max_workers, len(order))
+    progress = BatchProgress(
+        total_docs=len(order),
+        total_chars=sum(len(docs[position][1]) for position in order),
+        report_interval=progress_interval)
+    start_queue = multiprocessing.Queue() if progress_interval else None
+
+    with _worker_pool(max_workers, model_kwargs,
+                      syntax_workers=syntax_workers, preload=preload,
+                      start_queue=start_queue) as executor:
+        futures = {executor.submit(_process_document_in_worker,
+                                   *docs[position]): position
+                   for position in order}
+        while futures:
+            # Wake up now and then to report progress even if no documents
+            # are finished.
+            done, _ = wait(futures, timeout=progress_interval or None,
+                           return_when=FIRST_COMPLETED)
+            if start_queue is not None:
+                _add_document_starts(start_queue, progress)
+            for future in done:
+                line, stats = future.result()
+                writer.add(futures.pop(future), line)
+                progress.add(stats)
+            progress.maybe_report()
+    writer.close()
+    return progress.summary()
+
+
+def read_jsonl_documents(input_path):
+    '''
+    Lazily reads (doc_id, text) tuples from a file with one JSON object per
+    line, each with "doc_id" and "text" keys.
+    '''
+    with open(input_path) as input_file:
+        for line in input_file:
+            if not line.strip():
+                continue
+            doc = json.loads(line)
+            yield doc["doc_id"], doc["text"]
+
+
+def parse_document_stream(docs, output_prefix, max_workers, model_kwargs,
+                          shard_size, max_in_flight, syntax_workers=0,
+                          resume=False, preload=True,
+                          progress_interval=None):
+    '''
+    Like `parse_documents`, but for an iterable of (doc_id, text) tuples of
+    unknown length (e.g., from `read_jsonl_documents`).  Documents are read
+    only as workers become free: at most `max_in_flight` documents are read
+    but not yet written out.  The output files have `shard_size` documents
+    each.
+    '''
+    writer = ShardWriter(output_prefix, shard_size, resume=resume)
+    progress = BatchProgress(report_interval=progress_interval)
+    start_queue = multiprocessing.Queue() if progress_interval else None
+    docs = ((position, doc) for position, doc in enumerate(docs)
+            if not writer.is_done(position))
+    n_submitted = 0
+    with _worker_pool(max_workers, model_kwargs,
+                      syntax_workers=syntax_workers, preload=preload,
+                      start_queue=start_queue) as executor:
+        futures = {}
+        while True:
+            while n_submitted - writer.n_written < max_in_flight:
+                position, doc = next(docs, (None, None))
+                if doc is None:
+                    break
+                futures[executor.submit(_process_document_in_worker,
+                                        *doc)] = position
+                n_submitted += 1
+            if not futures:
+                break
+            done, _ = wait(futures, timeout=progress_interval or None,
+                           return_when=FIRST_COMPLETED)
+            if start_queue is not None:
+                _add_document_starts(start_queue, progress)
+            for future in done:
+                line, stats = future.result()
+                writer.add(futures.pop(future), line)
+                progress.add(stats)
+            progress.maybe_report()
+    writer.close()
+    return progress.summary()
+
+
+def _run_pipeline_from_args(args, model_kwargs):
+    from discourseparsing.rst_parse_pipeline import run_pipeline
+
+    if args.jsonl:
+        docs = ((position, doc_id, text) for position, (doc_id, text)
+                in enumerate(read_jsonl_documents(args.input_file)))
+        shard_size = args.shard_size
+        progress = BatchProgress(report_interval=args.progress_interval)
+    else:
+        with open(args.input_file) as f:
+            docs = list(json.load(f).items())
+        if not docs:
+            return None
+        shard_size = math.ceil(len(docs) / args.max_workers)
+        progress = BatchProgress(
+            total_docs=len(docs),
+            total_chars=sum(len(text) for _, text in docs),
+            report_interval=args.progress_interval)
+        # Feed the longest documents in first, as in parse_documents.
+        docs = sorted(((position, doc_id, text) for position, (doc_id, text)
+                       in enumerate(docs)),
+                      key=lambda x: len(x[2]), reverse=True)
+
+    report = run_pipeline(
+        docs, args.output_prefix, shard_size, model_kwargs,
+        n_syntax_workers=max(args.syntax_workers, 1),
+        n_segmentation_workers=args.segmentation_workers,
+        n_rst_workers=args.rst_workers or args.max_workers,
+        max_in_flight=args.max_in_flight, resume=args.resume,
+        progress=progress)
+    logging.info('pipeline report: {}'.format(json.dumps(report)))
+    if args.pipeline_report:
+        with open(args.pipeline_report, 'w') as f:
+            json.dump(report, f, indent=2)
+    return progress.summary()
 
 
 def main():
@@ -55,9 +601,76 @@ def main():
                         default=0, action='count')
     parser.add_argument('-m', '--max_workers', type=int, default=cpu_count(),
                         help='number of parallel processes to use')
+    parser.add_argument('-sw', '--syntax_workers', type=int, default=0,
+                        help='number of separate syntactic parsing ' +
+                        'processes to share among the RST parsing ' +
+                        'processes (if 0, each RST parsing process runs ' +
+                        'its own syntactic parser).  With --pipeline, this ' +
+                        'is the number of processes for the syntactic ' +
+                        'parsing stage (at least 1).')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='run syntactic parsing, segmentation, and RST ' +
+                        'parsing in separate pools of processes connected ' +
+                        'by queues (with --syntax_workers, ' +
+                        '--segmentation_workers, and --rst_workers ' +
+                        'processes, respectively) instead of running all ' +
+                        'three in each of --max_workers processes')
+    parser.add_argument('--segmentation_workers', type=int, default=1,
+                        help='number of segmentation processes with ' +
+                        '--pipeline')
+    parser.add_argument('--rst_workers', type=int, default=None,
+                        help='number of RST parsing processes with ' +
+                        '--pipeline (default: max_workers)')
+    parser.add_argument('--pipeline_report', default=None,
+                        help='path for a JSON report of the queue ' +
+                        'occupancy and stage utilization with --pipeline')
     parser.add_argument('-zm', '--zpar_model_directory', default=None)
+    parser.add_argument('-zp', '--zpar_port', type=int)
+    parser.add_argument('-zh', '--zpar_hostname', default=None,
+                        help='hostname of a zpar server, or a comma-' +
+                        'separated list of hostname:port entries for ' +
+                        'several servers')
+    parser.add_argument('--syntax_cache', default=None,
+                        help='path to a SQLite file for caching syntactic ' +
+                        'parses of sentences (shared across runs and ' +
+                        'processes)')
+    parser.add_argument('--syntax_cache_size', type=int,
+                        default=DEFAULT_MAX_ENTRIES,
+                        help='maximum number of parses to keep in the ' +
+                        'syntax cache')
+    parser.add_argument('--syntax_cache_model_id', default=None,
+                        help='ID of the ZPar model for keying the syntax ' +
+                        'cache (required with ZPar servers; by default, ' +
+                        'computed from the files in the model directory)')
+    parser.add_argument('--jsonl', action='store_true',
+                        help='read the input file lazily as JSON lines, ' +
+                        'each with "doc_id" and "text" keys, rather than ' +
+                        'as a single dictionary')
+    parser.add_argument('--shard_size', type=int, default=1000,
+                        help='number of documents per output file when ' +
+                        'using --jsonl')
+    parser.add_argument('--max_in_flight', type=int, default=None,
+                        help='maximum number of documents read but not ' +
+                        'yet written when using --jsonl or --pipeline ' +
+                        '(default: 4 times the number of processes)')
+    parser.add_argument('--no_preload', action='store_true',
+                        help='load the models in each worker process ' +
+                        'rather than once before forking the workers ' +
+                        '(this uses more memory and takes longer to start)')
+    add_parser_budget_args(parser)
+    parser.add_argument('--resume', action='store_true',
+                        help='only parse the documents whose output was ' +
+                        'not written by an earlier run with the same ' +
+                        'input file and output prefix')
+    parser.add_argument('--progress_interval', type=float, default=30.0,
+                        help='seconds between progress reports (0 to ' +
+                        'disable them)')
+    parser.add_argument('--summary_json', default=None,
+                        help='path for a JSON summary of the run, with ' +
+                        'throughput for each worker and latency ' +
+                        'percentiles for each document length bucket')
     parser.add_argument('input_file', help='json file with a dictionary from' +
-                        ' IDs to texts.')
+                        ' IDs to texts (or a JSON lines file with --jsonl).')
     parser.add_argument('output_prefix', help='path prefix for where outputs' +
                         ' will be stored.')
     args = parser.parse_args()
@@ -69,28 +682,57 @@ def main():
     logging.captureWarnings(True)
     logging.basicConfig(format=('%(asctime)s - %(name)s - %(levelname)s - ' +
                                 '%(message)s'), level=log_level)
+    if args.progress_interval:
+        # Show the progress reports even without --verbose.
+        logging.getLogger('discourseparsing.batch_progress') \
+            .setLevel(min(log_level, logging.INFO))
+
+    model_kwargs = {"zpar_model_directory": args.zpar_model_directory,
+                    "segmentation_model": args.segmentation_model,
+                    "parsing_model": args.parsing_model,
+                    "zpar_hostname": args.zpar_hostname,
+                    "zpar_port": args.zpar_port,
+                    "syntax_cache": args.syntax_cache,
+                    "syntax_cache_size": args.syntax_cache_size,
+                    "syntax_cache_model_id": args.syntax_cache_model_id,
+                    "max_seconds": args.max_seconds,
+                    "max_expanded_states": args.max_expanded_states}
+    cache = None
+    if args.syntax_cache:
+        cache = SyntaxParseCache(args.syntax_cache, None)
+        stats_before = cache.stats()
+
+    if args.pipeline:
+        summary = _run_pipeline_from_args(args, model_kwargs)
+    elif args.jsonl:
+        max_in_flight = args.max_in_flight or 4 * args.max_workers
+        summary = parse_document_stream(
+            read_jsonl_documents(args.input_file), args.output_prefix,
+            args.max_workers, model_kwargs, args.shard_size, max_in_flight,
+            syntax_workers=args.syntax_workers, resume=args.resume,
+            preload=not args.no_preload,
+            progress_interval=args.progress_interval)
+    else:
+        with open(args.input_file) as f:
+            docs = list(json.load(f).items())
+        summary = parse_documents(
+            docs, args.output_prefix, args.max_workers, model_kwargs,
+            syntax_workers=args.syntax_workers, resume=args.resume,
+            preload=not args.no_preload,
+            progress_interval=args.progress_interval)
+
+    if summary is not None:
+        logging.info('summary: {}'.format(json.dumps(summary)))
+        if args.summary_json:
+            with open(args.summary_json, 'w') as f:
+                json.dump(summary, f, indent=2)
 
-    with open(args.input_file) as f:
-        docs = list(json.load(f).items())
-    chunk_size = math.ceil(len(docs) / args.max_workers)
-    docs_batches = [docs[i:i + chunk_size]
-                    for i in range(0, len(docs), chunk_size)]
-
-    with ProcessPoolExecutor(max_workers=len(docs_batches)) as executor:
-        futures = []
-        for i, docs_batch in enumerate(docs_batches):
-            logging.info('batch size {}'.format(len(docs_batch)))
-            output_path = '{}.{}'.format(args.output_prefix, i)
-            future = executor.submit(batch_process, docs_batch,
-                                     output_path,
-                                     args.zpar_model_directory,
-                                     args.segmentation_model,
-                                     args.parsing_model)
-            futures.append(future)
-
-        # wait for all the results
-        for future in futures:
-            future.result()
+    if cache is not None:
+        stats = cache.stats()
+        logging.info('syntax cache: {} hits, {} misses, {} entries'.format(
+            stats['total_hits'] - stats_before['total_hits'],
+            stats['total_misses'] - stats_before['total_misses'],
+            stats['entries']))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,330 @@
+# License: MIT
+
+'''
+Pipelined batch processing for rst_parse_batch: syntactic parsing, discourse
+segmentation, and RST parsing each run in their own pool of processes,
+connected by bounded queues, so that the stages work on different documents
+at the same time and the number of processes for each stage can be chosen
+according to its cost (ZPar's memory, the CRF++ subprocesses, and the
+CPU-bound search of the RST parser).
+
+Documents pass through the stages as dictionaries with the document's
+position in the input, its document dictionary (see
+`convert_rst_discourse_tb.py`), and, at the end, its output line.
+'''
+
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from discourseparsing.discourse_segmentation import Segmenter
+from discourseparsing.parse_util import SyntaxParserWrapper
+from discourseparsing.rst_parse import (add_edu_segmentation,
+                                        add_syntax_info,
+                                        is_blank_document,
+                                        segment_and_rst_parse)
+from discourseparsing.rst_parse_batch import (ShardWriter, document_stats,
+                                              load_rst_parser,
+                                              make_output_line)
+from discourseparsing.syntax_cache import DEFAULT_MAX_ENTRIES
+
+
+STAGES = ['syntax', 'segmentation', 'rst']
+
+
+def _make_syntax_stage(zpar_model_directory=None, zpar_hostname=None,
+                       zpar_port=None, syntax_cache=None,
+                       syntax_cache_size=DEFAULT_MAX_ENTRIES,
+                       syntax_cache_model_id=None):
+    syntax_parser = SyntaxParserWrapper(
+        zpar_model_directory, hostname=zpar_hostname, port=zpar_port,
+        cache_path=syntax_cache, cache_max_entries=syntax_cache_size,
+        cache_model_id=syntax_cache_model_id)
+
+    def process_item(item):
+        doc_dict = item['doc_dict']
+        if is_blank_document(doc_dict):
+            item['blank'] = True
+            return
+        trees, item['starts_paragraph_list'] = \
+            syntax_parser.parse_document(doc_dict)
+        add_syntax_info(doc_dict, trees)
+
+    return process_item
+
+
+def _make_segmentation_stage(segmentation_model):
+    segmenter = Segmenter(segmentation_model)
+
+    def process_item(item):
+        if not item.get('blank'):
+            add_edu_segmentation(item['doc_dict'], segmenter,
+                                 item['starts_paragraph_list'])
+
+    return process_item
+
+
+def _make_rst_stage(parsing_model, max_seconds=None,
+                    max_expanded_states=None):
+    parser = load_rst_parser(parsing_model, max_seconds=max_seconds,
+                             max_expanded_states=max_expanded_states)
+
+    def process_item(item):
+        doc_dict = item.pop('doc_dict')
+        if item.get('blank'):
+            edu_tokens, complete_trees = [], []
+        else:
+            # The segmentation stage already added the EDUs, so no segmenter
+            # is needed here.
+            edu_tokens, complete_trees = \
+                segment_and_rst_parse(doc_dict, None, parser)
+        item['output'] = make_output_line(doc_dict['doc_id'], edu_tokens,
+                                          complete_trees)
+        item['stats'] = dict(document_stats(doc_dict, edu_tokens),
+                             worker=os.getpid())
+
+    return process_item
+
+
+_STAGE_FACTORIES = {"syntax": _make_syntax_stage,
+                    "segmentation": _make_segmentation_stage,
+                    "rst": _make_rst_stage}
+
+
+def _run_stage_worker(stage, stage_kwargs, input_queue, output_queue,
+                      n_finished, n_workers, n_next_workers, stats_queue):
+    '''
+    Processes items from `input_queue` until it gets None, and passes them
+    on to `output_queue`.  The last worker of the stage to finish sends one
+    None per worker of the next stage.
+    '''
+    process_item = _STAGE_FACTORIES[stage](**stage_kwargs)
+    start_time = time.perf_counter()
+    busy_time = 0.0
+    n_items = 0
+    while True:
+        item = input_queue.get()
+        if item is None:
+            break
+        item_start_time = time.perf_counter()
+        if 'error' not in item:
+            try:
+                process_item(item)
+            except Exception as e:
+                logging.exception('Error in {} stage, doc_id = {}'
+                                  .format(stage, item.get('doc_id')))
+                item = {"position": item['position'],
+                        "doc_id": item['doc_id'],
+                        "error": '{} stage: {}'.format(stage, e)}
+            else:
+                # The document's processing time over all the stages.
+                item['seconds'] = item.get('seconds', 0.0) \
+                    + time.perf_counter() - item_start_time
+        busy_time += time.perf_counter() - item_start_time
+        n_items += 1
+        output_queue.put(item)
+
+    stats_queue.put((stage, n_items, busy_time,
+                     time.perf_counter() - start_time))
+    with n_finished.get_lock():
+        n_finished.value += 1
+        is_last = n_finished.value == n_workers
+    if is_last:
+        for _ in range(n_next_workers):
+            output_queue.put(None)
+
+
+class _QueueMonitor(object):
+    '''
+    Samples the number of items in each queue at regular intervals.
+    '''
+
+    def __init__(self, queues, interval):
+        self.queues = queues
+        self.interval = interval
+        self.samples = {name: [] for name in queues}
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            for name, stage_queue in self.queues.items():
+                try:
+                    self.samples[name].append(stage_queue.qsize())
+                except NotImplementedError:
+                    # qsize isn't available on some platforms (e.g., macOS).
+                    pass
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+
+def run_pipeline(docs, output_prefix, shard_size, model_kwargs,
+                 n_syntax_workers=1, n_segmentation_workers=1,
+                 n_rst_workers=1, max_in_flight=None, queue_size=None,
+                 monitor_interval=0.5, resume=False, progress=None):
+    '''
+    Parses documents with a pool of processes for each stage and writes the
+    output lines to `output_prefix.N` files with `shard_size` documents each,
+    in input order.
+
+    `docs` is an iterable of (position, doc_id, text) tuples, where the
+    positions are 0, 1, ..., in any order (e.g., longest document first).
+    `model_kwargs` are keyword arguments as for
+    `rst_parse_batch.load_models`.  At most `max_in_flight` documents are in
+    the pipeline or waiting to be written at a time, and each queue between
+    stages holds at most `queue_size` documents.  With `resume=True`,
+    documents whose output was written by an earlier run are skipped (see
+    `rst_parse_batch.ShardWriter`).  If `progress` (a BatchProgress) is
+    given, the statistics for each document are added to it.
+
+    Returns a report with the occupancy of each stage's input queue and the
+    utilization of each stage's workers, to help size the pools.
+    '''
+    n_workers = {"syntax": n_syntax_workers,
+                 "segmentation": n_segmentation_workers,
+                 "rst": n_rst_workers}
+    if max_in_flight is None:
+        max_in_flight = 4 * sum(n_workers.values())
+    if queue_size is None:
+        queue_size = 2 * max(n_workers.values())
+
+    stage_kwargs = {
+        "syntax": {"zpar_model_directory":
+                   model_kwargs.get('zpar_model_directory'),
+                   "zpar_hostname": model_kwargs.get('zpar_hostname'),
+                   "zpar_port": model_kwargs.get('zpar_port'),
+                   "syntax_cache": model_kwargs.get('syntax_cache'),
+                   "syntax_cache_size": model_kwargs.get(
+                       'syntax_cache_size', DEFAULT_MAX_ENTRIES),
+                   "syntax_cache_model_id":
+                   model_kwargs.get('syntax_cache_model_id')},
+        "segmentation": {"segmentation_model":
+                         model_kwargs['segmentation_model']},
+        "rst": {"parsing_model": model_kwargs['parsing_model'],
+                "max_seconds": model_kwargs.get('max_seconds'),
+                "max_expanded_states":
+                model_kwargs.get('max_expanded_states')}}
+
+    # The input queue for each stage, plus the output queue.
+    queues = {stage: multiprocessing.Queue(queue_size) for stage in STAGES}
+    queues['output'] = multiprocessing.Queue()
+    stats_queue = multiprocessing.Queue()
+
+    processes = []
+    for i, stage in enumerate(STAGES):
+        next_queue = queues[STAGES[i + 1]] if i + 1 < len(STAGES) \
+            else queues['output']
+        n_next_workers = n_workers[STAGES[i + 1]] if i + 1 < len(STAGES) \
+            else 1
+        n_finished = multiprocessing.Value('i', 0)
+        for _ in range(n_workers[stage]):
+            processes.append(multiprocessing.Process(
+                target=_run_stage_worker,
+                args=(stage, stage_kwargs[stage], queues[stage], next_queue,
+                      n_finished, n_workers[stage], n_next_workers,
+                      stats_queue),
+                daemon=True))
+
+    # The documents are fed in by a separate thread so that this one can
+    # keep taking finished documents off the output queue.  The semaphore
+    # limits how many documents have been fed in but not yet written.
+    slots = threading.Semaphore(max_in_flight)
+    feeder_errors = []
+    writer = ShardWriter(output_prefix, shard_size, resume=resume)
+
+    def feed_documents():
+        try:
+            for position, doc_id, text in docs:
+                if writer.is_done(position):
+                    continue
+                slots.acquire()
+                queues['syntax'].put(
+                    {"position": position, "doc_id": doc_id,
+                     "doc_dict": {"doc_id": doc_id, "raw_text": text}})
+        except Exception as e:
+            logging.exception('Error reading the input documents')
+            feeder_errors.append(e)
+        finally:
+            for _ in range(n_workers['syntax']):
+                queues['syntax'].put(None)
+
+    monitor = _QueueMonitor(queues, monitor_interval)
+    feeder = threading.Thread(target=feed_documents, daemon=True)
+    start_time = time.perf_counter()
+    try:
+        for process in processes:
+            process.start()
+        monitor.start()
+        feeder.start()
+        while True:
+            try:
+                item = queues['output'].get(timeout=1.0)
+            except queue.Empty:
+                # Check that no worker died (e.g., from running out of
+                # memory), which would leave the pipeline waiting forever.
+                if any(process.exitcode not in (None, 0)
+                       for process in processes):
+                    raise RuntimeError('A pipeline worker process died.')
+                if progress is not None:
+                    progress.maybe_report()
+                continue
+            if item is None:
+                break
+            if 'error' in item:
+                raise RuntimeError('Could not parse doc_id = {} ({})'
+                                   .format(item['doc_id'], item['error']))
+            writer.add(item['position'], item['output'])
+            slots.release()
+            if progress is not None and 'stats' in item:
+                progress.add(dict(item['stats'], seconds=item['seconds']))
+        feeder.join()
+        if feeder_errors:
+            raise feeder_errors[0]
+        writer.close()
+        for process in processes:
+            process.join()
+    finally:
+        monitor.stop()
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+    wall_time = time.perf_counter() - start_time
+
+    return _make_report(wall_time, n_workers, queue_size, monitor,
+                        [stats_queue.get() for _ in processes])
+
+
+def _make_report(wall_time, n_workers, queue_size, monitor, worker_stats):
+    stage_stats = {stage: {"workers": n_workers[stage], "docs": 0,
+                           "busy_seconds": 0.0}
+                   for stage in STAGES}
+    for stage, n_items, busy_time, _ in worker_stats:
+        stage_stats[stage]['docs'] += n_items
+        stage_stats[stage]['busy_seconds'] += busy_time
+    total_busy_time = sum(x['busy_seconds'] for x in stage_stats.values())
+    for stats in stage_stats.values():
+        # The fraction of the stage's workers' time spent processing
+        # documents rather than waiting for them (or waiting to pass them on).
+        stats['utilization'] = stats['busy_seconds'] \
+            / (stats['workers'] * wall_time) if wall_time else 0.0
+        # The stage's share of the total processing time of all stages.
+        stats['share_of_busy_time'] = stats['busy_seconds'] \
+            / total_busy_time if total_busy_time else 0.0
+
+    queue_stats = {}
+    for name, samples in monitor.samples.items():
+        queue_stats[name] = {
+            "capacity": queue_size if name in STAGES else None,
+            "mean_occupancy": sum(samples) / len(samples) if samples else 0.0,
+            "max_occupancy": max(samples) if samples else 0}
+
+    return {"wall_seconds": wall_time, "stages": stage_stats,
+            "queues": queue_stats}
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# License: MIT
+
+'''
+A long-running RST parsing service that keeps the models loaded and parses
+documents sent to it over HTTP, to avoid loading ZPar, the sentence
+tokenizer, and the RST parsing model for every call to rst_parse.
+
+Documents are POSTed to /parse as JSON objects with a "text" key and,
+optionally, a "doc_id" key.  The response has the same JSON format as the
+output of rst_parse for the document.  GET /health returns
+{"status": "ok"}, and GET /stats returns the numbers of documents and
+micro-batches parsed so far.
+
+Requests are handled concurrently, and documents that arrive within
+`--batch_window` seconds of each other (up to `--max_batch_size` of them)
+are parsed as a micro-batch: their sentences are sent to ZPar as one batch,
+and they are segmented with one run of crf_test.  RST parsing is done one
+document at a time.
+'''
+
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from discourseparsing.rst_parse import (add_edu_starts_paragraph,
+                                        add_parser_budget_args,
+                                        add_syntax_info,
+                                        is_blank_document,
+                                        make_output,
+                                        segment_and_rst_parse)
+from discourseparsing.syntax_cache import DEFAULT_MAX_ENTRIES
+
+
+class RSTParsingService(object):
+    '''
+    Parses documents submitted from any number of threads with one set of
+    models.  The documents are parsed in a background thread, in
+    micro-batches of the documents that arrive within `batch_window`
+    seconds of the first one, up to `max_batch_size` documents.
+    '''
+
+    def __init__(self, syntax_parser, segmenter, rst_parser,
+                 batch_window=0.01, max_batch_size=16):
+        self.syntax_parser = syntax_parser
+        self.segmenter = segmenter
+        self.rst_parser = rst_parser
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.n_documents = 0
+        self.n_batches = 0
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, doc_dict):
+        '''
+        Adds a document dictionary with "doc_id" and "raw_text" keys to the
+        next micro-batch, and returns a Future for its output (see
+        `rst_parse.make_output`).
+        '''
+        future = Future()
+        self._queue.put((doc_dict, future))
+        return future
+
+    def parse(self, doc_dict):
+        return self.submit(doc_dict).result()
+
+    def close(self):
+        '''
+        Stops the service after parsing the documents already submitted.
+        '''
+        self._queue.put(None)
+        self._thread.join()
+
+    def _next_batch(self):
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                # Stop after this batch.
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+            batch = [(doc_dict, future) for doc_dict, future in batch
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self.n_batches += 1
+            self.n_documents += len(batch)
+            logging.info('Parsing a batch of {} documents'.format(len(batch)))
+
+            try:
+                # The documents are copied since the batch may have to be
+                # parsed again, one document at a time.
+                outputs = self._parse_batch([dict(doc_dict)
+                                             for doc_dict, _ in batch])
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    continue
+                logging.exception('Error parsing a batch of documents. ' +
+                                  'Parsing them one at a time.')
+                # Parse the documents one at a time, so that one bad
+                # document doesn't make the others fail.
+                for doc_dict, future in batch:
+                    try:
+                        future.set_result(self._parse_batch([doc_dict])[0])
+                    except Exception as doc_error:
+                        future.set_exception(doc_error)
+            else:
+                for (_, future), output in zip(batch, outputs):
+                    future.set_result(output)
+
+    def _parse_batch(self, doc_dicts):
+        is_blank = [is_blank_document(doc_dict) for doc_dict in doc_dicts]
+        docs = [doc_dict for doc_dict, blank in zip(doc_dicts, is_blank)
+                if not blank]
+        if docs:
+            parses = self.syntax_parser.parse_documents(docs)
+            for doc_dict, (trees, _) in zip(docs, parses):
+                add_syntax_info(doc_dict, trees)
+            self.segmenter.segment_documents(docs)
+            for doc_dict, (_, starts_paragraph_list) in zip(docs, parses):
+                add_edu_starts_paragraph(doc_dict, starts_paragraph_list)
+
+        res = []
+        for doc_dict, blank in zip(doc_dicts, is_blank):
+            if blank:
+                res.append(make_output([], []))
+            else:
+                # The documents are already segmented, so no segmenter is
+                # needed here.
+                res.append(make_output(*segment_and_rst_parse(
+                    doc_dict, None, self.rst_parser)))
+        return res
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        if self.path != '/parse':
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            doc_dict = {"doc_id": request.get("doc_id"),
+                        "raw_text": request["text"]}
+            if not isinstance(doc_dict["raw_text"], str):
+                raise TypeError('"text" must be a string')
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self._send_json(400, {"error": "invalid request: {}".format(e)})
+            return
+
+        try:
+            output = self.server.service.parse(doc_dict)
+        except Exception as e:
+            logging.exception('Error parsing doc_id = {}'
+                              .format(doc_dict["doc_id"]))
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, output)
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == '/health':
+            self._send_json(200, {"status": "ok"})
+        elif self.path == '/stats':
+            self._send_json(200, {"documents": service.n_documents,
+                                  "batches": service.n_batches})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug('{} - {}'.format(self.address_string(), format % args))
+
+
+def make_server(service, host='localhost', port=8000):
+    '''
+    Returns an HTTP server (not yet started) for an RSTParsingService.  Use
+    port 0 to pick any free port (see `server.server_address`).
+    '''
+    server = ThreadingHTTPServer((host, port), _RequestHandler)
+    server.service = service
+    return server
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-g', '--segmentation_model',
+                        help='Path to segmentation model.',
+                        required=True)
+    parser.add_argument('-p', '--parsing_model',
+                        help='Path to RST parsing model.',
+                        required=True)
+    parser.add_argument('-a', '--max_acts',
+                        help='Maximum number of highest-scoring actions ' +
+                        'to consider expanding from each state',
+                        type=int, default=1)
+    parser.add_argument('-n', '--n_best',
+                        help='Number of parses to return', type=int, default=1)
+    parser.add_argument('-s', '--max_states',
+                        help='Maximum number of states to retain for \
+                              best-first search',
+                        type=int, default=1)
+    add_parser_budget_args(parser)
+    parser.add_argument('-zp', '--zpar_port', type=int)
+    parser.add_argument('-zh', '--zpar_hostname', default=None,
+                        help='hostname of a zpar server, or a comma-' +
+                        'separated list of hostname:port entries for ' +
+                        'several servers')
+    parser.add_argument('-zm', '--zpar_model_directory', default=None)
+    parser.add_argument('--syntax_cache', default=None,
+                        help='path to a SQLite file for caching syntactic ' +
+                        'parses of sentences (shared across runs and ' +
+                        'processes)')
+    parser.add_argument('--syntax_cache_size', type=int,
+                        default=DEFAULT_MAX_ENTRIES,
+                        help='maximum number of parses to keep in the ' +
+                        'syntax cache')
+    parser.add_argument('--syntax_cache_model_id', default=None,
+                        help='ID of the ZPar model for keying the syntax ' +
+                        'cache (required with ZPar servers; by default, ' +
+                        'computed from the files in the model directory)')
+    parser.add_argument('--host', default='localhost',
+                        help='host name or address to listen on')
+    parser.add_argument('--port', type=int, default=8000,
+                        help='port to listen on')
+    parser.add_argument('--batch_window', type=float, default=0.01,
+                        help='seconds to wait for more documents after the ' +
+                        'first one in a micro-batch arrives')
+    parser.add_argument('--max_batch_size', type=int, default=16,
+                        help='maximum number of documents per micro-batch')
+    parser.add_argument('-v', '--verbose',
+                        help='Print more status information. For every ' +
+                        'additional time this flag is specified, ' +
+                        'output gets more verbose.',
+                        default=0, action='count')
+    args = parser.parse_args()
+
+    # Convert verbose flag to actually logging level.
+    log_levels = [logging.WARNING, logging.INFO, logging.DEBUG]
+    log_level = log_levels[min(args.verbose, 2)]
+    # Make warnings from built-in warnings module get formatted more nicely.
+    logging.captureWarnings(True)
+    logging.basicConfig(format=('%(asctime)s - %(name)s - %(levelname)s - ' +
+                                '%(message)s'), level=log_level)
+
+    from discourseparsing.discourse_parsing import Parser
+    from discourseparsing.discourse_segmentation import Segmenter
+    from discourseparsing.parse_util import (SyntaxParserWrapper,
+                                             get_sentence_tokenizer)
+
+    # Load all of the models now rather than when the first request comes.
+    logging.info('Loading models')
+    syntax_parser = \
+        SyntaxParserWrapper(port=args.zpar_port, hostname=args.zpar_hostname,
+                            zpar_model_directory=args.zpar_model_directory,
+                            cache_path=args.syntax_cache,
+                            cache_max_entries=args.syntax_cache_size,
+                            cache_model_id=args.syntax_cache_model_id)
+    syntax_parser.load()
+    get_sentence_tokenizer()
+    segmenter = Segmenter(args.segmentation_model)
+    rst_parser = Parser(max_acts=args.max_acts,
+                        max_states=args.max_states,
+                        n_best=args.n_best,
+                        max_seconds=args.max_seconds,
+                        max_expanded_states=args.max_expanded_states)
+    rst_parser.load_model(args.parsing_model)
+
+    service = RSTParsingService(syntax_parser, segmenter, rst_parser,
+                                batch_window=args.batch_window,
+                                max_batch_size=args.max_batch_size)
+    server = make_server(service, args.host, args.port)
+    logging.info('Listening on http://{}:{}/parse'.format(
+        *server.server_address[:2]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -12,14 +12,6 @@ happen within the code for a discourse parser.
 
 import argparse
 
-from discourseparsing.discourse_segmentation import (Segmenter,
-                                                     extract_edus_tokens)
-from discourseparsing.tree_util import (extract_preterminals,
-                                        extract_converted_terminals,
-                                        TREE_PRINT_MARGIN)
-from discourseparsing.parse_util import SyntaxParserWrapper
-from discourseparsing.io_util import read_text_file
-
 
 def main():
     parser = argparse.ArgumentParser(
@@ -29,9 +21,22 @@ def main():
                         'tune_segmentation_model.py.')
     parser.add_argument('input_path', help='document text file')
     parser.add_argument('-zp', '--zpar_port', type=int)
-    parser.add_argument('-zh', '--zpar_hostname', default=None)
+    parser.add_argument('-zh', '--zpar_hostname', default=None,
+                        help='hostname of a zpar server, or a comma-' +
+                        'separated list of hostname:port entries for ' +
+                        'several servers')
     args = parser.parse_args()
 
+    # These import NLTK, which is slow, so they are imported after the
+    # arguments are parsed.
+    from discourseparsing.discourse_segmentation import (Segmenter,
+                                                         extract_edus_tokens)
+    from discourseparsing.tree_util import (extract_preterminals,
+                                            extract_converted_terminals,
+                                            TREE_PRINT_MARGIN)
+    from discourseparsing.parse_util import SyntaxParserWrapper
+    from discourseparsing.io_util import read_text_file
+
     raw_text = read_text_file(args.input_path)
     doc_dict = {"doc_id": args.input_path, "raw_text": raw_text}
 
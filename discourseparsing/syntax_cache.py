@@ -0,0 +1,275 @@
+# License: MIT
+
+'''
+A persistent cache of syntactic parses, so that sentences that occur many
+times (e.g., boilerplate, disclaimers, or templated footers) are only sent to
+ZPar once.
+
+The cache is a SQLite database, keyed by a hash of the ZPar model ID and the
+normalized sentence. It uses write-ahead logging so that it can be shared by
+several processes (e.g., the workers in rst_parse_batch), and it evicts the
+least recently used entries when it holds more than `max_entries` parses.
+
+Lookups only read from the database.  The recency of the entries that were
+found and the hit and miss counts are kept in memory and written along with
+the next batch of parses, or every `flush_interval` seconds, so that
+processes that mostly hit the cache don't have to wait for each other.
+'''
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_MAX_ENTRIES = 1000000
+
+DEFAULT_FLUSH_INTERVAL = 30.0
+
+# SQLite limits the number of parameters in a query, so lookups and updates
+# for large batches are done in chunks.
+_QUERY_CHUNK_SIZE = 500
+
+
+class SyntaxParseCache(object):
+    '''
+    Maps sentences (tokenized, as from SyntaxParserWrapper.tokenize_document)
+    to tree strings from a particular ZPar model.
+    '''
+
+    def __init__(self, path, model_id, max_entries=DEFAULT_MAX_ENTRIES,
+                 timeout=60.0, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+        self._reset_pending()
+
+    def _reset_pending(self):
+        # Updates from lookups that haven't been written to the database yet.
+        self._pending_last_used = {}
+        self._pending_hits = 0
+        self._pending_misses = 0
+        self._pending_pid = os.getpid()
+        self._last_flush_time = time.time()
+
+    @staticmethod
+    def normalize_sentence(sentence):
+        return ' '.join(sentence.split())
+
+    def make_key(self, sentence):
+        key_str = '{}\n{}'.format(self.model_id,
+                                  self.normalize_sentence(sentence))
+        return hashlib.sha1(key_str.encode('utf-8')).hexdigest()
+
+    def _get_connection(self):
+        # SQLite connections can't be used across fork, so each process opens
+        # its own.
+        if self._connection is None or self._connection_pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.timeout,
+                                         isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS parses '
+                               '(key TEXT PRIMARY KEY, tree TEXT NOT NULL, '
+                               'last_used REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS parses_last_used '
+                               'ON parses (last_used)')
+            connection.execute('CREATE TABLE IF NOT EXISTS stats '
+                               '(name TEXT PRIMARY KEY, value INTEGER)')
+            # The number of entries is kept in the stats table so that it
+            # doesn't have to be counted for each batch of parses.  Caches
+            # created before it was kept are counted once here.
+            connection.execute(
+                "INSERT OR IGNORE INTO stats SELECT 'entries', "
+                "(SELECT COUNT(*) FROM parses) WHERE NOT EXISTS "
+                "(SELECT 1 FROM stats WHERE name = 'entries')")
+            self._connection = connection
+            self._connection_pid = os.getpid()
+        if self._pending_pid != os.getpid():
+            # The pending updates were copied from the parent process, which
+            # will write them itself.
+            self._reset_pending()
+        return self._connection
+
+    def get_many(self, sentences):
+        '''
+        Returns a list with the cached tree string for each sentence, or None
+        for sentences that are not in the cache. Marks the found entries as
+        recently used (in memory, until the next flush).
+        '''
+        keys = [self.make_key(sentence) for sentence in sentences]
+        unique_keys = list(set(keys))
+        found = {}
+        with self._lock:
+            connection = self._get_connection()
+            for i in range(0, len(unique_keys), _QUERY_CHUNK_SIZE):
+                chunk = unique_keys[i:i + _QUERY_CHUNK_SIZE]
+                query = ('SELECT key, tree FROM parses WHERE key IN ({})'
+                         .format(','.join('?' * len(chunk))))
+                found.update(connection.execute(query, chunk))
+
+            res = [found.get(key) for key in keys]
+            n_hits = sum(1 for x in res if x is not None)
+            n_misses = len(res) - n_hits
+            self.hits += n_hits
+            self.misses += n_misses
+
+            now = time.time()
+            self._pending_last_used.update((key, now) for key in found)
+            self._pending_hits += n_hits
+            self._pending_misses += n_misses
+            if now - self._last_flush_time >= self.flush_interval:
+                connection.execute('BEGIN IMMEDIATE')
+                try:
+                    self._write_pending(connection)
+                    connection.execute('COMMIT')
+                except BaseException:
+                    connection.execute('ROLLBACK')
+                    raise
+        return res
+
+    def _write_pending(self, connection):
+        '''
+        Writes the pending recency and stats updates, as part of a transaction
+        that the caller has started.
+        '''
+        # Another process might have used an entry more recently.
+        connection.executemany(
+            'UPDATE parses SET last_used = ? WHERE key = ? AND last_used < ?',
+            [(last_used, key, last_used)
+             for key, last_used in self._pending_last_used.items()])
+        for name, value in [('hits', self._pending_hits),
+                            ('misses', self._pending_misses)]:
+            connection.execute('INSERT OR IGNORE INTO stats VALUES (?, 0)',
+                               (name,))
+            connection.execute('UPDATE stats SET value = value + ? '
+                               'WHERE name = ?', (value, name))
+        self._reset_pending()
+
+    def flush(self):
+        '''
+        Writes the recency and stats updates from lookups since the last flush
+        to the database.
+        '''
+        with self._lock:
+            connection = self._get_connection()
+            if not self._has_pending():
+                return
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                self._write_pending(connection)
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+
+    def _has_pending(self):
+        return bool(self._pending_last_used or self._pending_hits
+                    or self._pending_misses)
+
+    def put_many(self, sentences, trees):
+        '''
+        Adds parses to the cache. Sentences whose tree is None (i.e., that
+        could not be parsed) are skipped. If the cache then has more than
+        `max_entries` parses, the least recently used ones are removed.
+        Pending updates from lookups are written at the same time.
+        '''
+        now = time.time()
+        rows = {self.make_key(sentence): (tree, now)
+                for sentence, tree in zip(sentences, trees)
+                if tree is not None}
+        if not rows:
+            return
+        keys = list(rows)
+
+        with self._lock:
+            connection = self._get_connection()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                self._write_pending(connection)
+                n_existing = 0
+                for i in range(0, len(keys), _QUERY_CHUNK_SIZE):
+                    chunk = keys[i:i + _QUERY_CHUNK_SIZE]
+                    n_existing += connection.execute(
+                        'SELECT COUNT(*) FROM parses WHERE key IN ({})'
+                        .format(','.join('?' * len(chunk))),
+                        chunk).fetchone()[0]
+                connection.executemany('INSERT OR REPLACE INTO parses '
+                                       'VALUES (?, ?, ?)',
+                                       [(key,) + row
+                                        for key, row in rows.items()])
+                n_entries = self._add_to_entry_count(
+                    connection, len(keys) - n_existing)
+                n_to_remove = n_entries - self.max_entries
+                if n_to_remove > 0:
+                    logging.debug('Removing {} parses from the syntax cache'
+                                  .format(n_to_remove))
+                    n_removed = connection.execute(
+                        'DELETE FROM parses WHERE key IN (SELECT key FROM '
+                        'parses ORDER BY last_used LIMIT ?)',
+                        (n_to_remove,)).rowcount
+                    self._add_to_entry_count(connection, -n_removed)
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+
+    @staticmethod
+    def _add_to_entry_count(connection, n):
+        '''
+        Adds `n` to the number of entries and returns the new number.
+        '''
+        connection.execute("UPDATE stats SET value = value + ? "
+                           "WHERE name = 'entries'", (n,))
+        return connection.execute("SELECT value FROM stats "
+                                  "WHERE name = 'entries'").fetchone()[0]
+
+    def stats(self):
+        '''
+        Returns a dictionary with the numbers of hits and misses for this
+        object, the total numbers of hits and misses recorded in the cache
+        file (by all processes using it), and the number of cached parses.
+        '''
+        self.flush()
+        with self._lock:
+            connection = self._get_connection()
+            totals = dict(connection.execute('SELECT name, value FROM stats'))
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "total_hits": totals.get('hits', 0),
+                "total_misses": totals.get('misses', 0),
+                "entries": totals['entries']}
+
+    def close(self):
+        if self._pending_pid == os.getpid() and self._has_pending():
+            self.flush()
+        with self._lock:
+            if self._connection is not None \
+                    and self._connection_pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+    def __getstate__(self):
+        # Don't pickle the connection or lock (e.g., when sending the cache
+        # to another process).
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_connection_pid'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        # The pending updates belong to the process that made them.
+        self._reset_pending()
@@ -0,0 +1,248 @@
+# License: MIT
+
+'''
+A pool of syntactic parsing processes that other processes (e.g., the RST
+parsing workers in rst_parse_batch) send sentences to over local queues.
+
+This lets the number of ZPar instances, each of which holds a copy of the
+ZPar model in memory, be chosen independently of the number of processes
+doing segmentation and RST parsing.
+
+The pool creates a fixed number of client slots, each with its own response
+queue. Since multiprocessing queues can only be shared with processes when
+they are created, the pool's `connector()` should be passed to the client
+processes when they are started (e.g., via a ProcessPoolExecutor
+initializer), and each client process then calls `connect()` on it to get a
+SyntaxParserWrapper that uses the pool.
+
+If a worker process dies (e.g., if it's killed for running out of memory),
+the pool is marked as broken, and clients waiting for responses raise an
+error instead of waiting forever for sentences that won't be parsed.
+'''
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import queue
+import threading
+
+from discourseparsing.parse_util import SyntaxParserWrapper
+from discourseparsing.syntax_cache import DEFAULT_MAX_ENTRIES
+
+
+# The number of sentences per request.  Larger documents are split into
+# several requests so that they can be parsed by several workers at once.
+DEFAULT_CHUNK_SIZE = 16
+
+# How often, in seconds, the pool checks that its workers are alive, and
+# clients waiting for responses check whether the pool is broken.
+POLL_INTERVAL = 1.0
+
+
+def _run_syntax_worker(request_queue, response_queues, wrapper_kwargs):
+    syntax_parser = SyntaxParserWrapper(**wrapper_kwargs)
+    while True:
+        request = request_queue.get()
+        if request is None:
+            break
+        client_id, request_id, sentences = request
+        try:
+            res = syntax_parser.parse_sentences(sentences)
+        except Exception as e:
+            logging.exception('Error in syntax parsing worker')
+            # Send the message rather than the exception, which might not be
+            # picklable.
+            res = RuntimeError('Syntax parsing worker error: {}'.format(e))
+        response_queues[client_id].put((request_id, res))
+
+
+class SyntaxParserPool(object):
+    '''
+    Starts `n_workers` processes that each run a SyntaxParserWrapper created
+    with `zpar_model_directory`, `hostname`, and `port`, and that parse
+    sentences sent by up to `max_clients` client processes.
+    '''
+
+    def __init__(self, n_workers, max_clients, zpar_model_directory=None,
+                 hostname=None, port=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.n_workers = n_workers
+        self.max_clients = max_clients
+        self.zpar_model_directory = zpar_model_directory
+        self.hostname = hostname
+        self.port = port
+        self.chunk_size = chunk_size
+
+        self._request_queue = multiprocessing.Queue()
+        self._response_queues = [multiprocessing.Queue()
+                                 for _ in range(max_clients)]
+        self._free_client_ids = multiprocessing.Queue()
+        for client_id in range(max_clients):
+            self._free_client_ids.put(client_id)
+        # This is set if a worker exits before the pool is closed.
+        self._broken = multiprocessing.Event()
+
+        wrapper_kwargs = {"zpar_model_directory": zpar_model_directory,
+                          "hostname": hostname, "port": port}
+        self._workers = [
+            multiprocessing.Process(target=_run_syntax_worker,
+                                    args=(self._request_queue,
+                                          self._response_queues,
+                                          wrapper_kwargs),
+                                    daemon=True)
+            for _ in range(n_workers)]
+        logging.info('Starting {} syntax parsing workers'.format(n_workers))
+        for worker in self._workers:
+            worker.start()
+
+        self._closing = threading.Event()
+        self._monitor_thread = threading.Thread(target=self._monitor_workers,
+                                                daemon=True)
+        self._monitor_thread.start()
+
+    def _monitor_workers(self):
+        while not self._closing.wait(POLL_INTERVAL):
+            for worker in self._workers:
+                if not worker.is_alive():
+                    logging.error('Syntax parsing worker {} exited with '
+                                  'code {}'.format(worker.pid,
+                                                   worker.exitcode))
+                    self._broken.set()
+                    return
+
+    @property
+    def broken(self):
+        return self._broken.is_set()
+
+    def connector(self):
+        return SyntaxParserPoolConnector(self._request_queue,
+                                         self._response_queues,
+                                         self._free_client_ids,
+                                         self.zpar_model_directory,
+                                         self.hostname, self.port,
+                                         self.chunk_size,
+                                         self._broken)
+
+    def close(self):
+        '''
+        Stops the workers after they finish the requests already queued.
+        '''
+        self._closing.set()
+        self._monitor_thread.join()
+        for worker in self._workers:
+            if worker.is_alive():
+                self._request_queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        self._workers = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class SyntaxParserPoolConnector(object):
+    '''
+    The part of a SyntaxParserPool that client processes need in order to
+    use it (i.e., its queues).
+    '''
+
+    def __init__(self, request_queue, response_queues, free_client_ids,
+                 zpar_model_directory, hostname, port, chunk_size, broken):
+        self.request_queue = request_queue
+        self.response_queues = response_queues
+        self.free_client_ids = free_client_ids
+        self.zpar_model_directory = zpar_model_directory
+        self.hostname = hostname
+        self.port = port
+        self.chunk_size = chunk_size
+        self.broken = broken
+
+    def connect(self, cache_path=None, cache_max_entries=DEFAULT_MAX_ENTRIES,
+                cache_model_id=None):
+        '''
+        Returns a PooledSyntaxParserWrapper that uses one of the pool's
+        client slots until its `close` method is called.
+        '''
+        client_id = self.free_client_ids.get()
+        return PooledSyntaxParserWrapper(self, client_id,
+                                         cache_path=cache_path,
+                                         cache_max_entries=cache_max_entries,
+                                         cache_model_id=cache_model_id)
+
+
+class PooledSyntaxParserWrapper(SyntaxParserWrapper):
+    '''
+    A SyntaxParserWrapper that tokenizes documents and checks the syntax
+    cache (if any) itself but sends the sentences to be parsed to a
+    SyntaxParserPool.
+    '''
+
+    def __init__(self, connector, client_id, cache_path=None,
+                 cache_max_entries=DEFAULT_MAX_ENTRIES, cache_model_id=None):
+        # The pool's hostname and port are only used to key the cache.
+        super(PooledSyntaxParserWrapper, self).__init__(
+            zpar_model_directory=connector.zpar_model_directory,
+            hostname=connector.hostname, port=connector.port,
+            cache_path=cache_path, cache_max_entries=cache_max_entries,
+            cache_model_id=cache_model_id)
+        self._connector = connector
+        self._client_id = client_id
+        self._response_queue = connector.response_queues[client_id]
+        self._request_ids = itertools.count()
+        # Responses for one call must not be mixed up with those for
+        # another, so calls from different threads are serialized.
+        self._lock = threading.Lock()
+
+    def load(self):
+        # The pool's workers have the ZPar client or library.
+        pass
+
+    def _parse_sentences_uncached(self, sentences):
+        chunk_size = self._connector.chunk_size
+        with self._lock:
+            request_ids = []
+            for i in range(0, len(sentences), chunk_size):
+                request_id = next(self._request_ids)
+                request_ids.append(request_id)
+                self._connector.request_queue.put(
+                    (self._client_id, request_id,
+                     sentences[i:i + chunk_size]))
+
+            responses = {}
+            while len(responses) < len(request_ids):
+                try:
+                    request_id, parsed_sents = \
+                        self._response_queue.get(timeout=POLL_INTERVAL)
+                except queue.Empty:
+                    if self._connector.broken.is_set():
+                        # The requests might have been lost with the worker
+                        # that exited, so don't wait for them.
+                        raise RuntimeError('A syntax parsing worker exited ' +
+                                           'unexpectedly.')
+                    continue
+                responses[request_id] = parsed_sents
+
+        res = []
+        for request_id in request_ids:
+            parsed_sents = responses[request_id]
+            if isinstance(parsed_sents, Exception):
+                raise parsed_sents
+            res.extend(parsed_sents)
+        return res
+
+    async def _parse_sentences_uncached_async(self, sentences):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None,
+                                          self._parse_sentences_uncached,
+                                          sentences)
+
+    def close(self):
+        '''
+        Gives the client slot back to the pool.
+        '''
+        if self._client_id is not None:
+            self._connector.free_client_ids.put(self._client_id)
+            self._client_id = None
@@ -2,7 +2,7 @@
 
 import re
 
-from nltk.tree import ParentedTree
+from nltk.tree import Tree, ParentedTree
 
 
 TREE_PRINT_MARGIN = 1000000000
@@ -87,11 +87,23 @@ class HeadedParentedTree(ParentedTree):
                      "NX": [],
                      "X": []}
 
+    # cached values (see head() and precompute_maximal_head_nodes()).
+    # These are class attributes so that instances made directly by
+    # tree_from_string have them too.
+    _head = None
+    _maximal_head = None
+    _maximal_head_depth = None
+    _preterminals = None
+
     def __init__(self, node_or_str, children=None):
         self._head = None
+        self._maximal_head = None
+        self._maximal_head_depth = None
+        self._preterminals = None
         super(HeadedParentedTree, self).__init__(node_or_str, children)
 
-    def _search_children(self, search_list, start_point):
+    @staticmethod
+    def _search_children(child_labels, search_list, start_point):
         '''
         A helper function for finding heads of noun phrases.
         This finds the first node whose label is in search_list, starting
@@ -101,15 +113,15 @@ class HeadedParentedTree(ParentedTree):
         assert start_point == "L" or start_point == "R"
 
         head_index = None
-        num_children = len(self)
-        children = list(self)
+        num_children = len(child_labels)
+        child_labels = list(child_labels)
 
         # reverse the list if we start from the right
         if start_point == "R":
-            children.reverse()
+            child_labels.reverse()
 
-        for i, child in enumerate(children):
-            if child.label() in search_list:
+        for i, child_label in enumerate(child_labels):
+            if child_label in search_list:
                 head_index = i
                 break
 
@@ -119,6 +131,88 @@ class HeadedParentedTree(ParentedTree):
 
         return head_index
 
+    @classmethod
+    def find_head_index(cls, label, child_labels):
+        '''
+        Returns the index of the head child of a node with the given label
+        and child labels.  See head().
+        '''
+        num_children = len(child_labels)
+        head_index = None
+
+        if num_children < 2:
+            # shortcut for when there is only one child
+            return 0
+
+        # special case: NPs
+        if label == 'NP':
+            # If last node is POS, that's the head
+            if child_labels[-1] == "POS":
+                head_index = num_children - 1
+
+            # Otherwise, look right to left for NN, NNP, NNPS, NNS, NX,
+            # POS, or JJR.
+            if head_index is None:
+                head_index = cls._search_children(child_labels,
+                                                  ["NN", "NNP", "NNPS",
+                                                   "NNS", "NX", "POS",
+                                                   "JJR"],
+                                                  "R")
+
+            # Otherwise, search left to right for NP.
+            if head_index is None:
+                head_index = cls._search_children(child_labels, ["NP"],
+                                                  "L")
+
+            # Otherwise, search right to left for $, ADJP, PRN.
+            if head_index is None:
+                head_index = cls._search_children(child_labels,
+                                                  ["$", "ADJP", "PRN"],
+                                                  "R")
+
+            # Otherwise, search right to left for CD.
+            if head_index is None:
+                head_index = cls._search_children(child_labels, ["CD"],
+                                                  "R")
+
+            # Otherwise, search right to left for JJ, JJS, RB, or QP.
+            if head_index is None:
+                head_index = cls._search_children(child_labels,
+                                                  ["JJ", "JJS", "RB",
+                                                   "QP"],
+                                                  "R")
+
+            # Otherwise, return the last child.
+            if head_index is None:
+                head_index = num_children - 1
+
+        else:  # typical cases
+            start_point = cls.start_points[label]
+
+            # Try looking for each symbol in the priority list.
+            # Stop at the first match.
+            for symbol in cls.priority_list[label]:
+                head_index = cls._search_children(child_labels, [symbol],
+                                                  start_point)
+                if head_index is not None:
+                    break
+
+            if head_index is None:
+                # If none of the symbols given in the priority list
+                # for this label was found, then default to the first
+                # child from the left or right, as specified by the
+                # starting points table.
+                head_index = 0 if start_point == 'L' else num_children - 1
+
+        # special case: coordination.
+        # After finding the head, check to see if its left sibling is a
+        # conjunction.  If so, move the head index left 2.
+        if 'CC' in child_labels:
+            if head_index > 2 and child_labels[head_index - 1] == 'CC':
+                head_index -= 2
+
+        return head_index
+
     def head(self):
         '''
         Head finding rules, following Michael Collins' head rules
@@ -129,94 +223,82 @@ class HeadedParentedTree(ParentedTree):
         (http://nlp.stanford.edu/nlp/javadoc/javanlp/edu/stanford/nlp/trees/CollinsHeadFinder.html).
         '''
         if self._head is None:
-            num_children = len(self)
-            head_index = None
-
-            if num_children < 2:
+            if len(self) < 2:
                 # shortcut for when there is only one child
                 self._head = self[0]
                 return self._head
 
-            # special case: NPs
-            if self.label() == 'NP':
-                # If last node is POS, that's the head
-                if self[-1].label() == "POS":
-                    head_index = num_children - 1
-
-                # Otherwise, look right to left for NN, NNP, NNPS, NNS, NX,
-                # POS, or JJR.
-                if head_index is None:
-                    head_index = self._search_children(["NN", "NNP", "NNPS",
-                                                        "NNS", "NX", "POS",
-                                                        "JJR"],
-                                                       "R")
-
-                # Otherwise, search left to right for NP.
-                if head_index is None:
-                    head_index = self._search_children(["NP"],
-                                                       "L")
-
-                # Otherwise, search right to left for $, ADJP, PRN.
-                if head_index is None:
-                    head_index = self._search_children(["$", "ADJP", "PRN"],
-                                                       "R")
-
-                # Otherwise, search right to left for CD.
-                if head_index is None:
-                    head_index = self._search_children(["CD"],
-                                                       "R")
-
-                # Otherwise, search right to left for JJ, JJS, RB, or QP.
-                if head_index is None:
-                    head_index = self._search_children(["JJ", "JJS", "RB",
-                                                        "QP"],
-                                                       "R")
-
-                # Otherwise, return the last child.
-                if head_index is None:
-                    head_index = num_children - 1
-
-            else:  # typical cases
-                start_point = self.start_points[self.label()]
-
-                # Try looking for each symbol in the priority list.
-                # Stop at the first match.
-                for symbol in self.priority_list[self.label()]:
-                    head_index = self._search_children([symbol], start_point)
-                    if head_index is not None:
-                        break
-
-                if head_index is None:
-                    # If none of the symbols given in the priority list
-                    # for this label was found, then default to the first
-                    # child from the left or right, as specified by the
-                    # starting points table.
-                    head_index = 0 if start_point == 'L' else num_children - 1
-
-            # special case: coordination.
-            # After finding the head, check to see if its left sibling is a
-            # conjunction.  If so, move the head index left 2.
-            if 'CC' in {x.label() for x in self}:
-                if head_index > 2 and self[head_index - 1].label() == 'CC':
-                    head_index -= 2
+            head_index = self.find_head_index(self.label(),
+                                              [x.label() for x in self])
 
             # cache the result
             self._head = self[head_index]
 
         return self._head
 
+    def precompute_maximal_head_nodes(self):
+        '''
+        Finds the maximal head node (see find_maximal_head_node) and its depth
+        for every node in the tree in a single top-down pass, and caches the
+        list of preterminals in left-to-right order.
+
+        This should be called on the root after the tree is fully constructed,
+        since, like the heads, the cached values are not updated if the tree is
+        modified later.
+        '''
+        assert self.parent() is None
+
+        self._maximal_head = self
+        self._maximal_head_depth = 0
+        preterminals = []
+        to_visit = [(self, 0)]
+        while to_visit:
+            node, depth = to_visit.pop()
+            if isinstance(node[0], str):
+                preterminals.append(node)
+                continue
+
+            # The head child has the same maximal head node as its parent.
+            # Every other child is its own maximal head node.
+            head = node.head()
+            for child in reversed(node):
+                if child is head:
+                    child._maximal_head = node._maximal_head
+                    child._maximal_head_depth = node._maximal_head_depth
+                else:
+                    child._maximal_head = child
+                    child._maximal_head_depth = depth + 1
+                to_visit.append((child, depth + 1))
+
+        self._preterminals = preterminals
+        return preterminals
+
     def find_maximal_head_node(self):
         '''
         Finds the topmost node that has this node as its head.
         Returns itself if the parent has a different head
         '''
-        res = self
-        parent = res.parent()
-        while parent is not None and parent.head() == res:
-            res = parent
-            parent = res.parent()
+        if self._maximal_head is None:
+            self.root().precompute_maximal_head_nodes()
+        return self._maximal_head
 
-        return res
+    def maximal_head_depth(self):
+        '''
+        Returns the depth in the tree (i.e., the length of the treeposition)
+        of the node returned by find_maximal_head_node.
+        '''
+        if self._maximal_head is None:
+            self.root().precompute_maximal_head_nodes()
+        return self._maximal_head_depth
+
+    def preterminals(self):
+        '''
+        Returns the list of preterminals in the tree, in left-to-right order.
+        This should be called on the root.
+        '''
+        if self._preterminals is None:
+            self.precompute_maximal_head_nodes()
+        return self._preterminals
 
     def head_preterminal(self):
         res = self
@@ -231,6 +313,86 @@ class HeadedParentedTree(ParentedTree):
         return self.head_preterminal().label()
 
 
+def tree_from_string(tree_str, tree_class=ParentedTree):
+    '''
+    Reads a bracketed tree string (e.g., a PTB syntax tree or an RST tree)
+    and returns a tree of type `tree_class`.
+
+    This is a faster replacement for NLTK's `Tree.fromstring` that makes a
+    single pass over the whitespace-separated tokens instead of matching a
+    regular expression for each token.  It produces the same trees as
+    `fromstring` with the default arguments, including an empty label for
+    the extra top bracketing in PTB trees (e.g., "( (S ...))").
+
+    Brackets within words should have been replaced with PTB escape
+    sequences such as -LRB- (see convert_parens_to_ptb_format).
+    '''
+    tokens = tree_str.replace('(', ' ( ').replace(')', ' ) ').split()
+
+    # For the tree classes in this module, nodes are created and filled in
+    # directly, skipping the constructors and the checks that ParentedTree
+    # does for every new child.  This is safe since every child here is a new
+    # node.  Other classes just use their constructors.
+    is_parented = issubclass(tree_class, ParentedTree)
+    if tree_class in _directly_constructed_tree_classes:
+        def make_node(label):
+            node = tree_class.__new__(tree_class)
+            node._label = label
+            if is_parented:
+                node._parent = None
+            return node
+    else:
+        def make_node(label):
+            return tree_class(label, [])
+
+    top_level = []
+    open_nodes = []
+    after_open_bracket = False
+    for token in tokens:
+        if after_open_bracket:
+            # This token is the label unless it is another bracket
+            # (e.g., for the extra top bracketing "( (S ...))" in PTB trees).
+            open_nodes.append(make_node('' if token in '()' else token))
+            after_open_bracket = (token == '(')
+            if token != ')':
+                continue
+        elif token == '(':
+            after_open_bracket = True
+            continue
+        elif token != ')':
+            if not open_nodes:
+                raise ValueError('Leaf outside of brackets in tree string: {}'
+                                 .format(tree_str))
+            list.append(open_nodes[-1], token)
+            continue
+
+        # Close the innermost open node.
+        if not open_nodes:
+            raise ValueError('Unmatched close bracket in tree string: {}'
+                             .format(tree_str))
+        node = open_nodes.pop()
+        if open_nodes:
+            parent = open_nodes[-1]
+            list.append(parent, node)
+            if is_parented:
+                node._parent = parent
+        else:
+            top_level.append(node)
+
+    if open_nodes or after_open_bracket:
+        raise ValueError('Unmatched open bracket in tree string: {}'
+                         .format(tree_str))
+    if len(top_level) != 1:
+        raise ValueError('Expected exactly one tree in tree string: {}'
+                         .format(tree_str))
+
+    return top_level[0]
+
+
+# tree classes that tree_from_string can create without calling constructors
+_directly_constructed_tree_classes = {Tree, ParentedTree, HeadedParentedTree}
+
+
 def extract_preterminals(tree):
     return [node for node in tree.subtrees() if node.height() == 2]
 
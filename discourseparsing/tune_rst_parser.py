@@ -7,23 +7,34 @@ set created by `convert_rst_discourse_tb.py`, trains a model, and saves the
 model in a user-specified location.
 '''
 
-from collections import Counter
+from collections import Counter, deque
+import gc
 import logging
+import multiprocessing
 import os
 import json
 from configparser import ConfigParser
 from concurrent.futures import ProcessPoolExecutor
 from functools import partial
+import hashlib
 
 import numpy as np
 from skll.experiments import run_configuration
 from skll.learner import Learner
-from nltk.tree import ParentedTree
 
 from discourseparsing.discourse_parsing import Parser
 from discourseparsing.extract_actions_from_trees import extract_parse_actions
+from discourseparsing.feature_cache import (FeatureCacheWriter,
+                                            feature_cache_path,
+                                            feature_extractor_version,
+                                            iter_cached_examples)
 from discourseparsing.collapse_rst_labels import collapse_rst_labels
-from discourseparsing.rst_eval import predict_and_evaluate_rst_trees
+from discourseparsing.rst_eval import (evaluate_with_saved_predictions,
+                                       hash_path,
+                                       load_gold_eval_data,
+                                       predict_and_evaluate_rst_trees,
+                                       read_eval_set)
+from discourseparsing.tree_util import tree_from_string
 
 
 def train_rst_parsing_model(working_path, model_path, parameter_settings):
@@ -103,7 +114,113 @@ def minimize_model(model_path, model_name):
     model.save(os.path.join(model_path, model_name))
 
 
-def train_and_eval_model(working_path, model_path, eval_data, C):
+def extract_document_examples(doc_dict, parser):
+    '''
+    Returns the training examples for a document, from replaying the gold
+    standard parse actions for its RST tree through the parser.  The
+    examples' IDs are the document's path_basename and a counter.
+    '''
+    path_basename = doc_dict['path_basename']
+    logging.info('Extracting examples for {}'.format(path_basename))
+    tree = tree_from_string(doc_dict['rst_tree'])
+    collapse_rst_labels(tree)
+    actions = extract_parse_actions(tree)
+
+    res = []
+    for i, (action_str, feats) in \
+            enumerate(parser.parse(doc_dict, gold_actions=actions)):
+        example_id = "{}_{}".format(path_basename, i)
+        example = {"x": Counter(feats), "y": action_str, "id": example_id}
+        res.append(example)
+        # print("{} {}".format(action_str, " ".join(feats)))
+    return res
+
+
+# The training data and parser for the worker processes in
+# iter_training_examples, which are set when each process starts (see
+# _initialize_extraction_worker).  With the fork start method, the data is
+# inherited rather than pickled.
+_train_data = None
+_extraction_parser = None
+
+
+def _initialize_extraction_worker(train_data):
+    global _train_data, _extraction_parser
+    _train_data = train_data
+    _extraction_parser = Parser(1, 1, 1)
+
+
+def _extract_document_examples_in_worker(doc_index):
+    return extract_document_examples(_train_data[doc_index],
+                                     _extraction_parser)
+
+
+def iter_training_examples(train_data, max_workers=1, max_in_flight=None):
+    '''
+    Yields the training examples for all of the documents in `train_data`, in
+    order, extracting them with `max_workers` processes if it's greater than
+    1 and the platform can fork processes.  At most `max_in_flight`
+    documents (by default, twice the number of workers) are submitted to
+    the workers but not yet consumed, so that if one document takes a long
+    time, the examples for the documents after it don't pile up in memory.
+    '''
+    if max_workers > 1 and len(train_data) > 1 \
+            and 'fork' in multiprocessing.get_all_start_methods():
+        max_workers = min(max_workers, len(train_data))
+        if max_in_flight is None:
+            max_in_flight = 2 * max_workers
+        with ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_initialize_extraction_worker,
+                initargs=(train_data,),
+                mp_context=multiprocessing.get_context('fork')) as executor:
+            doc_indices = iter(range(len(train_data)))
+            futures = deque()
+            while True:
+                while len(futures) < max_in_flight:
+                    doc_index = next(doc_indices, None)
+                    if doc_index is None:
+                        break
+                    futures.append(executor.submit(
+                        _extract_document_examples_in_worker, doc_index))
+                if not futures:
+                    break
+                # Wait for the documents in order, whatever order they are
+                # finished in.
+                yield from futures.popleft().result()
+    else:
+        parser = Parser(1, 1, 1)
+        for doc_dict in train_data:
+            yield from extract_document_examples(doc_dict, parser)
+
+
+def write_training_examples(train_path, examples, cache_writer=None):
+    '''
+    Writes training examples to a SKLL jsonlines file as they come, and adds
+    them to a FeatureCacheWriter if one is given.
+    '''
+    with open(train_path, 'w') as train_file:
+        for example in examples:
+            train_file.write('{}\n'.format(json.dumps(example)))
+            if cache_writer is not None:
+                cache_writer.add(example)
+
+
+def train_and_eval_model(working_path, model_path, eval_data, C,
+                         eval_workers=1, predictions_dir=None,
+                         train_data_hash=None, eval_data_hash=None,
+                         gold=None):
+    '''
+    Trains a model with the given C value and evaluates it.  If
+    `predictions_dir` is given, the predictions are saved there, in a file
+    named by a hash of the training data (`train_data_hash`), the feature
+    extraction and training code, and C, along with the hash of the
+    evaluation data, so that training with the same settings on the same
+    data again reuses them.  The model file itself isn't part of the key,
+    since it's rewritten by every run.  `gold` is the
+    preprocessed gold standard data (see rst_eval.GoldEvalData), which is
+    computed from `eval_data` if it's not given.
+    '''
     parameter_settings = {'C': C}
     logging.info('Training model with C = {}'.format(C))
     model_path = '{}.C{}'.format(model_path, C)
@@ -111,13 +228,40 @@ def train_and_eval_model(working_path, model_path, eval_data, C):
     logging.info('Evaluating model with C = {}'.format(C))
     train_rst_parsing_model(working_path, model_path, parameter_settings)
     rst_parser = Parser(1, 1, 1)
-    rst_parser.load_model(model_path)
+    # The model isn't needed if there are saved predictions from it.
+    rst_parser.load_model(model_path, lazy=True)
+    if predictions_dir is not None:
+        model_key = hashlib.sha1('{} {} {} {}'.format(
+            train_data_hash, feature_extractor_version(), hash_path(__file__),
+            C).encode('utf-8')).hexdigest()
+        predictions_path = os.path.join(
+            predictions_dir, '{}_{}.jsonl.gz'.format(model_key,
+                                                     eval_data_hash))
+        return evaluate_with_saved_predictions(rst_parser, eval_data,
+                                               predictions_path,
+                                               max_workers=eval_workers,
+                                               gold=gold)
     results = predict_and_evaluate_rst_trees(None, None,
                                              rst_parser, eval_data,
-                                             use_gold_syntax=True)
+                                             use_gold_syntax=True,
+                                             max_workers=eval_workers,
+                                             gold=gold)
     return results
 
 
+# The evaluation data and its preprocessed gold standard data for the worker
+# processes in main.  They are set before the workers are forked, so they
+# share them instead of each getting a pickled copy with every task.
+_eval_data = None
+_gold_eval_data = None
+
+
+def _train_and_eval_model_in_worker(working_path, model_path, eval_kwargs,
+                                    C):
+    return train_and_eval_model(working_path, model_path, _eval_data, C,
+                                gold=_gold_eval_data, **eval_kwargs)
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(
@@ -127,8 +271,7 @@ def main():
                         type=argparse.FileType('r'))
     parser.add_argument('eval_file',
                         help='Path to JSON dev or test file for ' +
-                        'tuning/evaluation.',
-                        type=argparse.FileType('r'))
+                        'tuning/evaluation.')
     parser.add_argument('model_path',
                         help='Prefix for the path to where the model should be'
                         ' stored.  A suffix with the C value will be added.')
@@ -148,6 +291,27 @@ def main():
     parser.add_argument('-s', '--single_process', action='store_true',
                         help='Run in a single process for all hyperparameter' +
                         ' grid points, to simplify debugging.')
+    parser.add_argument('-e', '--eval_workers', type=int, default=1,
+                        help='number of processes for parsing the ' +
+                        'evaluation documents with each model (e.g., to ' +
+                        'speed up evaluation with --single_process)')
+    parser.add_argument('-p', '--predictions_dir', default=None,
+                        help='directory for saving the predictions of each ' +
+                        'model on the evaluation set, which are reused if ' +
+                        'a model is trained with the same C value, ' +
+                        'training data, and code (e.g., in an earlier run) ' +
+                        'and evaluated again')
+    parser.add_argument('--gold_cache_dir', default=None,
+                        help='directory for caching the preprocessed gold ' +
+                        'standard trees and spans of the evaluation set ' +
+                        '(see rst_eval)')
+    parser.add_argument('-x', '--extract_workers', type=int, default=1,
+                        help='number of processes for extracting the ' +
+                        'training examples')
+    parser.add_argument('--feature_cache_dir', default=None,
+                        help='directory for caching the featurized training ' +
+                        'examples, which are reused if the training data ' +
+                        'and the feature extraction code are unchanged')
     args = parser.parse_args()
 
     if os.path.exists(args.working_path):
@@ -156,8 +320,6 @@ def main():
                       "being used.".format(args.working_path))
     os.makedirs(args.working_path)
 
-    parser = Parser(1, 1, 1)
-
     # Convert verbose flag to actually logging level
     log_levels = [logging.WARNING, logging.INFO, logging.DEBUG]
     log_level = log_levels[min(args.verbose, 2)]
@@ -167,25 +329,34 @@ def main():
                                 '%(message)s'), level=log_level)
     logger = logging.getLogger(__name__)
 
-    logger.info('Extracting examples')
-    train_data = json.load(args.train_file)
-    eval_data = json.load(args.eval_file)
-
-    train_examples = []
-
-    for doc_dict in train_data:
-        path_basename = doc_dict['path_basename']
-        logging.info('Extracting examples for {}'.format(path_basename))
-        tree = ParentedTree.fromstring(doc_dict['rst_tree'])
-        collapse_rst_labels(tree)
-        actions = extract_parse_actions(tree)
+    eval_data, eval_data_hash = read_eval_set(args.eval_file)
+    # Preprocess the gold standard data once for all of the models.
+    gold = load_gold_eval_data(eval_data, eval_data_hash,
+                               cache_dir=args.gold_cache_dir)
 
-        for i, (action_str, feats) in \
-                enumerate(parser.parse(doc_dict, gold_actions=actions)):
-            example_id = "{}_{}".format(path_basename, i)
-            example = {"x": Counter(feats), "y": action_str, "id": example_id}
-            train_examples.append(example)
-            # print("{} {}".format(action_str, " ".join(feats)))
+    # Make the SKLL jsonlines feature file, from the cached examples if
+    # there are any for this training data.
+    cache_path = feature_cache_path(args.feature_cache_dir,
+                                    args.train_file.name) \
+        if args.feature_cache_dir is not None else None
+    train_path = os.path.join(args.working_path, 'rst_parsing.jsonlines')
+    if cache_path is not None and os.path.exists(cache_path):
+        logger.info('Loading cached examples from {}'.format(cache_path))
+        write_training_examples(train_path, iter_cached_examples(cache_path))
+    else:
+        logger.info('Extracting examples')
+        train_data = json.load(args.train_file)
+        cache_writer = FeatureCacheWriter(cache_path) \
+            if cache_path is not None else None
+        write_training_examples(
+            train_path,
+            iter_training_examples(train_data,
+                                   max_workers=args.extract_workers),
+            cache_writer=cache_writer)
+        if cache_writer is not None:
+            logger.info('Caching examples in {}'.format(cache_path))
+            cache_writer.close()
+        del train_data
 
     # train and evaluate a model for each value of C
     best_labeled_f1 = -1.0
@@ -193,19 +364,36 @@ def main():
 
     # train and evaluate models with different C values in parallel
     C_values = [float(x) for x in args.C_values.split(',')]
+    eval_kwargs = {"eval_workers": args.eval_workers}
+    if args.predictions_dir is not None:
+        if not os.path.exists(args.predictions_dir):
+            os.makedirs(args.predictions_dir)
+        eval_kwargs["predictions_dir"] = args.predictions_dir
+        eval_kwargs["train_data_hash"] = hash_path(args.train_file.name)
+        eval_kwargs["eval_data_hash"] = eval_data_hash
     partial_train_and_eval_model = partial(train_and_eval_model,
                                            args.working_path, args.model_path,
-                                           eval_data)
-
-    # Make the SKLL jsonlines feature file
-    train_path = os.path.join(args.working_path, 'rst_parsing.jsonlines')
-    with open(train_path, 'w') as train_file:
-        for example in train_examples:
-            train_file.write('{}\n'.format(json.dumps(example)))
+                                           eval_data, gold=gold,
+                                           **eval_kwargs)
 
     if args.single_process:
         all_results = [partial_train_and_eval_model(C_value)
                        for C_value in C_values]
+    elif 'fork' in multiprocessing.get_all_start_methods():
+        global _eval_data, _gold_eval_data
+        _eval_data = eval_data
+        _gold_eval_data = gold
+        # Keep the garbage collector in the workers from writing to (and
+        # thus copying) the pages holding the shared data.
+        gc.freeze()
+        with ProcessPoolExecutor(
+                max_workers=len(C_values),
+                mp_context=multiprocessing.get_context('fork')) as executor:
+            all_results = list(executor.map(
+                partial(_train_and_eval_model_in_worker, args.working_path,
+                        args.model_path, eval_kwargs),
+                C_values))
+        gc.unfreeze()
     else:
         n_workers = len(C_values)
         with ProcessPoolExecutor(max_workers=n_workers) as executor:
@@ -33,5 +33,6 @@ setup(name='discourseparsing',
                                         'convert_rst_discourse_tb = discourseparsing.convert_rst_discourse_tb:main',
                                         'rst_eval = discourseparsing.rst_eval:main',
                                         'extract_segmentation_features = discourseparsing.extract_segmentation_features:main',
-                                        'rst_parse_batch = discourseparsing.rst_parse_batch:main']},
+                                        'rst_parse_batch = discourseparsing.rst_parse_batch:main',
+                                        'rst_parse_server = discourseparsing.rst_parse_server:main']},
       install_requires=requirements())
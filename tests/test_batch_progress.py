@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+import logging
+
+from discourseparsing.batch_progress import (BatchProgress, LatencyStats,
+                                             length_bucket, logger)
+
+
+def test_length_bucket():
+    assert length_bucket(0) == '0-99'
+    assert length_bucket(99) == '0-99'
+    assert length_bucket(100) == '100-249'
+    assert length_bucket(4999) == '2500-4999'
+    assert length_bucket(10 ** 6) == '5000+'
+
+
+def test_batch_progress_summary():
+    progress = BatchProgress(total_docs=6, total_chars=600,
+                             report_interval=None)
+    for i in range(5):
+        progress.add({"worker": i % 2, "seconds": 0.1 * (i + 1),
+                      "sentences": 2, "edus": 3, "tokens": 50, "chars": 100})
+    progress.add({"worker": 1, "seconds": 2.0, "sentences": 20, "edus": 30,
+                  "tokens": 300, "chars": 100})
+    # Reporting shouldn't fail, though there is nothing to check here.
+    progress.report()
+
+    summary = progress.summary()
+    assert summary['totals'] == {"docs": 6, "sentences": 30, "edus": 45,
+                                 "tokens": 550, "chars": 600}
+    assert {worker_id: x['docs']
+            for worker_id, x in summary['workers'].items()} \
+        == {"0": 3, "1": 3}
+    latencies = summary['latency_by_length']
+    assert sorted(latencies) == ['0-99', '250-499']
+    assert latencies['0-99']['docs'] == 5
+    assert abs(latencies['0-99']['p50'] - 0.3) < 1e-9
+    assert abs(latencies['0-99']['max'] - 0.5) < 1e-9
+    assert latencies['250-499'] == {"docs": 1, "mean": 2.0, "max": 2.0,
+                                    "p50": 2.0, "p90": 2.0, "p99": 2.0}
+
+
+def test_batch_progress_stuck_workers():
+    progress = BatchProgress(total_docs=4, report_interval=None,
+                             stuck_seconds=10.0)
+    progress.start(1, seconds_ago=5.0)
+    progress.add({"worker": 1, "seconds": 5.0, "tokens": 10})
+    progress.start(1, seconds_ago=1.0)
+    # This worker has been stuck on its first document.
+    progress.start(2, seconds_ago=20.0)
+
+    messages = []
+    handler = logging.Handler()
+    handler.emit = lambda record: messages.append(
+        (record.levelno, record.getMessage()))
+    logger.addHandler(handler)
+    try:
+        progress.report()
+    finally:
+        logger.removeHandler(handler)
+    warnings = [message for level, message in messages
+                if level == logging.WARNING]
+    # Worker 1 started its second document recently.
+    assert len(warnings) == 1
+    assert warnings[0].startswith('worker 2 ')
+
+
+def test_latency_stats():
+    latency_stats = LatencyStats(sample_size=100)
+    for i in range(10000):
+        latency_stats.add(i % 1000 / 1000.0)
+    assert latency_stats.count == 10000
+    assert len(latency_stats.sample) == 100
+    assert abs(latency_stats.total / latency_stats.count - 0.4995) < 1e-9
+    assert latency_stats.max == 0.999
+    # The sample is uniform, so the median should be close to 0.5.
+    assert 0.3 < latency_stats.percentile(50) < 0.7
+
+
+if __name__ == '__main__':
+    test_length_bucket()
+    test_batch_progress_summary()
+    test_batch_progress_stuck_workers()
+    test_latency_stats()
+    print("If no assertions failed, then this passed.")
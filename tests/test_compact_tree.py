@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+import itertools
+import pickle
+
+from discourseparsing.compact_tree import CompactTree
+from discourseparsing.discourse_parsing import Parser
+from discourseparsing.discourse_segmentation import _child_containing
+from discourseparsing.extract_actions_from_trees import extract_parse_actions
+from discourseparsing.tree_util import (HeadedParentedTree, tree_from_string,
+                                        find_first_common_ancestor,
+                                        extract_preterminals,
+                                        extract_converted_terminals)
+
+from test_tree_util import TEST_TREES
+
+
+def test_compact_tree_matches_headed_parented_tree():
+    '''
+    Checks that CompactTree nodes behave like HeadedParentedTree nodes for
+    the operations used by the segmenter and parser.
+    '''
+    for tree_str in TEST_TREES:
+        tree = tree_from_string(tree_str, HeadedParentedTree)
+        compact_tree = CompactTree.fromstring(tree_str)
+        assert str(compact_tree) == tree_str
+        assert str(CompactTree.convert(tree)) == tree_str
+        assert str(pickle.loads(pickle.dumps(compact_tree))) == tree_str
+        assert compact_tree.leaves() == tree.leaves()
+
+        nodes = list(tree.subtrees())
+        compact_nodes = list(compact_tree.subtrees())
+        assert len(nodes) == len(compact_nodes)
+        for node, compact_node in zip(nodes, compact_nodes):
+            treeposition = node.treeposition()
+            assert compact_node.treeposition() == treeposition
+            assert compact_tree[treeposition] == compact_node
+            assert compact_node.label() == node.label()
+            assert compact_node.leaves() == node.leaves()
+            assert len(compact_node) == len(node)
+            assert compact_node.head_word() == node.head_word()
+            assert compact_node.head_pos() == node.head_pos()
+            assert compact_node.find_maximal_head_node().treeposition() \
+                == node.find_maximal_head_node().treeposition()
+            assert compact_node.maximal_head_depth() \
+                == node.maximal_head_depth()
+            assert (compact_node.right_sibling() is None) \
+                == (node.right_sibling() is None)
+
+        for (node1, compact_node1), (node2, compact_node2) \
+                in itertools.product(zip(nodes, compact_nodes), repeat=2):
+            assert compact_node1.dominates(compact_node2) \
+                == Parser.syntactically_dominates(node1, node2) \
+                == Parser.syntactically_dominates(compact_node1,
+                                                  compact_node2)
+
+        preterminals = tree.preterminals()
+        compact_preterminals = compact_tree.preterminals()
+        assert [x.treeposition() for x in compact_preterminals] \
+            == [x.treeposition() for x in preterminals]
+        for (node1, compact_node1), (node2, compact_node2) \
+                in itertools.permutations(zip(preterminals,
+                                              compact_preterminals), 2):
+            ancestor = find_first_common_ancestor(node1, node2)
+            compact_ancestor = compact_node1.first_common_ancestor(
+                compact_node2)
+            assert compact_ancestor.treeposition() == ancestor.treeposition()
+            assert find_first_common_ancestor(compact_node1, compact_node2) \
+                == compact_ancestor
+            depth = len(ancestor.treeposition())
+            assert _child_containing(compact_ancestor, compact_node1) \
+                == compact_ancestor[node1.treeposition()[depth]]
+
+
+def test_parser_features_with_compact_trees():
+    '''
+    Checks that the parser extracts the same features from compact trees as
+    from HeadedParentedTrees.
+    '''
+    tree_str = TEST_TREES[1]
+    tree = tree_from_string(tree_str, HeadedParentedTree)
+    rst_tree_str = ('(ROOT (satellite:attribution (text 0)) '
+                    '(nucleus:span (text 1)))')
+    doc_dict = {"doc_id": "test",
+                "syntax_trees": [tree_str],
+                "tokens": [extract_converted_terminals(tree)],
+                "pos_tags": [[x.label() for x in extract_preterminals(tree)]],
+                "edu_start_indices": [(0, 0, 0), (0, 5, 1)],
+                "edu_starts_paragraph": [True, False]}
+
+    feats_lists = []
+    for syntax_trees_objs in [[tree], [CompactTree.fromstring(tree_str)]]:
+        doc_dict['syntax_trees_objs'] = syntax_trees_objs
+        actions = extract_parse_actions(tree_from_string(rst_tree_str))
+        parser = Parser(max_acts=1, max_states=1, n_best=1)
+        feats_lists.append([feats for _, feats
+                            in parser.parse(doc_dict, gold_actions=actions)])
+
+    assert feats_lists[0]
+    assert feats_lists[0] == feats_lists[1]
+
+
+if __name__ == '__main__':
+    test_compact_tree_matches_headed_parented_tree()
+    test_parser_features_with_compact_trees()
+    print("If no assertions failed, then this passed.")
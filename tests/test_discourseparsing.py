@@ -2,11 +2,13 @@
 
 import json
 import logging
+import os
+import tempfile
 
 from nltk.tree import ParentedTree
 
 from discourseparsing.extract_actions_from_trees import extract_parse_actions
-from discourseparsing.discourse_parsing import Parser
+from discourseparsing.discourse_parsing import Parser, ShiftReduceAction
 
 
 def test_extract_parse_actions():
@@ -51,9 +53,129 @@ def test_reconstruct_training_examples():
         assert tree2 == tree_orig
 
 
+class FixedScoreParser(Parser):
+    '''
+    A parser that gives each action the same score in every state, so that
+    the search can be tested without a model.
+    '''
+
+    def _get_model_actions(self):
+        return [ShiftReduceAction('S', 'text'),
+                ShiftReduceAction('U', 'nucleus:span'),
+                ShiftReduceAction('B', 'nucleus:span'),
+                ShiftReduceAction('B', 'ROOT'),
+                ShiftReduceAction('U', 'satellite:elaboration')]
+
+    def _score_actions(self, feats):
+        return [-1.0, -1.5, -1.2, -1.0, -2.0]
+
+
+def _make_doc_dict(n_edus):
+    return {"doc_id": "test",
+            "syntax_trees": ['(ROOT (S (NN w{}) (VBD ran)))'.format(i)
+                             for i in range(n_edus)],
+            "tokens": [['w{}'.format(i), 'ran'] for i in range(n_edus)],
+            "pos_tags": [['NN', 'VBD']] * n_edus,
+            "edu_start_indices": [(i, 0, i) for i in range(n_edus)],
+            "edu_starts_paragraph": [True] + [False] * (n_edus - 1)}
+
+
+def test_parse_budgets():
+    flat_tree = '(ROOT (text 0) (text 1) (text 2) (text 3) (text 4) (text 5))'
+
+    trees = list(FixedScoreParser(3, 50, 2).parse(_make_doc_dict(6)))
+    assert len(trees) == 2
+    assert all('degraded' not in t for t in trees)
+
+    # A beam search that runs out of budget is finished greedily.
+    trees = list(FixedScoreParser(3, 50, 2, max_expanded_states=200)
+                 .parse(_make_doc_dict(6)))
+    assert len(trees) == 1
+    assert trees[0]['degraded'] == {"reason": "max_expanded_states",
+                                    "fallback": "greedy"}
+    assert trees[0]['tree'].leaves() == [str(i) for i in range(6)]
+    assert trees[0]['tree'].pformat(margin=1000) != flat_tree
+
+    # A greedy search that runs out of budget returns a flat tree.
+    trees = list(FixedScoreParser(1, 1, 1, max_seconds=0)
+                 .parse(_make_doc_dict(6)))
+    assert trees[0]['degraded'] == {"reason": "max_seconds",
+                                    "fallback": "flat_tree"}
+    assert trees[0]['tree'].pformat(margin=1000) == flat_tree
+
+
+def test_parallel_eval():
+    '''
+    Checks that evaluating with several worker processes gives the same
+    results as evaluating serially.
+    '''
+    from discourseparsing.rst_eval import (evaluate_with_saved_predictions,
+                                           predict_and_evaluate_rst_trees)
+
+    eval_data = []
+    for n_edus in range(2, 8):
+        doc_dict = _make_doc_dict(n_edus)
+        doc_dict['path_basename'] = 'test{}'.format(n_edus)
+        doc_dict['rst_tree'] = '(ROOT (satellite:elaboration (text 0)) ' \
+            '(nucleus:span {}))'.format(' '.join(
+                '(text {})'.format(i) for i in range(1, n_edus)))
+        eval_data.append(doc_dict)
+
+    serial_results = predict_and_evaluate_rst_trees(
+        None, None, FixedScoreParser(1, 1, 1), eval_data)
+    parallel_results = predict_and_evaluate_rst_trees(
+        None, None, FixedScoreParser(1, 1, 1), eval_data, max_workers=3)
+    assert parallel_results == serial_results
+    assert 'labeled_precision' in serial_results
+
+    # Predictions saved by one evaluation are reused by the next, so no
+    # parser is needed then.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        predictions_path = os.path.join(tmp_dir, 'predictions.jsonl.gz')
+        assert evaluate_with_saved_predictions(
+            FixedScoreParser(1, 1, 1), eval_data, predictions_path) \
+            == serial_results
+        assert os.path.exists(predictions_path)
+        assert evaluate_with_saved_predictions(
+            None, eval_data, predictions_path) == serial_results
+
+
+def test_parallel_example_extraction():
+    '''
+    Checks that extracting training examples with several worker processes
+    gives the same examples, in the same order, as extracting them serially.
+    '''
+    from discourseparsing.tune_rst_parser import iter_training_examples
+
+    train_data = []
+    for n_edus in range(2, 8):
+        doc_dict = _make_doc_dict(n_edus)
+        doc_dict['path_basename'] = 'train{}'.format(n_edus)
+        rst_tree = '(text {})'.format(n_edus - 1)
+        for i in reversed(range(n_edus - 1)):
+            rst_tree = '(nucleus:span (text {})) ' \
+                '(satellite:elaboration-additional {})'.format(i, rst_tree)
+        doc_dict['rst_tree'] = '(ROOT {})'.format(rst_tree)
+        train_data.append(doc_dict)
+
+    serial_examples = list(iter_training_examples(train_data))
+    parallel_examples = list(iter_training_examples(train_data,
+                                                    max_workers=3))
+    assert parallel_examples == serial_examples
+    # With a window smaller than the number of workers.
+    assert list(iter_training_examples(train_data, max_workers=3,
+                                       max_in_flight=1)) == serial_examples
+    assert serial_examples[0]["id"] == 'train2_0'
+    assert serial_examples[-1]["id"].startswith('train7_')
+    assert len(set(x["id"] for x in serial_examples)) == len(serial_examples)
+
+
 if __name__ == '__main__':
     logging.basicConfig(format=('%(asctime)s - %(name)s - %(levelname)s - ' +
                                 '%(message)s'), level=logging.INFO)
     test_extract_parse_actions()
     test_reconstruct_training_examples()
+    test_parse_budgets()
+    test_parallel_eval()
+    test_parallel_example_extraction()
     print("If no assertions failed, then this passed.")
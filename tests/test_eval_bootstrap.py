@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from discourseparsing.eval_bootstrap import (bootstrap_results,
+                                             bootstrap_sample_weights,
+                                             compute_bootstrap_cis,
+                                             compute_paired_bootstrap)
+from discourseparsing import rst_eval
+from discourseparsing.rst_eval import (compute_rst_eval_counts,
+                                       compute_rst_eval_results,
+                                       hash_path,
+                                       load_gold_eval_data,
+                                       load_predictions,
+                                       predictions_for_eval,
+                                       read_eval_set,
+                                       save_predictions)
+from discourseparsing.tree_util import tree_from_string
+
+
+def _make_eval_data():
+    '''
+    Returns the EDU tokens and trees for a few predicted and gold documents
+    with partially matching trees.
+    '''
+    gold_trees = [
+        '(ROOT (nucleus:span (text 0)) (satellite:elaboration (text 1)))',
+        '(ROOT (nucleus:span (text 0)) (satellite:attribution (text 1)) '
+        '(satellite:elaboration (text 2)))',
+        '(ROOT (nucleus:span (nucleus:span (text 0)) (satellite:condition '
+        '(text 1))) (satellite:elaboration (text 2) (text 3)))',
+        '(ROOT (nucleus:contrast (text 0)) (nucleus:contrast (text 1)))']
+    pred_trees = [
+        '(ROOT (nucleus:span (text 0)) (satellite:elaboration (text 1)))',
+        '(ROOT (nucleus:span (text 0)) (satellite:elaboration (text 1)) '
+        '(satellite:elaboration (text 2)))',
+        '(ROOT (nucleus:span (text 0)) (satellite:elaboration (text 1) '
+        '(text 2) (text 3)))',
+        '(ROOT (satellite:attribution (text 0)) (nucleus:span (text 1)))']
+    edu_tokens = [[['a', 'b'], ['c']],
+                  [['a'], ['b', 'c'], ['d']],
+                  [['a'], ['b'], ['c', 'd'], ['e']],
+                  [['a', 'b', 'c'], ['d']]]
+    return (edu_tokens, [tree_from_string(x) for x in pred_trees],
+            edu_tokens, [tree_from_string(x) for x in gold_trees])
+
+
+def _make_eval_json(edu_tokens_lists, trees):
+    '''
+    Returns an evaluation set in the format of convert_rst_discourse_tb, with
+    one sentence per EDU.
+    '''
+    return [{"path_basename": 'doc{}'.format(i),
+             "tokens": edu_tokens,
+             "edu_start_indices": [[j, 0, j] for j in range(len(edu_tokens))],
+             "rst_tree": tree.pformat(margin=1000)}
+            for i, (edu_tokens, tree) in enumerate(zip(edu_tokens_lists,
+                                                       trees))]
+
+
+def test_eval_counts():
+    '''
+    Checks that the evaluation results computed from the per-document counts
+    are the same as when they're computed from the trees, for the whole set
+    and for bootstrap samples.
+    '''
+    eval_data = _make_eval_data()
+    counts = compute_rst_eval_counts(*eval_data)
+    assert counts.shape == (4, 3, 3)
+    assert counts[0].tolist() == \
+        [[2, 2, 2], [2, 2, 2], [2, 2, 2]]
+
+    weights = bootstrap_sample_weights(len(counts), 20, random_state=1)
+    results = bootstrap_results(counts, weights)
+    for i, sample_weights in enumerate(weights):
+        indices = np.repeat(np.arange(len(counts)), sample_weights)
+        if not np.any(np.isin(indices, [0, 1, 2])):
+            # There would be no matching spans.
+            continue
+        expected = compute_rst_eval_results(*[[x[j] for j in indices]
+                                              for x in eval_data])
+        for metric_name, value in expected.items():
+            assert np.isclose(results[metric_name][i], value)
+
+
+def test_eval_counts_duplicate_spans():
+    '''
+    Checks that spans are counted once per document even if several
+    subtrees cover them (with unary chains), for each level.
+    '''
+    edu_tokens = [[['a', 'b'], ['c'], ['d']]] * 2
+    pred_trees = [tree_from_string(
+        '(ROOT (nucleus:span (nucleus:span (text 0))) '
+        '(satellite:elaboration (satellite:attribution (text 1)) '
+        '(nucleus:span (text 2))))')] * 2
+    gold_trees = [tree_from_string(
+        '(ROOT (nucleus:span (text 0)) '
+        '(satellite:attribution (satellite:attribution (text 1)) '
+        '(nucleus:span (text 2))))')] * 2
+    counts = compute_rst_eval_counts(edu_tokens, pred_trees, edu_tokens,
+                                     gold_trees)
+    # labeled: pred {n:span 0-1, s:elab 2-3, s:attr 2-2, n:span 3-3},
+    # gold {n:span 0-1, s:attr 2-3, s:attr 2-2, n:span 3-3}
+    # nuc: pred and gold {n 0-1, s 2-3, s 2-2, n 3-3}
+    # span: pred and gold {0-1, 2-3, 2-2, 3-3}
+    assert counts.tolist() == [[[3, 4, 4], [4, 4, 4], [4, 4, 4]]] * 2
+
+
+def test_bootstrap_cis():
+    eval_data = _make_eval_data()
+    counts = compute_rst_eval_counts(*eval_data)
+    # Repeat the documents to get a larger evaluation set.
+    counts = np.tile(counts, (25, 1, 1))
+    scores = compute_rst_eval_results(*eval_data)
+    for method in ['bca', 'pi']:
+        cis = compute_bootstrap_cis(counts, n_samples=2000, method=method,
+                                    random_state=1)
+        assert sorted(cis) == sorted(scores)
+        for metric_name, ci in cis.items():
+            assert ci["score"] == scores[metric_name]
+            assert ci["ci_lower"] <= ci["score"] <= ci["ci_upper"]
+            assert ci["ci_lower"] < ci["ci_upper"]
+
+
+def test_paired_bootstrap():
+    '''
+    Compares the predictions from _make_eval_data (system A) with perfect
+    predictions (system B), after saving and loading both.
+    '''
+    pred_edu_tokens, pred_trees, gold_edu_tokens, gold_trees = \
+        _make_eval_data()
+    # Make the evaluation set larger by repeating the documents.
+    n_copies = 25
+    eval_data = _make_eval_json(gold_edu_tokens * n_copies,
+                                gold_trees * n_copies)
+    doc_ids = [doc_dict['path_basename'] for doc_dict in eval_data]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path_a = os.path.join(tmp_dir, 'a.jsonl.gz')
+        path_b = os.path.join(tmp_dir, 'b.jsonl')
+        save_predictions(path_a, doc_ids, pred_edu_tokens * n_copies,
+                         pred_trees * n_copies)
+        save_predictions(path_b, doc_ids, gold_edu_tokens * n_copies,
+                         gold_trees * n_copies)
+        eval_a = predictions_for_eval(load_predictions(path_a), eval_data)
+        eval_b = predictions_for_eval(load_predictions(path_b), eval_data)
+
+    scores_a = compute_rst_eval_results(pred_edu_tokens, pred_trees,
+                                        gold_edu_tokens, gold_trees)
+    assert compute_rst_eval_results(*eval_a) == scores_a
+    counts_a = compute_rst_eval_counts(*eval_a)
+    counts_b = compute_rst_eval_counts(*eval_b)
+
+    results = compute_paired_bootstrap(counts_a, counts_b, n_samples=2000,
+                                       random_state=1)
+    for metric_name, res in results.items():
+        assert res["score_a"] == scores_a[metric_name]
+        assert res["score_b"] == 1.0
+        assert res["ci_lower"] <= res["diff"] <= res["ci_upper"]
+        assert res["ci_lower"] > 0
+        assert res["p_value"] < 0.01
+
+    # A system compared with itself.
+    results = compute_paired_bootstrap(counts_a, counts_a, n_samples=2000,
+                                       random_state=1)
+    for res in results.values():
+        assert res["diff"] == 0
+        assert res["ci_lower"] == res["ci_upper"] == 0
+        assert res["p_value"] == 1.0
+
+
+def test_gold_eval_data_cache():
+    pred_edu_tokens, pred_trees, gold_edu_tokens, gold_trees = \
+        _make_eval_data()
+    scores = compute_rst_eval_results(pred_edu_tokens, pred_trees,
+                                      gold_edu_tokens, gold_trees)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        eval_path = os.path.join(tmp_dir, 'dev.json')
+        cache_dir = os.path.join(tmp_dir, 'cache')
+        with open(eval_path, 'w') as f:
+            json.dump(_make_eval_json(gold_edu_tokens, gold_trees), f)
+        eval_data, eval_data_hash = read_eval_set(eval_path)
+        assert eval_data_hash == hash_path(eval_path)
+
+        # Without the hash, nothing is cached.
+        gold = load_gold_eval_data(eval_data, cache_dir=cache_dir)
+        assert gold.evaluate(pred_edu_tokens, pred_trees) == scores
+        assert not os.path.exists(cache_dir)
+
+        gold = load_gold_eval_data(eval_data, eval_data_hash, cache_dir)
+        assert gold.evaluate(pred_edu_tokens, pred_trees) == scores
+        assert load_gold_eval_data(eval_data, eval_data_hash,
+                                   cache_dir) is gold
+        assert len(os.listdir(cache_dir)) == 1
+
+        # Load the cached file rather than the in-memory copy.
+        rst_eval._gold_eval_data_cache.clear()
+        cached_gold = load_gold_eval_data(eval_data, eval_data_hash,
+                                          cache_dir)
+        assert cached_gold is not gold
+        assert cached_gold.evaluate(pred_edu_tokens, pred_trees) == scores
+        assert cached_gold.compute_counts(pred_edu_tokens, pred_trees) \
+            .tolist() == compute_rst_eval_counts(
+                pred_edu_tokens, pred_trees, gold_edu_tokens,
+                gold_trees).tolist()
+
+
+if __name__ == '__main__':
+    test_eval_counts()
+    test_eval_counts_duplicate_spans()
+    test_bootstrap_cis()
+    test_paired_bootstrap()
+    test_gold_eval_data_cache()
+    print("If no assertions failed, then this passed.")
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+import json
+import os
+import tempfile
+from collections import Counter
+
+from discourseparsing.feature_cache import (FeatureCacheWriter,
+                                            feature_cache_path,
+                                            iter_cached_examples)
+
+
+def test_feature_cache():
+    '''
+    Checks that examples read from the cache are written to a training file
+    exactly as the original examples would be, and that the cache path
+    depends on the training data.
+    '''
+    examples = [{"x": Counter(['b', 'a', 'b', 'c']), "y": 'S:text',
+                 "id": 'doc1_0'},
+                {"x": Counter(['c', 'd']), "y": 'B:nucleus:span',
+                 "id": 'doc1_1'},
+                {"x": Counter(), "y": 'S:text', "id": 'doc2_0'}]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_dir = os.path.join(tmp_dir, 'cache')
+        train_path = os.path.join(tmp_dir, 'train.json')
+        with open(train_path, 'w') as f:
+            json.dump([{"path_basename": 'doc1'}], f)
+        cache_path = feature_cache_path(cache_dir, train_path)
+        assert feature_cache_path(cache_dir, train_path) == cache_path
+
+        writer = FeatureCacheWriter(cache_path)
+        for example in examples:
+            writer.add(example)
+        assert not os.path.exists(cache_path)
+        writer.close()
+        assert os.listdir(cache_dir) == [os.path.basename(cache_path)]
+
+        cached_examples = list(iter_cached_examples(cache_path))
+        assert [json.dumps(x) for x in cached_examples] \
+            == [json.dumps(x) for x in examples]
+
+        with open(train_path, 'w') as f:
+            json.dump([{"path_basename": 'doc2'}], f)
+        assert feature_cache_path(cache_dir, train_path) != cache_path
+
+
+if __name__ == '__main__':
+    test_feature_cache()
+    print("If no assertions failed, then this passed.")
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+
+import json
+import os
+import random
+from tempfile import TemporaryDirectory
+
+from discourseparsing import rst_parse_batch, rst_parse_pipeline
+from discourseparsing.rst_parse_batch import (ShardWriter,
+                                              read_jsonl_documents)
+
+
+def test_shard_writer():
+    '''
+    Checks that lines added out of order are written in input order, with
+    the expected number of lines per shard.
+    '''
+    lines = ['line {}'.format(i) for i in range(10)]
+    positions = list(range(len(lines)))
+    random.Random(0).shuffle(positions)
+    with TemporaryDirectory() as tmpdir:
+        output_prefix = os.path.join(tmpdir, 'out')
+        writer = ShardWriter(output_prefix, 4)
+        for position in positions:
+            writer.add(position, lines[position])
+        writer.close()
+
+        assert sorted(os.listdir(tmpdir)) \
+            == ['out.0', 'out.1', 'out.2', 'out.manifest.json']
+        shards = []
+        for i in range(3):
+            with open('{}.{}'.format(output_prefix, i)) as f:
+                shards.append(f.read().splitlines())
+        assert shards == [lines[:4], lines[4:8], lines[8:]]
+
+        # Without resuming, the output of the earlier run is replaced
+        # entirely, even though it had more shards.
+        with open(output_prefix + '.3.partial', 'w') as f:
+            f.write('12\tline 12\n')
+        writer = ShardWriter(output_prefix, 8)
+        for position in range(len(lines)):
+            writer.add(position, lines[position])
+        writer.close()
+        assert sorted(os.listdir(tmpdir)) \
+            == ['out.0', 'out.1', 'out.manifest.json']
+
+
+def test_shard_writer_resume():
+    '''
+    Checks that a resumed ShardWriter skips the documents written by an
+    interrupted run, including a truncated last line, and still writes
+    complete shards in input order.
+    '''
+    lines = ['line {}'.format(i) for i in range(10)]
+    with TemporaryDirectory() as tmpdir:
+        output_prefix = os.path.join(tmpdir, 'out')
+        writer = ShardWriter(output_prefix, 4)
+        for position in [5, 0, 1, 2, 3, 9]:
+            writer.add(position, lines[position])
+        # Simulate an interrupted run, with part of a line for document 6.
+        with open(output_prefix + '.1.partial', 'a') as f:
+            f.write('6\tline')
+        del writer
+
+        writer = ShardWriter(output_prefix, 2, resume=True)
+        assert writer.shard_size == 4
+        done = [i for i in range(len(lines)) if writer.is_done(i)]
+        assert done == [0, 1, 2, 3, 5, 9]
+        for position in range(len(lines)):
+            if not writer.is_done(position):
+                writer.add(position, lines[position])
+        writer.close()
+
+        assert sorted(os.listdir(tmpdir)) \
+            == ['out.0', 'out.1', 'out.2', 'out.manifest.json']
+        shards = []
+        for i in range(3):
+            with open('{}.{}'.format(output_prefix, i)) as f:
+                shards.append(f.read().splitlines())
+        assert shards == [lines[:4], lines[4:8], lines[8:]]
+
+
+def test_read_jsonl_documents():
+    with TemporaryDirectory() as tmpdir:
+        input_path = os.path.join(tmpdir, 'input.jsonl')
+        with open(input_path, 'w') as f:
+            f.write('{"doc_id": "a", "text": "One."}\n\n')
+            f.write('{"text": "Two.", "doc_id": "b"}\n')
+        docs = read_jsonl_documents(input_path)
+        assert next(docs) == ('a', 'One.')
+        assert list(docs) == [('b', 'Two.')]
+
+
+def _load_test_model(parser):
+    parser._model = ('loaded in process', os.getpid())
+
+
+def _get_worker_model(_):
+    return rst_parse_batch._worker_models[2]._model
+
+
+def test_worker_pool_preload():
+    '''
+    Checks that with preloading, the workers get the models loaded by the
+    parent process, and that otherwise they load their own.
+    '''
+    load_lazy_models = rst_parse_batch._load_lazy_models
+    rst_parse_batch._load_lazy_models = _load_test_model
+    # Use a (nonexistent) ZPar server so that ZPar isn't loaded.
+    model_kwargs = {"zpar_model_directory": None,
+                    "segmentation_model": None, "parsing_model": None,
+                    "zpar_hostname": 'localhost', "zpar_port": 1}
+    try:
+        with rst_parse_batch._worker_pool(2, model_kwargs,
+                                          preload=True) as executor:
+            models = list(executor.map(_get_worker_model, range(4)))
+        assert models == [('loaded in process', os.getpid())] * 4
+        assert rst_parse_batch._preloaded_models is None
+
+        with rst_parse_batch._worker_pool(2, model_kwargs,
+                                          preload=False) as executor:
+            models = list(executor.map(_get_worker_model, range(4)))
+        assert models == [None] * 4
+    finally:
+        rst_parse_batch._load_lazy_models = load_lazy_models
+
+
+def _make_test_stage(stage):
+    '''
+    Returns a factory for a stage that doesn't need any models, for testing
+    the pipeline itself.
+    '''
+    def make_stage(**kwargs):
+        def process_item(item):
+            if item['doc_id'] == 'bad':
+                raise ValueError('bad document')
+            if stage == 'rst':
+                doc_dict = item.pop('doc_dict')
+                item['output'] = json.dumps([doc_dict['doc_id'],
+                                             doc_dict['stages']])
+            else:
+                item['doc_dict'].setdefault('stages', []).append(stage)
+        return process_item
+    return make_stage
+
+
+def test_run_pipeline():
+    stage_factories = rst_parse_pipeline._STAGE_FACTORIES
+    rst_parse_pipeline._STAGE_FACTORIES = \
+        {stage: _make_test_stage(stage) for stage in rst_parse_pipeline.STAGES}
+    model_kwargs = {"segmentation_model": None, "parsing_model": None}
+    try:
+        with TemporaryDirectory() as tmpdir:
+            output_prefix = os.path.join(tmpdir, 'out')
+            docs = [(i, 'doc{}'.format(i), 'text') for i in range(20)]
+            report = rst_parse_pipeline.run_pipeline(
+                reversed(docs), output_prefix, 8, model_kwargs,
+                n_syntax_workers=2, n_segmentation_workers=1,
+                n_rst_workers=3, max_in_flight=5)
+
+            outputs = []
+            for i in range(3):
+                with open('{}.{}'.format(output_prefix, i)) as f:
+                    outputs.extend(json.loads(line) for line in f)
+            assert outputs == [[doc_id, ['syntax', 'segmentation']]
+                               for _, doc_id, _ in docs]
+            assert all(report['stages'][stage]['docs'] == len(docs)
+                       for stage in rst_parse_pipeline.STAGES)
+
+            try:
+                rst_parse_pipeline.run_pipeline(
+                    [(0, 'bad', 'text')], output_prefix, 8, model_kwargs)
+            except RuntimeError:
+                pass
+            else:
+                assert False
+    finally:
+        rst_parse_pipeline._STAGE_FACTORIES = stage_factories
+
+
+if __name__ == '__main__':
+    test_shard_writer()
+    test_shard_writer_resume()
+    test_read_jsonl_documents()
+    test_worker_pool_preload()
+    test_run_pipeline()
+    print("If no assertions failed, then this passed.")
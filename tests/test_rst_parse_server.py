@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+import json
+import threading
+import urllib.error
+import urllib.request
+
+from discourseparsing.rst_parse_server import RSTParsingService, make_server
+from discourseparsing.tree_util import tree_from_string
+
+
+class FakeSyntaxParser(object):
+    '''
+    Parses each sentence (one per line of the text) as a flat tree.
+    '''
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def parse_documents(self, doc_dicts):
+        self.batch_sizes.append(len(doc_dicts))
+        res = []
+        for doc_dict in doc_dicts:
+            if 'bad' in doc_dict['raw_text']:
+                raise ValueError('bad document')
+            trees = [tree_from_string('(ROOT (S {}))'.format(' '.join(
+                '(NN {})'.format(word) for word in line.split())))
+                for line in doc_dict['raw_text'].splitlines()]
+            res.append((trees, [True] + [False] * (len(trees) - 1)))
+        return res
+
+
+class FakeSegmenter(object):
+    '''
+    Makes each sentence an EDU.
+    '''
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def segment_documents(self, doc_dicts):
+        self.batch_sizes.append(len(doc_dicts))
+        for doc_dict in doc_dicts:
+            doc_dict['edu_start_indices'] = \
+                [(i, 0, i) for i in range(len(doc_dict['tokens']))]
+
+
+class FakeTree(object):
+    def __init__(self, n_edus):
+        self.n_edus = n_edus
+
+    def pformat(self, margin):
+        return '(ROOT {})'.format(self.n_edus)
+
+
+class FakeRSTParser(object):
+    def parse(self, doc_dict):
+        return [{"score": 0.0,
+                 "tree": FakeTree(len(doc_dict['edu_start_indices']))}]
+
+
+def _make_service(**kwargs):
+    return RSTParsingService(FakeSyntaxParser(), FakeSegmenter(),
+                             FakeRSTParser(), **kwargs)
+
+
+def _expected_output(text):
+    lines = text.splitlines()
+    return {"edu_tokens": [line.split() for line in lines],
+            "scored_rst_trees": [{"score": 0.0,
+                                  "tree": '(ROOT {})'.format(len(lines))}]}
+
+
+def test_micro_batching():
+    '''
+    Checks that documents submitted together are parsed as a batch, that a
+    bad document doesn't make the others in its batch fail, and that blank
+    documents get empty outputs.
+    '''
+    service = _make_service(batch_window=0.5, max_batch_size=3)
+    try:
+        texts = ['a b\nc', 'd', 'e f g', ' ', 'h\ni\nj']
+        futures = [service.submit({"doc_id": str(i), "raw_text": text})
+                   for i, text in enumerate(texts)]
+        outputs = [future.result() for future in futures]
+        assert outputs[3] == {"edu_tokens": [], "scored_rst_trees": []}
+        assert [output for i, output in enumerate(outputs) if i != 3] \
+            == [_expected_output(text) for i, text in enumerate(texts)
+                if i != 3]
+        assert service.segmenter.batch_sizes == [3, 1]
+        assert service.n_batches == 2
+        assert service.n_documents == 5
+
+        futures = [service.submit({"doc_id": str(i), "raw_text": text})
+                   for i, text in enumerate(['a', 'bad', 'c'])]
+        try:
+            futures[1].result()
+        except ValueError:
+            pass
+        else:
+            assert False
+        assert futures[0].result() == _expected_output('a')
+        assert futures[2].result() == _expected_output('c')
+    finally:
+        service.close()
+
+
+def _post(url, obj):
+    request = urllib.request.Request(url, data=json.dumps(obj).encode())
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read().decode())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read().decode())
+
+
+def test_server():
+    service = _make_service(batch_window=0.2)
+    server = make_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = 'http://{}:{}'.format(*server.server_address[:2])
+    try:
+        # Concurrent requests.
+        results = [None] * 4
+        texts = ['a b', 'c\nd', 'e', 'f g h']
+
+        def send(i):
+            results[i] = _post(url + '/parse', {"text": texts[i]})
+
+        threads = [threading.Thread(target=send, args=(i,))
+                   for i in range(len(texts))]
+        for client_thread in threads:
+            client_thread.start()
+        for client_thread in threads:
+            client_thread.join()
+        assert results == [(200, _expected_output(text)) for text in texts]
+        assert service.n_batches < len(texts)
+
+        assert _post(url + '/parse', {"no_text": ""})[0] == 400
+        for text in [None, 1, ["a b"], {"text": "a b"}]:
+            status, output = _post(url + '/parse', {"text": text})
+            assert status == 400
+            assert output["error"] \
+                == 'invalid request: "text" must be a string'
+        assert _post(url + '/parse', {"text": "bad"})[0] == 500
+        with urllib.request.urlopen(url + '/stats') as response:
+            stats = json.loads(response.read().decode())
+        assert stats['documents'] == len(texts) + 1
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    test_micro_batching()
+    test_server()
+    print("If no assertions failed, then this passed.")
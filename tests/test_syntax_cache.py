@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+import os
+from multiprocessing import Pool
+from tempfile import TemporaryDirectory
+
+from discourseparsing.syntax_cache import SyntaxParseCache
+
+
+def _fake_parse(sentence):
+    return '(ROOT (S {}))'.format(' '.join('(X {})'.format(x)
+                                           for x in sentence.split()))
+
+
+def test_syntax_cache():
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'cache.db')
+        cache = SyntaxParseCache(path, 'model1')
+        sentences = ['The dog ran .', 'It stopped .', 'The dog ran .']
+        assert cache.get_many(sentences) == [None, None, None]
+
+        cache.put_many(sentences[:2], [_fake_parse(sentences[0]), None])
+        # Whitespace differences don't matter, and unparsed sentences aren't
+        # cached.
+        assert cache.get_many(['The  dog ran .\n', 'It stopped .']) \
+            == [_fake_parse(sentences[0]), None]
+
+        # Parses from a different model aren't used.
+        other_model_cache = SyntaxParseCache(path, 'model2')
+        assert other_model_cache.get_many(sentences[:1]) == [None]
+        other_model_cache.close()
+
+        # The cache persists.
+        cache.close()
+        cache = SyntaxParseCache(path, 'model1')
+        assert cache.get_many(sentences[:1]) == [_fake_parse(sentences[0])]
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses']) == (1, 0)
+        assert (stats['total_hits'], stats['total_misses']) == (2, 5)
+        assert stats['entries'] == 1
+
+
+def test_syntax_cache_lru_eviction():
+    with TemporaryDirectory() as tmpdir:
+        cache = SyntaxParseCache(os.path.join(tmpdir, 'cache.db'), 'model',
+                                 max_entries=3)
+        sentences = ['sentence {} .'.format(i) for i in range(4)]
+        for sentence in sentences[:3]:
+            cache.put_many([sentence], [_fake_parse(sentence)])
+        # Using the first sentence makes the second the least recently used.
+        assert cache.get_many(sentences[:1]) == [_fake_parse(sentences[0])]
+        cache.put_many(sentences[3:], [_fake_parse(sentences[3])])
+        assert cache.get_many(sentences) \
+            == [_fake_parse(sentences[0]), None, _fake_parse(sentences[2]),
+                _fake_parse(sentences[3])]
+        assert cache.stats()['entries'] == 3
+
+        # Replacing a parse doesn't change the number of entries.
+        cache.put_many(sentences[3:] * 2, [_fake_parse(sentences[3])] * 2)
+        assert cache.stats()['entries'] == 3
+        assert cache.get_many(sentences[:1]) == [_fake_parse(sentences[0])]
+
+
+def _use_cache(cache, sentences):
+    res = cache.get_many(sentences)
+    cache.put_many(sentences, [_fake_parse(x) for x in sentences])
+    return res
+
+
+def test_syntax_cache_shared_by_processes():
+    with TemporaryDirectory() as tmpdir:
+        cache = SyntaxParseCache(os.path.join(tmpdir, 'cache.db'), 'model')
+        sentences = ['sentence {} .'.format(i) for i in range(20)]
+        batches = [sentences[i:i + 5] for i in range(0, 20, 5)] * 3
+        with Pool(4) as pool:
+            pool.starmap(_use_cache, [(cache, batch) for batch in batches])
+        assert cache.get_many(sentences) == [_fake_parse(x)
+                                             for x in sentences]
+        stats = cache.stats()
+        assert stats['total_hits'] + stats['total_misses'] == 80
+        assert stats['total_misses'] >= 20
+        assert stats['entries'] == 20
+
+
+def test_syntax_cache_batched_updates():
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, 'cache.db')
+        cache = SyntaxParseCache(path, 'model')
+        sentences = ['sentence {} .'.format(i) for i in range(3)]
+        cache.put_many(sentences, [_fake_parse(x) for x in sentences])
+
+        # Lookups don't write to the database until the next flush.
+        other_cache = SyntaxParseCache(path, 'model')
+        assert other_cache.get_many(sentences[:2] + ['new .']) \
+            == [_fake_parse(x) for x in sentences[:2]] + [None]
+        assert (cache.stats()['total_hits'],
+                cache.stats()['total_misses']) == (0, 0)
+        other_cache.flush()
+        assert (cache.stats()['total_hits'],
+                cache.stats()['total_misses']) == (2, 1)
+
+        # With no flush interval, every lookup is written right away.
+        other_cache = SyntaxParseCache(path, 'model', flush_interval=0)
+        other_cache.get_many(sentences[:1])
+        assert cache.stats()['total_hits'] == 3
+
+
+if __name__ == '__main__':
+    test_syntax_cache()
+    test_syntax_cache_lru_eviction()
+    test_syntax_cache_shared_by_processes()
+    test_syntax_cache_batched_updates()
+    print("If no assertions failed, then this passed.")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+from concurrent.futures import ProcessPoolExecutor
+
+from discourseparsing.syntax_parser_pool import SyntaxParserPool
+from discourseparsing.tree_util import tree_from_string
+
+from test_zpar_server_client import FakeZParServer, _unused_port
+
+
+SENTENCES = ['sentence {} .'.format(i) for i in range(7)]
+
+_connector = None
+
+
+def _initialize_client_process(connector):
+    global _connector
+    _connector = connector
+
+
+def _parse_in_client_process(sentences):
+    syntax_parser = _connector.connect()
+    try:
+        return syntax_parser.parse_sentences(sentences)
+    finally:
+        syntax_parser.close()
+
+
+def test_syntax_parser_pool():
+    server = FakeZParServer()
+    try:
+        with SyntaxParserPool(2, 3, hostname='localhost',
+                              port=server.port, chunk_size=2) as pool:
+            connector = pool.connector()
+
+            # A client in this process.
+            syntax_parser = connector.connect()
+            trees = syntax_parser.parse_sentences(SENTENCES)
+            assert [tree_from_string(x).leaves() for x in trees] \
+                == [x.split() for x in SENTENCES]
+            syntax_parser.close()
+
+            # Clients in other processes, sharing the pool.
+            with ProcessPoolExecutor(
+                    max_workers=2, initializer=_initialize_client_process,
+                    initargs=(connector,)) as executor:
+                batches = [SENTENCES[i:] for i in range(4)]
+                results = list(executor.map(_parse_in_client_process,
+                                            batches))
+            assert [[tree_from_string(x).leaves() for x in trees]
+                    for trees in results] \
+                == [[x.split() for x in batch] for batch in batches]
+            assert server.n_parse_calls == len(SENTENCES) \
+                + sum(len(batch) for batch in batches)
+    finally:
+        server.shutdown()
+
+
+def test_syntax_parser_pool_errors():
+    with SyntaxParserPool(1, 1, hostname='localhost',
+                          port=_unused_port()) as pool:
+        syntax_parser = pool.connector().connect()
+        try:
+            syntax_parser.parse_sentences(SENTENCES)
+        except RuntimeError:
+            pass
+        else:
+            assert False
+        syntax_parser.close()
+
+
+def test_syntax_parser_pool_worker_exit():
+    server = FakeZParServer()
+    try:
+        with SyntaxParserPool(1, 1, hostname='localhost',
+                              port=server.port) as pool:
+            syntax_parser = pool.connector().connect()
+            # The request would never be answered, so the client should
+            # give up once the pool notices that the worker is gone.
+            pool._workers[0].kill()
+            pool._workers[0].join()
+            try:
+                syntax_parser.parse_sentences(SENTENCES)
+            except RuntimeError:
+                pass
+            else:
+                assert False
+            assert pool.broken
+            syntax_parser.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    test_syntax_parser_pool()
+    test_syntax_parser_pool_errors()
+    test_syntax_parser_pool_worker_exit()
+    print("If no assertions failed, then this passed.")
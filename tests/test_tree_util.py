@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+from nltk.tree import Tree, ParentedTree
+
+from discourseparsing.tree_util import HeadedParentedTree, tree_from_string
+
+
+TEST_TREES = [
+    '( (S (NP (DT The) (NN dog)) (VP (VBD ran) (PP (IN to) (NP (DT the) '
+    '(NN park)))) (. .)))',
+    '( (S (NP (NP (NNP John) (POS \'s)) (NN sister)) (VP (VBD said) (SBAR '
+    '(IN that) (S (NP (PRP she)) (VP (MD would) (VP (VB buy) (NP (DT the) '
+    '(NN book) (CC and) (NN pen))))))) (. .)))',
+    '( (S (NP (NN dog) (CC and) (NN dog)) (VP (VBD barked) (CC and) '
+    '(VBD barked)) (. .)))',
+]
+
+
+def _climb_to_maximal_head_node(node):
+    res = node
+    parent = res.parent()
+    while parent is not None and parent.head() is res:
+        res = parent
+        parent = res.parent()
+    return res
+
+
+def test_precompute_maximal_head_nodes():
+    '''
+    Checks that the maximal head nodes and depths computed in one top-down
+    pass match those found by climbing up from each preterminal.
+    '''
+    for tree_str in TEST_TREES:
+        tree = HeadedParentedTree.fromstring(tree_str)
+        preterminals = tree.precompute_maximal_head_nodes()
+        assert preterminals == [x for x in tree.subtrees()
+                                if isinstance(x[0], str)]
+        assert tree.preterminals() is preterminals
+
+        for node in tree.subtrees():
+            expected = _climb_to_maximal_head_node(node)
+            assert node.find_maximal_head_node() is expected
+            assert node.maximal_head_depth() == len(expected.treeposition())
+
+
+def test_maximal_head_nodes_computed_lazily():
+    tree = HeadedParentedTree.fromstring(TEST_TREES[0])
+    noun = tree[0, 0, 1]
+    assert noun.label() == 'NN'
+    assert noun.find_maximal_head_node() is tree[0, 0]
+    assert noun.maximal_head_depth() == 2
+    assert tree[0, 1, 0].find_maximal_head_node() is tree
+
+
+def test_tree_from_string():
+    '''
+    Checks that tree_from_string reads the same trees as NLTK's fromstring.
+    '''
+    tree_strs = TEST_TREES + [
+        '(ROOT (satellite:attribution (text 0)) (nucleus:span (text 1)))',
+        '(text)', '(A b c)', '( (S (NP (-LRB- -LRB-) (NN x) (-RRB- -RRB-))))']
+    for tree_str in tree_strs:
+        for tree_class in [Tree, ParentedTree, HeadedParentedTree]:
+            tree = tree_from_string(tree_str, tree_class)
+            assert tree == tree_class.fromstring(tree_str)
+            for subtree in tree.subtrees():
+                assert type(subtree) is tree_class
+                if tree_class is not Tree:
+                    for i, child in enumerate(subtree):
+                        if isinstance(child, Tree):
+                            assert child.parent() is subtree
+                            assert child.parent_index() == i
+
+    for bad_tree_str in ['(A (B c)', '(A b))', '(A) (B)', 'a']:
+        try:
+            tree_from_string(bad_tree_str)
+        except ValueError:
+            pass
+        else:
+            assert False, bad_tree_str
+
+
+if __name__ == '__main__':
+    test_precompute_maximal_head_nodes()
+    test_maximal_head_nodes_computed_lazily()
+    test_tree_from_string()
+    print("If no assertions failed, then this passed.")
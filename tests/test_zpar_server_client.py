@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+
+import asyncio
+import os
+import socket
+from socketserver import ThreadingMixIn
+import threading
+from tempfile import TemporaryDirectory
+import time
+from xmlrpc.server import SimpleXMLRPCServer, SimpleXMLRPCRequestHandler
+
+from discourseparsing.parse_util import (SyntaxParserWrapper,
+                                         ZParServerClient,
+                                         parse_zpar_endpoints, zpar_model_id)
+from discourseparsing.tree_util import tree_from_string
+
+
+class _QuietRequestHandler(SimpleXMLRPCRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingXMLRPCServer(ThreadingMixIn, SimpleXMLRPCServer):
+    daemon_threads = True
+
+
+class FakeZParServer(object):
+    '''
+    A local stand-in for a ZPar server that runs in a background thread and
+    "parses" a sentence by making each token a child of an S node, after
+    waiting for `latency` seconds. Requests are handled concurrently, and
+    `max_in_flight` records the largest number handled at the same time.
+    Sentences in `unparseable` get an empty string, as from ZPar when it
+    can't parse a sentence.
+    '''
+
+    def __init__(self, latency=0.0, multicall=True, unparseable=()):
+        self.latency = latency
+        self.unparseable = set(unparseable)
+        self.n_requests = 0
+        self.n_parse_calls = 0
+        self.n_in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = _ThreadingXMLRPCServer(
+            ('localhost', 0), requestHandler=_QuietRequestHandler,
+            logRequests=False, allow_none=True, use_builtin_types=True)
+        self._server.register_function(self.parse_sentence)
+        if multicall:
+            self._server.register_multicall_functions()
+        # Count HTTP requests (rather than parse calls) to check batching.
+        self._marshaled_dispatch = self._server._marshaled_dispatch
+        self._server._marshaled_dispatch = self._count_request
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def _count_request(self, *args, **kwargs):
+        with self._lock:
+            self.n_requests += 1
+        return self._marshaled_dispatch(*args, **kwargs)
+
+    def parse_sentence(self, sentence):
+        with self._lock:
+            self.n_parse_calls += 1
+            self.n_in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.n_in_flight)
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.n_in_flight -= 1
+        if sentence in self.unparseable:
+            return ''
+        return '(ROOT (S {}))'.format(' '.join('(X {})'.format(x)
+                                               for x in sentence.split()))
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _unused_port():
+    sock = socket.socket()
+    sock.bind(('localhost', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+SENTENCES = ['The dog ran .', 'It was fast .', 'Then it stopped .']
+
+
+def test_parse_zpar_endpoints():
+    assert parse_zpar_endpoints() == []
+    assert parse_zpar_endpoints(port=8859) == [('localhost', 8859)]
+    assert parse_zpar_endpoints('host1', 8859) == [('host1', 8859)]
+    assert parse_zpar_endpoints('host1:8000, host2', 8859) \
+        == [('host1', 8000), ('host2', 8859)]
+    # A hostname without a port means that the ZPar library is used.
+    assert parse_zpar_endpoints('host1') == []
+    try:
+        parse_zpar_endpoints('host1:8000,host2')
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+def test_multicall_batching():
+    '''
+    Checks that all the sentences in a batch are sent in one request.
+    '''
+    server = FakeZParServer()
+    try:
+        client = ZParServerClient([('localhost', server.port)])
+        assert client.check_endpoints() == [('localhost', server.port)]
+        n_requests = server.n_requests
+        trees = client.parse_sentences(SENTENCES)
+        assert server.n_requests == n_requests + 1
+        assert server.n_parse_calls == len(SENTENCES)
+        assert [tree_from_string(x).leaves() for x in trees] \
+            == [x.split() for x in SENTENCES]
+    finally:
+        server.shutdown()
+
+
+def test_unparseable_sentences():
+    '''
+    Checks that empty results mean that a sentence wasn't parsed, with and
+    without system.multicall, and that they aren't cached.
+    '''
+    sentences = SENTENCES + ['Unparseable !']
+    for multicall in [True, False]:
+        server = FakeZParServer(multicall=multicall,
+                                unparseable=sentences[-1:])
+        try:
+            client = ZParServerClient([('localhost', server.port)])
+            trees = client.parse_sentences(sentences)
+            assert trees[-1] is None
+            assert [tree_from_string(x).leaves() for x in trees[:-1]] \
+                == [x.split() for x in SENTENCES]
+
+            with TemporaryDirectory() as tmpdir:
+                wrapper = SyntaxParserWrapper(
+                    hostname='localhost:{}'.format(server.port),
+                    cache_path=os.path.join(tmpdir, 'cache.db'),
+                    cache_model_id='model')
+                assert wrapper.parse_sentences(sentences)[-1] is None
+                assert wrapper.cache.get_many(sentences[-1:]) == [None]
+        finally:
+            server.shutdown()
+
+
+def test_fallback_without_multicall():
+    server = FakeZParServer(multicall=False)
+    try:
+        client = ZParServerClient([('localhost', server.port)])
+        trees = client.parse_sentences(SENTENCES)
+        assert [tree_from_string(x).leaves() for x in trees] \
+            == [x.split() for x in SENTENCES]
+        # After the first failed multicall, the client shouldn't try again.
+        n_requests = server.n_requests
+        client.parse_sentences(SENTENCES)
+        assert server.n_requests == n_requests + len(SENTENCES)
+    finally:
+        server.shutdown()
+
+
+def test_round_robin_and_failover():
+    servers = [FakeZParServer(), FakeZParServer()]
+    dead_endpoint = ('localhost', _unused_port())
+    try:
+        endpoints = [dead_endpoint] + [('localhost', server.port)
+                                       for server in servers]
+        client = ZParServerClient(endpoints)
+        for _ in range(6):
+            assert len(client.parse_sentences(SENTENCES)) == len(SENTENCES)
+        # Both live servers should have received some of the batches.
+        assert all(server.n_parse_calls > 0 for server in servers)
+        assert sum(server.n_parse_calls for server in servers) \
+            == 6 * len(SENTENCES)
+
+        # check_endpoints should drop the dead endpoint.
+        assert client.check_endpoints() == endpoints[1:]
+
+        for server in servers:
+            server.shutdown()
+        try:
+            client.parse_sentences(SENTENCES)
+        except RuntimeError:
+            pass
+        else:
+            assert False
+    finally:
+        for server in servers:
+            server.shutdown()
+
+
+def test_parse_sentences_async():
+    '''
+    Checks that the async client keeps several requests in flight, no more
+    than max_concurrency, and returns the parses in order.
+    '''
+    latency = 0.05
+    servers = [FakeZParServer(latency=latency),
+               FakeZParServer(latency=latency)]
+    sentences = ['sentence {} .'.format(i) for i in range(40)]
+    client = ZParServerClient([('localhost', servers[0].port)],
+                              max_concurrency=8)
+    try:
+        start_time = time.perf_counter()
+        trees = asyncio.run(client.parse_sentences_async(sentences))
+        elapsed = time.perf_counter() - start_time
+        assert [tree_from_string(x).leaves() for x in trees] \
+            == [x.split() for x in sentences]
+        assert elapsed < len(sentences) * latency / 2
+        assert 1 < servers[0].max_in_flight <= 8
+        client.close()
+
+        # With several servers, the requests are spread over all of them.
+        client = ZParServerClient([('localhost', server.port)
+                                   for server in servers], max_concurrency=8)
+        trees = asyncio.run(client.parse_sentences_async(sentences))
+        assert [tree_from_string(x).leaves() for x in trees] \
+            == [x.split() for x in sentences]
+        assert all(server.n_parse_calls > 0 for server in servers)
+
+        # Several documents can be parsed concurrently with one client.
+        async def parse_documents():
+            return await asyncio.gather(
+                client.parse_sentences_async(sentences[:10]),
+                client.parse_sentences_async(sentences[10:]))
+
+        trees = asyncio.run(parse_documents())
+        assert [[tree_from_string(x).leaves() for x in doc_trees]
+                for doc_trees in trees] \
+            == [[x.split() for x in doc_sentences]
+                for doc_sentences in [sentences[:10], sentences[10:]]]
+    finally:
+        client.close()
+        for server in servers:
+            server.shutdown()
+
+
+def test_syntax_parser_wrapper_with_server_and_cache():
+    '''
+    Checks that SyntaxParserWrapper only connects to the server when it
+    first parses something, and that cached sentences aren't sent again.
+    '''
+    server = FakeZParServer()
+    try:
+        with TemporaryDirectory() as tmpdir:
+            cache_path = os.path.join(tmpdir, 'cache.db')
+            # The ID of the model the server loaded has to be given.
+            try:
+                SyntaxParserWrapper(
+                    hostname='localhost:{}'.format(server.port),
+                    cache_path=cache_path)
+            except ValueError:
+                pass
+            else:
+                assert False
+
+            wrapper = SyntaxParserWrapper(
+                hostname='localhost:{}'.format(server.port),
+                cache_path=cache_path, cache_model_id='model')
+            assert server.n_requests == 0
+
+            sentences = SENTENCES + SENTENCES[:1]
+            expected = [x.split() for x in sentences]
+            trees = wrapper.parse_sentences(sentences)
+            assert [tree_from_string(x).leaves() for x in trees] == expected
+            assert server.n_parse_calls == len(SENTENCES)
+
+            trees = asyncio.run(wrapper.parse_sentences_async(sentences))
+            assert [tree_from_string(x).leaves() for x in trees] == expected
+            assert server.n_parse_calls == len(SENTENCES)
+            assert wrapper.cache.stats()['hits'] == len(sentences)
+    finally:
+        server.shutdown()
+
+
+def test_zpar_model_id():
+    with TemporaryDirectory() as tmpdir:
+        model_dir = os.path.join(tmpdir, 'english')
+        os.makedirs(os.path.join(model_dir, 'conparser'))
+        model_path = os.path.join(model_dir, 'conparser', 'model')
+        with open(model_path, 'w') as model_file:
+            model_file.write('model 1')
+        model_id = zpar_model_id(model_dir)
+
+        # The ID doesn't depend on how the directory is named.
+        old_dir = os.getcwd()
+        os.chdir(tmpdir)
+        try:
+            assert zpar_model_id('english/') == model_id
+        finally:
+            os.chdir(old_dir)
+
+        # Retraining the model in place changes the ID.
+        with open(model_path, 'w') as model_file:
+            model_file.write('model 22')
+        assert zpar_model_id(model_dir) != model_id
+
+
+if __name__ == '__main__':
+    test_parse_zpar_endpoints()
+    test_multicall_batching()
+    test_unparseable_sentences()
+    test_fallback_without_multicall()
+    test_round_robin_and_failover()
+    test_parse_sentences_async()
+    test_syntax_parser_wrapper_with_server_and_cache()
+    test_zpar_model_id()
+    print("If no assertions failed, then this passed.")
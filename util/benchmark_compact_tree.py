@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+'''
+This script compares the memory used per sentence by HeadedParentedTree
+objects (with heads and maximal head nodes precomputed, as the parser used to
+keep them in `syntax_trees_objs`) and by CompactTree objects, for the syntax
+trees in JSON files created by convert_rst_discourse_tb.
+'''
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from discourseparsing.compact_tree import CompactTree
+from discourseparsing.tree_util import HeadedParentedTree, tree_from_string
+
+
+def read_headed_tree(tree_str):
+    tree = tree_from_string(tree_str, HeadedParentedTree)
+    tree.precompute_maximal_head_nodes()
+    for node in tree.subtrees():
+        node.head()
+    return tree
+
+
+def measure(read_func, tree_strs):
+    '''
+    Returns the number of bytes allocated for the trees that are still in use
+    after reading them, and the time taken to read them.
+    '''
+    gc.collect()
+    tracemalloc.start()
+    start_bytes = tracemalloc.get_traced_memory()[0]
+    start_time = time.perf_counter()
+    trees = [read_func(tree_str) for tree_str in tree_strs]
+    elapsed = time.perf_counter() - start_time
+    gc.collect()
+    n_bytes = tracemalloc.get_traced_memory()[0] - start_bytes
+    tracemalloc.stop()
+    del trees
+    return n_bytes, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('input_paths', nargs='+',
+                        help='JSON files from convert_rst_discourse_tb')
+    args = parser.parse_args()
+
+    tree_strs = []
+    for input_path in args.input_paths:
+        with open(input_path) as input_file:
+            for doc_dict in json.load(input_file):
+                tree_strs.extend(doc_dict['syntax_trees'])
+
+    # Read one tree first so that interning the labels isn't counted.
+    CompactTree.fromstring(tree_strs[0])
+
+    headed_bytes, headed_time = measure(read_headed_tree, tree_strs)
+    compact_bytes, compact_time = measure(CompactTree.fromstring, tree_strs)
+
+    print("sentences: {}".format(len(tree_strs)))
+    print("HeadedParentedTree: {:.0f} bytes/sentence, {:.3f}s"
+          .format(headed_bytes / len(tree_strs), headed_time))
+    print("CompactTree: {:.0f} bytes/sentence, {:.3f}s"
+          .format(compact_bytes / len(tree_strs), compact_time))
+    print("memory reduction: {:.2f}x".format(headed_bytes / compact_bytes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+'''
+This script measures the time from starting a command until it produces its
+first line of output (or exits), e.g., to check how long the command line
+tools take to start up.
+
+By default, it times `--help` for rst_parse, segment_document, and rst_eval.
+Other commands can be timed with `--command` (e.g.,
+`--command "rst_parse -g segmentation_model -p rst_parsing_model doc.txt"`
+with a ZPar server or library available). Commands that name one of the
+package's scripts are run with the current Python interpreter as
+`python -m discourseparsing.<script>`, so that the package doesn't need to be
+installed.
+'''
+
+import argparse
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+
+
+SCRIPTS = ['rst_parse', 'segment_document', 'rst_eval', 'rst_parse_batch',
+           'tune_rst_parser']
+
+DEFAULT_COMMANDS = ['rst_parse --help', 'segment_document --help',
+                    'rst_eval --help']
+
+
+def make_command_args(command):
+    args = shlex.split(command)
+    if args[0] in SCRIPTS:
+        args = [sys.executable, '-m', 'discourseparsing.' + args[0]] + args[1:]
+    return args
+
+
+def time_to_first_output(command_args):
+    '''
+    Runs the command and returns the number of seconds until it wrote its
+    first line to stdout, or until it exited if it wrote nothing.
+    '''
+    start_time = time.perf_counter()
+    process = subprocess.Popen(command_args, stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+    process.stdout.readline()
+    elapsed = time.perf_counter() - start_time
+    process.stdout.read()
+    process.wait()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-c', '--command', action='append',
+                        help='a command to time (may be given more than ' +
+                        'once); if not given, the default commands are ' +
+                        'timed: {}'.format(DEFAULT_COMMANDS))
+    parser.add_argument('-n', '--n_repeats', type=int, default=5,
+                        help='number of times to run each command')
+    args = parser.parse_args()
+
+    # Make sure the package can be imported when run from a checkout.
+    env_path = os.environ.get('PYTHONPATH')
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.environ['PYTHONPATH'] = repo_dir if not env_path \
+        else os.pathsep.join([repo_dir, env_path])
+
+    for command in args.command or DEFAULT_COMMANDS:
+        command_args = make_command_args(command)
+        times = [time_to_first_output(command_args)
+                 for _ in range(args.n_repeats)]
+        print("{}: min {:.3f}s, median {:.3f}s".format(
+            command, min(times), statistics.median(times)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+
+'''
+This script compares the throughput and peak memory use of rst_parse_batch
+with in-process syntactic parsing (each of the `--max_workers` processes
+loads its own ZPar model) and with a separate pool of `--syntax_workers`
+syntactic parsing processes.
+
+Each configuration is given as "MAX_WORKERS:SYNTAX_WORKERS" (e.g., "4:0" for
+4 processes with their own ZPar, "6:2" for 6 RST parsing processes sharing
+2 ZPar processes). For a fair comparison at a fixed memory budget, choose
+configurations with similar peak memory and compare their throughput.
+
+Memory is measured by summing the resident set sizes of rst_parse_batch and
+all of its descendant processes, read from /proc, so this only works on
+Linux.
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from tempfile import TemporaryDirectory
+
+
+def _child_pids(pid):
+    res = []
+    task_dir = '/proc/{}/task'.format(pid)
+    try:
+        for tid in os.listdir(task_dir):
+            with open(os.path.join(task_dir, tid, 'children')) as f:
+                res.extend(int(x) for x in f.read().split())
+    except OSError:
+        pass
+    return res
+
+
+def process_tree_rss(pid):
+    '''
+    Returns the total resident set size in bytes of a process and its
+    descendants.
+    '''
+    total = 0
+    pids = [pid]
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    while pids:
+        cur_pid = pids.pop()
+        try:
+            with open('/proc/{}/statm'.format(cur_pid)) as f:
+                total += int(f.read().split()[1]) * page_size
+        except OSError:
+            continue
+        pids.extend(_child_pids(cur_pid))
+    return total
+
+
+def run_configuration(base_args, max_workers, syntax_workers, output_prefix,
+                      poll_interval):
+    command_args = [sys.executable, '-m', 'discourseparsing.rst_parse_batch',
+                    '-m', str(max_workers),
+                    '--syntax_workers', str(syntax_workers)] + base_args \
+        + [output_prefix]
+    start_time = time.perf_counter()
+    process = subprocess.Popen(command_args)
+    peak_rss = 0
+    while process.poll() is None:
+        peak_rss = max(peak_rss, process_tree_rss(process.pid))
+        time.sleep(poll_interval)
+    elapsed = time.perf_counter() - start_time
+    if process.returncode != 0:
+        raise RuntimeError('rst_parse_batch failed: {}'.format(command_args))
+    return elapsed, peak_rss
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('input_file', help='json file with a dictionary ' +
+                        'from IDs to texts, as for rst_parse_batch')
+    parser.add_argument('-g', '--segmentation_model', required=True)
+    parser.add_argument('-p', '--parsing_model', required=True)
+    parser.add_argument('-zm', '--zpar_model_directory', default=None)
+    parser.add_argument('-c', '--configurations', nargs='+',
+                        default=['4:0', '6:2'],
+                        help='MAX_WORKERS:SYNTAX_WORKERS pairs to compare')
+    parser.add_argument('--poll_interval', type=float, default=0.2,
+                        help='seconds between memory measurements')
+    args = parser.parse_args()
+
+    with open(args.input_file) as f:
+        n_docs = len(json.load(f))
+
+    base_args = ['-g', args.segmentation_model, '-p', args.parsing_model]
+    if args.zpar_model_directory:
+        base_args.extend(['-zm', args.zpar_model_directory])
+    base_args.append(args.input_file)
+
+    with TemporaryDirectory() as tmpdir:
+        for configuration in args.configurations:
+            max_workers, syntax_workers = \
+                [int(x) for x in configuration.split(':')]
+            elapsed, peak_rss = run_configuration(
+                base_args, max_workers, syntax_workers,
+                os.path.join(tmpdir, configuration.replace(':', '_')),
+                args.poll_interval)
+            print("max_workers={}, syntax_workers={}: {:.2f} docs/s, "
+                  "peak memory {:.0f} MB, {:.2f} docs/s per GB"
+                  .format(max_workers, syntax_workers, n_docs / elapsed,
+                          peak_rss / 2 ** 20,
+                          n_docs / elapsed / (peak_rss / 2 ** 30)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+'''
+This script compares the speed of NLTK's `Tree.fromstring` with
+`tree_from_string` from `discourseparsing.tree_util` for reading the syntax
+trees and RST trees in the JSON files created by convert_rst_discourse_tb
+(e.g., rst_discourse_tb_edus_TRAINING.json and rst_discourse_tb_edus_TEST.json,
+which together include the PTB trees for the whole RST Discourse Treebank).
+
+It also checks that both readers produce the same trees.
+'''
+
+import argparse
+import gc
+import json
+import time
+
+from nltk.tree import ParentedTree
+
+from discourseparsing.tree_util import HeadedParentedTree, tree_from_string
+
+
+def time_reader(read_func, tree_strs, n_repeats):
+    '''
+    Returns the best time over `n_repeats` runs of reading all the trees,
+    along with the trees from the last run.
+    '''
+    best_time = None
+    for _ in range(n_repeats):
+        # Disable garbage collection so that collections triggered by the
+        # trees from previous runs don't count against either reader.
+        gc.collect()
+        gc.disable()
+        start_time = time.perf_counter()
+        trees = [read_func(tree_str) for tree_str in tree_strs]
+        elapsed = time.perf_counter() - start_time
+        gc.enable()
+        if best_time is None or elapsed < best_time:
+            best_time = elapsed
+    return best_time, trees
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('input_paths', nargs='+',
+                        help='JSON files from convert_rst_discourse_tb')
+    parser.add_argument('-n', '--n_repeats', type=int, default=3,
+                        help='number of times to read the trees')
+    args = parser.parse_args()
+
+    syntax_tree_strs = []
+    rst_tree_strs = []
+    for input_path in args.input_paths:
+        with open(input_path) as input_file:
+            for doc_dict in json.load(input_file):
+                syntax_tree_strs.extend(doc_dict['syntax_trees'])
+                rst_tree_strs.append(doc_dict['rst_tree'])
+
+    for name, tree_strs, tree_class in \
+            [('syntax trees', syntax_tree_strs, HeadedParentedTree),
+             ('RST trees', rst_tree_strs, ParentedTree)]:
+        nltk_time, nltk_trees = time_reader(tree_class.fromstring, tree_strs,
+                                            args.n_repeats)
+        fast_time, fast_trees = \
+            time_reader(lambda x: tree_from_string(x, tree_class), tree_strs,
+                        args.n_repeats)
+        assert nltk_trees == fast_trees
+
+        print("{} ({}, n = {}):".format(name, tree_class.__name__,
+                                        len(tree_strs)))
+        print("  nltk fromstring: {:.3f}s".format(nltk_time))
+        print("  tree_from_string: {:.3f}s".format(fast_time))
+        print("  speedup: {:.2f}x".format(nltk_time / fast_time))
+
+
+if __name__ == '__main__':
+    main()
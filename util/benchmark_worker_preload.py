@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+'''
+This script compares two ways of starting the worker processes of
+rst_parse_batch: loading the models once in the parent process and forking
+the workers from it (the default), and having each worker load its own
+models (`--no_preload`).
+
+For each, it reports the pool startup time (from creating the pool until
+every worker has all of its models loaded) and the total memory used by the
+parent and the workers, as the sum of their resident set sizes (RSS), which
+counts pages shared copy-on-write once per process, and the sum of their
+proportional set sizes (PSS), which splits shared pages between the
+processes sharing them and so shows the actual savings.
+
+Memory is read from /proc, so this only works on Linux.
+'''
+
+import argparse
+import multiprocessing
+import os
+import time
+
+from discourseparsing import rst_parse_batch
+
+
+def _child_pids(pid):
+    res = []
+    task_dir = '/proc/{}/task'.format(pid)
+    try:
+        for tid in os.listdir(task_dir):
+            with open(os.path.join(task_dir, tid, 'children')) as f:
+                res.extend(int(x) for x in f.read().split())
+    except OSError:
+        pass
+    return res
+
+
+def process_tree_memory(pid):
+    '''
+    Returns the total RSS and PSS in bytes of a process and its descendants.
+    '''
+    total_rss = total_pss = 0
+    pids = [pid]
+    while pids:
+        cur_pid = pids.pop()
+        try:
+            with open('/proc/{}/smaps_rollup'.format(cur_pid)) as f:
+                for line in f:
+                    fields = line.split()
+                    if fields[0] == 'Rss:':
+                        total_rss += int(fields[1]) * 1024
+                    elif fields[0] == 'Pss:':
+                        total_pss += int(fields[1]) * 1024
+        except OSError:
+            continue
+        pids.extend(_child_pids(cur_pid))
+    return total_rss, total_pss
+
+
+def _warm_up_worker(_):
+    '''
+    Loads the models that the worker hasn't loaded yet and returns the
+    worker's process ID and the time at which it was ready.
+    '''
+    rst_parse_batch._load_lazy_models(rst_parse_batch._worker_models[2])
+    ready_time = time.time()
+    # Keep this worker busy for a bit so that the other workers get the
+    # other warm-up tasks.
+    time.sleep(0.2)
+    return os.getpid(), ready_time
+
+
+def measure_pool(max_workers, model_kwargs, preload):
+    start_time = time.time()
+    with rst_parse_batch._worker_pool(max_workers, model_kwargs,
+                                      preload=preload) as executor:
+        ready_times = {}
+        while len(ready_times) < max_workers:
+            ready_times.update(executor.map(_warm_up_worker,
+                                            range(max_workers)))
+        startup_time = max(ready_times.values()) - start_time
+        rss, pss = process_tree_memory(os.getpid())
+    return startup_time, rss, pss
+
+
+def report_pool(max_workers, model_kwargs, preload):
+    startup_time, rss, pss = measure_pool(max_workers, model_kwargs, preload)
+    print("preload={}: pool startup {:.2f} s, total RSS {:.0f} MB, "
+          "total PSS {:.0f} MB".format(preload, startup_time, rss / 2 ** 20,
+                                       pss / 2 ** 20))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('-g', '--segmentation_model', required=True)
+    parser.add_argument('-p', '--parsing_model', required=True)
+    parser.add_argument('-zm', '--zpar_model_directory', default=None)
+    parser.add_argument('-zh', '--zpar_hostname', default=None)
+    parser.add_argument('-zp', '--zpar_port', type=int)
+    parser.add_argument('-m', '--max_workers', type=int, default=4)
+    args = parser.parse_args()
+
+    model_kwargs = {"zpar_model_directory": args.zpar_model_directory,
+                    "segmentation_model": args.segmentation_model,
+                    "parsing_model": args.parsing_model,
+                    "zpar_hostname": args.zpar_hostname,
+                    "zpar_port": args.zpar_port}
+
+    # Measure each configuration in a fresh process, so that the models
+    # loaded for one don't count towards the memory of the other.
+    for preload in [False, True]:
+        process = multiprocessing.Process(
+            target=report_pool,
+            args=(args.max_workers, model_kwargs, preload))
+        process.start()
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
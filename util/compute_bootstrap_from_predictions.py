@@ -4,28 +4,24 @@
 This is a script for computing bootstrap confidence intervals
 around RST parser evaluation results.
 
-Note: this could be extended to compute CIs for the difference in performance
-between two systems.
+The documents are parsed and scored once, and the bootstrap samples are
+scored from the per-document span counts (see
+discourseparsing/eval_bootstrap.py).
+
+To compute CIs for the difference in performance between two systems, see
+util/compute_paired_bootstrap.py.
 '''
 
 import json
 import logging
 
-import numpy as np
-import scikits.bootstrap as boot
-
 from discourseparsing.discourse_parsing import Parser
-from discourseparsing.rst_eval import (compute_rst_eval_results,
+from discourseparsing.eval_bootstrap import compute_bootstrap_cis
+from discourseparsing.rst_eval import (compute_rst_eval_counts,
+                                       compute_rst_eval_results,
                                        predict_rst_trees_for_eval)
 
 
-def make_score_func(metric_name):
-    def score_func(data):
-        return compute_rst_eval_results(data[:, 0], data[:, 1],
-                                        data[:, 2], data[:, 3])[metric_name]
-    return score_func
-
-
 def main():
     import argparse
     parser = argparse.ArgumentParser(
@@ -54,6 +50,14 @@ def main():
                         required=True)
     parser.add_argument('--n_samples', type=int, default=10000)
     parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--method', choices=['bca', 'pi'], default='bca',
+                        help='bias-corrected and accelerated or percentile ' +
+                        'intervals')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='random seed for the bootstrap samples')
+    parser.add_argument('-m', '--max_workers', type=int, default=1,
+                        help='number of processes to parse the evaluation ' +
+                        'documents with')
     args = parser.parse_args()
 
     # Convert verbose flag to actually logging level
@@ -74,25 +78,27 @@ def main():
     eval_data = json.load(args.evaluation_set)
 
     pred_edu_tokens_lists, pred_trees, gold_edu_tokens_lists, gold_trees = \
-        predict_rst_trees_for_eval(None, None, rst_parser, eval_data)
-
-    data = np.array(list(zip(pred_edu_tokens_lists, pred_trees,
-                             gold_edu_tokens_lists, gold_trees)))
+        predict_rst_trees_for_eval(None, None, rst_parser, eval_data,
+                                   max_workers=args.max_workers)
+    counts = compute_rst_eval_counts(pred_edu_tokens_lists, pred_trees,
+                                     gold_edu_tokens_lists, gold_trees)
 
     # score without bootstrapping
     orig_score = compute_rst_eval_results(pred_edu_tokens_lists,
                                           pred_trees,
                                           gold_edu_tokens_lists,
                                           gold_trees)[args.metric_name]
-    tmp_score = make_score_func(args.metric_name)(data)
-    assert tmp_score == orig_score
 
-    boot_ci_lower, boot_ci_upper = \
-        boot.ci(data, make_score_func(args.metric_name),
-                n_samples=args.n_samples, method='bca', alpha=args.alpha)
+    cis = compute_bootstrap_cis(counts, n_samples=args.n_samples,
+                                alpha=args.alpha, method=args.method,
+                                random_state=args.seed)
+    assert cis[args.metric_name]["score"] == orig_score
+    boot_ci_lower = cis[args.metric_name]["ci_lower"]
+    boot_ci_upper = cis[args.metric_name]["ci_upper"]
 
     print("evaluation_set: {}".format(args.evaluation_set))
     print("alpha: {}".format(args.alpha))
+    print("method: {}".format(args.method))
     print("n_samples: {}".format(args.n_samples))
     print("metric: {}".format(args.metric_name))
     print("original score: {}".format(orig_score))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+'''
+This is a script for comparing two RST parsers (A and B) with a paired
+bootstrap, from their predictions for the same evaluation set (as saved by
+`rst_eval --save_predictions`).
+
+For each metric, it prints the scores of both systems, the difference (B
+minus A), a bootstrap confidence interval for the difference, and a
+two-sided p-value for the null hypothesis of no difference.  Both systems
+are resampled with the same bootstrap samples of documents.
+'''
+
+import json
+import logging
+
+from discourseparsing.eval_bootstrap import compute_paired_bootstrap
+from discourseparsing.rst_eval import (GoldEvalData,
+                                       load_predictions,
+                                       predictions_for_eval)
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('evaluation_set',
+                        help='The dev or test set JSON file',
+                        type=argparse.FileType('r'))
+    parser.add_argument('predictions_a',
+                        help='predictions of the baseline system (A)')
+    parser.add_argument('predictions_b',
+                        help='predictions of the system compared to the ' +
+                        'baseline (B)')
+    parser.add_argument('--n_samples', type=int, default=10000)
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--method', choices=['bca', 'pi'], default='bca',
+                        help='bias-corrected and accelerated or percentile ' +
+                        'intervals')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='random seed for the bootstrap samples')
+    parser.add_argument('--output_json', default=None,
+                        help='path to also write the results to as JSON')
+    parser.add_argument('-v', '--verbose',
+                        help='Print more status information. For every ' +
+                        'additional time this flag is specified, ' +
+                        'output gets more verbose.',
+                        default=0, action='count')
+    args = parser.parse_args()
+
+    # Convert verbose flag to actually logging level
+    log_levels = [logging.WARNING, logging.INFO, logging.DEBUG]
+    log_level = log_levels[min(args.verbose, 2)]
+    # Make warnings from built-in warnings module get formatted more nicely
+    logging.captureWarnings(True)
+    logging.basicConfig(format=('%(asctime)s - %(name)s - %(levelname)s - ' +
+                                '%(message)s'), level=log_level)
+
+    eval_data = json.load(args.evaluation_set)
+    gold = GoldEvalData.from_eval_data(eval_data)
+    counts = [gold.compute_counts(*predictions_for_eval(
+        load_predictions(path), eval_data, gold=gold)[:2])
+        for path in [args.predictions_a, args.predictions_b]]
+    results = compute_paired_bootstrap(counts[0], counts[1],
+                                       n_samples=args.n_samples,
+                                       alpha=args.alpha, method=args.method,
+                                       random_state=args.seed)
+
+    print("evaluation_set: {}".format(args.evaluation_set.name))
+    print("A: {}".format(args.predictions_a))
+    print("B: {}".format(args.predictions_b))
+    print("alpha: {}".format(args.alpha))
+    print("method: {}".format(args.method))
+    print("n_samples: {}".format(args.n_samples))
+    print("{:<18} {:>8} {:>8} {:>8} {:>20} {:>8}".format(
+        "metric", "A", "B", "B - A", "CI", "p"))
+    for metric_name, res in results.items():
+        print("{:<18} {:8.4f} {:8.4f} {:+8.4f} {:>20} {:8.4f}".format(
+            metric_name, res["score_a"], res["score_b"], res["diff"],
+            "({:+.4f}, {:+.4f})".format(res["ci_lower"], res["ci_upper"]),
+            res["p_value"]))
+
+    if args.output_json:
+        with open(args.output_json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
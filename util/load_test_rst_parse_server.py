@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+'''
+This script sends documents to an rst_parse_server from several concurrent
+clients and reports the throughput and the 50th and 99th percentile
+latencies of the requests, along with the mean micro-batch size.
+'''
+
+import argparse
+import itertools
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def send_document(url, doc_id, text):
+    '''
+    Sends one document to the server and returns the latency in seconds and
+    whether the request succeeded.
+    '''
+    request = urllib.request.Request(
+        url + '/parse',
+        data=json.dumps({"doc_id": doc_id, "text": text}).encode('utf-8'),
+        headers={"Content-Type": "application/json"})
+    start_time = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request) as response:
+            response.read()
+        success = True
+    except urllib.error.HTTPError:
+        success = False
+    return time.perf_counter() - start_time, success
+
+
+def get_stats(url):
+    with urllib.request.urlopen(url + '/stats') as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('input_file', help='json file with a dictionary ' +
+                        'from IDs to texts, as for rst_parse_batch')
+    parser.add_argument('-u', '--url', default='http://localhost:8000',
+                        help='URL of the server')
+    parser.add_argument('-c', '--concurrency', type=int, default=8,
+                        help='number of concurrent clients')
+    parser.add_argument('-n', '--n_requests', type=int, default=None,
+                        help='number of requests to send, cycling through ' +
+                        'the documents (default: one per document)')
+    args = parser.parse_args()
+
+    with open(args.input_file) as f:
+        docs = sorted(json.load(f).items())
+    n_requests = args.n_requests or len(docs)
+    requests = list(itertools.islice(itertools.cycle(docs), n_requests))
+
+    stats_before = get_stats(args.url)
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(lambda doc: send_document(args.url, *doc),
+                                    requests))
+    elapsed = time.perf_counter() - start_time
+    stats = get_stats(args.url)
+
+    latencies = np.array([latency for latency, _ in results])
+    n_failed = sum(1 for _, success in results if not success)
+    n_batches = stats['batches'] - stats_before['batches']
+    n_documents = stats['documents'] - stats_before['documents']
+    print("{} requests ({} failed) with {} concurrent clients in {:.2f} s"
+          .format(n_requests, n_failed, args.concurrency, elapsed))
+    print("throughput: {:.2f} docs/s".format(n_requests / elapsed))
+    print("latency: p50 {:.3f} s, p99 {:.3f} s, mean {:.3f} s, max {:.3f} s"
+          .format(np.percentile(latencies, 50),
+                  np.percentile(latencies, 99),
+                  latencies.mean(), latencies.max()))
+    if n_batches:
+        print("mean micro-batch size: {:.2f}".format(n_documents / n_batches))
+
+
+if __name__ == '__main__':
+    main()